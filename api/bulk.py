@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+from peewee import chunked, fn
+from api.card import Card, to_card, encoder, decode_cards
+from database.models import bulk_database, BulkCard, BulkMeta, initialize_bulk_database
+from utils.price_index import PriceIndex, PriceIndexCache
+
+# Индексы цен по группам карт, построенные из локального хранилища
+price_indexes = PriceIndexCache()
+
+# Ключ BulkMeta с версией хранилища, которая меняется при каждой загрузке bulk-файла
+VERSION_KEY = 'ingested_at'
+
+def iter_json_array(file: TextIO, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """
+    Последовательно читать элементы JSON-массива из файла, не загружая его целиком.
+
+    В памяти одновременно находится только текущий фрагмент файла
+    и один разбираемый элемент.
+
+    :param file: Файл, открытый в текстовом режиме
+    :param chunk_size: Размер читаемого фрагмента в символах
+    :return: Итератор элементов массива
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+        position = 0
+        length = len(buffer)
+        while True:
+            while position < length and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position >= length:
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError("Ожидался JSON-массив")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position_end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break
+            yield item
+            position = position_end
+        buffer = buffer[position:]
+        if eof:
+            if buffer.strip():
+                raise ValueError("Неожиданный конец JSON-массива")
+            return
+
+
+def ingest_bulk_file(path: str, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Загрузить bulk-файл default_cards в локальное хранилище.
+
+    Повторная загрузка инкрементальна: перезаписываются только изменившиеся
+    карты, а карты, исчезнувшие из файла, удаляются.
+
+    :param path: Путь к JSON-файлу
+    :param batch_size: Сколько карт записывать в одной транзакции
+    :return: Счётчики added/updated/unchanged/deleted
+    """
+    initialize_bulk_database()
+    stats = {'added': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    with bulk_database.connection_context():
+        digests = dict(BulkCard.select(BulkCard.id, BulkCard.digest).tuples())
+        seen = set()
+        batch: List[Dict] = []
+
+        def flush() -> None:
+            with bulk_database.atomic():
+                for rows in chunked(batch, 100):
+                    BulkCard.replace_many(rows).execute()
+            batch.clear()
+
+        with open(path, encoding='utf-8') as file:
+            for card in iter_json_array(file):
+                if 'set' not in card or 'prices' not in card:
+                    continue
+                # В хранилище попадают только поля Card (см. api.card)
+                compact = to_card(card)
+                payload = encoder.encode(compact)
+                digest = hashlib.blake2b(payload, digest_size=12).hexdigest()
+                card_id = compact.id
+                seen.add(card_id)
+                previous = digests.get(card_id)
+                if previous == digest:
+                    stats['unchanged'] += 1
+                    continue
+                stats['added' if previous is None else 'updated'] += 1
+                batch.append({
+                    'id': card_id,
+                    'oracle_id': compact.oracle_id,
+                    'name_key': compact.name.lower(),
+                    'set_code': compact.set,
+                    'set_name': compact.set_name,
+                    'usd': compact.prices.usd,
+                    'digest': digest,
+                    'payload': payload.decode('utf-8'),
+                })
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+
+        removed = [card_id for card_id in digests if card_id not in seen]
+        with bulk_database.atomic():
+            for ids in chunked(removed, 500):
+                stats['deleted'] += BulkCard.delete().where(BulkCard.id.in_(ids)).execute()
+        if stats['added'] or stats['updated'] or stats['deleted']:
+            BulkMeta.replace(key=VERSION_KEY, value=str(time.time_ns())).execute()
+    price_indexes.clear()
+    return stats
+
+
+def bulk_version() -> Optional[str]:
+    """
+    :return: Версия хранилища (меняется при каждой загрузке с изменениями) или None
+    """
+    with bulk_database.connection_context():
+        meta = BulkMeta.get_or_none(BulkMeta.key == VERSION_KEY)
+    return meta.value if meta is not None else None
+
+
+def load_group(filter_choice: str, target: str) -> List[Card]:
+    """
+    Загрузить из хранилища все карты группы: печати карты или карты набора.
+
+    :param filter_choice: Фильтр (card/set)
+    :param target: Точное имя карты или код набора
+    :return: Список карт
+    """
+    query = BulkCard.select(BulkCard.payload)
+    if filter_choice == "card":
+        query = query.where(BulkCard.name_key == target.lower())
+    else:
+        query = query.where(BulkCard.set_code == target.lower())
+    with bulk_database.connection_context():
+        payloads = [payload for payload, in query.tuples()]
+    # Карты группы разбираются одним вызовом декодера как JSON-массив
+    return decode_cards(f"[{','.join(payloads)}]")
+
+
+def search_bulk(data_choice: Optional[str], filter_choice: str, target: str, amount: int,
+                low_price: Optional[float] = None, high_price: Optional[float] = None,
+                currency: str = 'usd') -> List[Card]:
+    """
+    Ответить на запрос /low, /high или /custom из локального хранилища.
+
+    :param data_choice: Порядок данных (low/high или None для /custom)
+    :param filter_choice: Фильтр (card/set)
+    :param target: Точное имя карты или код набора
+    :param amount: Количество карт (0 - все)
+    :param low_price: Нижняя граница цены (опционально)
+    :param high_price: Верхняя граница цены (опционально)
+    :param currency: Валюта сортировки и фильтра (usd, usd_foil, eur, tix)
+    :return: Список карт
+    """
+    return group_index(filter_choice, target).query(data_choice, amount, low_price, high_price, currency)
+
+
+def group_index(filter_choice: str, target: str) -> PriceIndex:
+    """
+    Получить индекс цен группы из кэша или построить его по хранилищу.
+
+    bulk-файл обычно загружает отдельный процесс (python -m api.bulk),
+    поэтому перед обращением к кэшу сверяется версия хранилища: после
+    загрузки с изменениями все индексы строятся заново.
+
+    :param filter_choice: Фильтр (card/set)
+    :param target: Точное имя карты или код набора
+    :return: Индекс цен группы
+    """
+    price_indexes.check_version(bulk_version())
+    key = f"{filter_choice}:{target.lower()}"
+    index = price_indexes.get(key)
+    if index is None:
+        index = PriceIndex(load_group(filter_choice, target))
+        price_indexes.set(key, index)
+    return index
+
+
+def bulk_sets() -> Dict:
+    """
+    Собрать список наборов из локального хранилища в формате ответа /sets.
+
+    :return: Словарь {'data': [{'code': ..., 'name': ...}, ...]}
+    """
+    query = BulkCard.select(BulkCard.set_code, BulkCard.set_name).distinct()
+    with bulk_database.connection_context():
+        return {'data': [{'code': code, 'name': name} for code, name in query.tuples()]}
+
+
+def bulk_card_names() -> List[str]:
+    """
+    Собрать имена всех карт локального хранилища (для api.names).
+
+    :return: Список имён без повторов
+    """
+    name = fn.json_extract(BulkCard.payload, '$.name')
+    query = BulkCard.select(fn.MIN(name)).group_by(BulkCard.name_key)
+    with bulk_database.connection_context():
+        return [value for value, in query.tuples() if value]
+
+
+async def download_bulk_file(client, path: str, bulk_type: str = 'default_cards') -> bool:
+    """
+    Скачать bulk-файл Scryfall, если он обновился с прошлой загрузки.
+
+    :param client: Клиент Scryfall (см. api.scryfall.ScryfallClient)
+    :param path: Куда сохранить файл
+    :param bulk_type: Тип bulk-данных
+    :return: True, если файл был скачан
+    """
+    info = await client.get_json(f"/bulk-data/{bulk_type.replace('_', '-')}")
+    if info is None:
+        return False
+    initialize_bulk_database()
+    with bulk_database.connection_context():
+        meta = BulkMeta.get_or_none(BulkMeta.key == bulk_type)
+    if meta is not None and meta.value == info['updated_at'] and os.path.exists(path):
+        return False
+    await client.download(info['download_uri'], path)
+    with bulk_database.connection_context():
+        BulkMeta.replace(key=bulk_type, value=info['updated_at']).execute()
+    return True
+
+
+async def refresh_bulk(client, path: str) -> Optional[Dict[str, int]]:
+    """
+    Скачать свежий bulk-файл и инкрементально обновить хранилище.
+
+    :param client: Клиент Scryfall (см. api.scryfall.ScryfallClient)
+    :param path: Путь к bulk-файлу
+    :return: Счётчики загрузки или None, если файл не изменился
+    """
+    if not await download_bulk_file(client, path):
+        return None
+    return await asyncio.to_thread(ingest_bulk_file, path)
+
+
+def main() -> None:
+    """
+    Загрузка bulk-данных из командной строки:
+    python -m api.bulk ingest <файл> или python -m api.bulk refresh <файл>.
+    """
+    parser = argparse.ArgumentParser(description="Локальная копия bulk-данных Scryfall")
+    parser.add_argument('action', choices=['ingest', 'refresh'])
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.action == 'ingest':
+        print(ingest_bulk_file(args.path))
+        return
+
+    from api.scryfall import client
+
+    async def run() -> None:
+        try:
+            print(await refresh_bulk(client, args.path))
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
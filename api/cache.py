@@ -0,0 +1,317 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import List, Optional, Dict, Set, Tuple, Iterable
+from peewee import chunked
+from api.card import Card, encode_cards, decode_cards
+from database.models import database, CachedResult, CacheTag
+from utils.metrics import CACHE_REQUESTS
+
+CacheEntry = Tuple[int, List[Card], float, Set[str]]
+
+
+def make_cache_key(data_choice: Optional[str], filter_choice: str, name: str,
+                   low_price: Optional[float] = None, high_price: Optional[float] = None,
+                   currency: str = 'usd') -> str:
+    """
+    Построить нормализованный ключ кэша для запроса.
+
+    :param data_choice: Порядок данных (low/high)
+    :param filter_choice: Фильтр (card/set)
+    :param name: Имя карты или набора
+    :param low_price: Нижняя граница цены (опционально)
+    :param high_price: Верхняя граница цены (опционально)
+    :param currency: Валюта сортировки и фильтра (для usd в ключ не входит)
+    :return: Ключ вида low|card|black lotus|-|- или low|card|black lotus|-|-|eur
+    """
+    price_range = ['-' if price is None else f"{price:.2f}" for price in (low_price, high_price)]
+    parts = [data_choice or 'custom', filter_choice, ' '.join(name.lower().split()), *price_range]
+    if currency != 'usd':
+        parts.append(currency)
+    return '|'.join(parts)
+
+
+def card_tags(cards: Iterable[Card]) -> Set[str]:
+    """
+    Получить метки набора и oracle id для списка карт.
+
+    :param cards: Список карт
+    :return: Множество меток set:<код> и oracle:<id>
+    """
+    tags = set()
+    for card in cards:
+        if card.set:
+            tags.add(f"set:{card.set}")
+        if card.oracle_id:
+            tags.add(f"oracle:{card.oracle_id}")
+    return tags
+
+
+def covers(entry_amount: int, entry_size: int, amount: int) -> bool:
+    """
+    Проверить, достаточно ли сохранённого результата для запроса.
+
+    Результат меньше entry_amount считается полным (карт больше нет),
+    поэтому в кэш попадают только результаты, для которых получены все
+    нужные страницы (см. api.pagination.PageStream.complete).
+
+    :param entry_amount: Количество карт, для которого получен результат (0 - все)
+    :param entry_size: Сколько карт в сохранённом результате
+    :param amount: Запрошенное количество карт (0 - все)
+    :return: True, если результат можно отдать из кэша
+    """
+    if entry_amount == 0 or entry_size < entry_amount:
+        return True
+    return amount != 0 and amount <= entry_amount
+
+
+class StaleCards(list):
+    """
+    Результат из кэша с истёкшим сроком жизни, показанный, пока Scryfall недоступен.
+    """
+
+    def __init__(self, cards: List[Card], saved_at: float) -> None:
+        """
+        :param cards: Список карт
+        :param saved_at: Когда результат был получен от Scryfall (time.time())
+        """
+        super().__init__(cards)
+        self.saved_at = saved_at
+
+
+class ResultCache:
+    """
+    Двухуровневый кэш результатов fetch_data: LRU в памяти процесса с TTL
+    и постоянный уровень в SQLite (таблица CachedResult), переживающий
+    перезапуск бота. Просроченные записи хранятся ещё stale_ttl секунд,
+    чтобы было что показать, пока Scryfall недоступен (см. get_stale).
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 43200.0, persistent: bool = True,
+                 stale_ttl: float = 0.0) -> None:
+        """
+        :param max_size: Максимальное число записей в памяти
+        :param ttl: Время жизни записи в секундах
+        :param persistent: Использовать ли уровень SQLite
+        :param stale_ttl: Сколько секунд после истечения запись можно отдать через get_stale
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.persistent = persistent
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self.stats: Dict[str, int] = {
+            'memory_hits': 0,
+            'persistent_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'stale_hits': 0,
+        }
+
+    async def get(self, key: str, amount: int) -> Optional[List[Card]]:
+        """
+        Получить результат из кэша.
+
+        :param key: Ключ кэша (см. make_cache_key)
+        :param amount: Запрошенное количество карт (0 - все)
+        :return: Список карт или None при промахе
+        """
+        entry = self._get_memory(key)
+        if entry is not None and covers(entry[0], len(entry[1]), amount):
+            self.stats['memory_hits'] += 1
+            CACHE_REQUESTS.labels('result', 'memory_hit').inc()
+            return entry[1][:amount] if amount else entry[1]
+
+        if self.persistent:
+            entry = await asyncio.to_thread(self._get_persistent, key)
+            if entry is not None and covers(entry[0], len(entry[1]), amount):
+                self.stats['persistent_hits'] += 1
+                CACHE_REQUESTS.labels('result', 'persistent_hit').inc()
+                self._put_memory(key, entry)
+                return entry[1][:amount] if amount else entry[1]
+
+        self.stats['misses'] += 1
+        CACHE_REQUESTS.labels('result', 'miss').inc()
+        return None
+
+    async def set(self, key: str, amount: int, cards: List[Card]) -> None:
+        """
+        Сохранить результат в оба уровня кэша.
+
+        :param key: Ключ кэша (см. make_cache_key)
+        :param amount: Количество карт, для которого получен результат (0 - все)
+        :param cards: Список карт
+        """
+        entry = (amount, cards, time.time() + self.ttl, card_tags(cards))
+        self._put_memory(key, entry)
+        if self.persistent:
+            await asyncio.to_thread(self._set_persistent, key, entry)
+
+    async def get_stale(self, key: str, amount: int) -> Optional[StaleCards]:
+        """
+        Получить результат, даже если срок его жизни истёк (не дольше stale_ttl).
+
+        :param key: Ключ кэша (см. make_cache_key)
+        :param amount: Запрошенное количество карт (0 - все)
+        :return: Список карт с временем получения или None
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None or entry[2] + self.stale_ttl <= now or not covers(entry[0], len(entry[1]), amount):
+            entry = None
+            if self.persistent:
+                entry = await asyncio.to_thread(self._get_persistent, key, now - self.stale_ttl)
+                if entry is not None and not covers(entry[0], len(entry[1]), amount):
+                    entry = None
+        if entry is None:
+            return None
+        self.stats['stale_hits'] += 1
+        CACHE_REQUESTS.labels('result', 'stale_hit').inc()
+        cards = entry[1][:amount] if amount else entry[1]
+        return StaleCards(cards, entry[2] - self.ttl)
+
+    async def expires_at(self, key: str, amount: int) -> Optional[float]:
+        """
+        Узнать, когда истекает сохранённый результат, не считая обращение
+        попаданием или промахом.
+
+        :param key: Ключ кэша (см. make_cache_key)
+        :param amount: Запрошенное количество карт (0 - все)
+        :return: Время истечения (time.time()) или None, если подходящего результата нет
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] > time.time() and covers(entry[0], len(entry[1]), amount):
+            return entry[2]
+        if self.persistent:
+            return await asyncio.to_thread(self._expires_persistent, key, amount)
+        return None
+
+    async def invalidate(self, set_code: Optional[str] = None, oracle_id: Optional[str] = None) -> int:
+        """
+        Удалить из кэша результаты, содержащие карты набора или oracle id.
+
+        :param set_code: Код набора
+        :param oracle_id: Oracle id карты
+        :return: Количество удалённых записей в памяти
+        """
+        tags = []
+        if set_code:
+            tags.append(f"set:{set_code.lower()}")
+        if oracle_id:
+            tags.append(f"oracle:{oracle_id}")
+
+        keys = set()
+        for tag in tags:
+            keys |= self._tags.get(tag, set())
+        for key in keys:
+            self._remove_memory(key)
+        self.stats['invalidations'] += len(keys)
+
+        if self.persistent and tags:
+            await asyncio.to_thread(self._invalidate_persistent, tags)
+        return len(keys)
+
+    async def clear(self) -> None:
+        """
+        Полностью очистить кэш.
+        """
+        self._entries.clear()
+        self._tags.clear()
+        if self.persistent:
+            await asyncio.to_thread(self._clear_persistent)
+
+    async def purge_expired(self) -> None:
+        """
+        Удалить из постоянного уровня записи, просроченные больше чем на stale_ttl.
+        """
+        if self.persistent:
+            await asyncio.to_thread(self._purge_persistent)
+
+    def _get_memory(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            self.stats['expirations'] += 1
+            # Запись остаётся в памяти для get_stale, пока не выйдет stale_ttl
+            if entry[2] + self.stale_ttl <= time.time():
+                self._remove_memory(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_memory(self, key: str, entry: CacheEntry) -> None:
+        self._remove_memory(key)
+        self._entries[key] = entry
+        for tag in entry[3]:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove_memory(oldest)
+            self.stats['evictions'] += 1
+
+    def _remove_memory(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[3]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    @staticmethod
+    def _get_persistent(key: str, valid_after: Optional[float] = None) -> Optional[CacheEntry]:
+        if valid_after is None:
+            valid_after = time.time()
+        row = CachedResult.get_or_none((CachedResult.key == key) & (CachedResult.expires_at > valid_after))
+        if row is None:
+            return None
+        cards = decode_cards(row.payload)
+        return row.amount, cards, row.expires_at, card_tags(cards)
+
+    @staticmethod
+    def _expires_persistent(key: str, amount: int) -> Optional[float]:
+        row = (CachedResult
+               .select(CachedResult.amount, CachedResult.expires_at)
+               .where((CachedResult.key == key) & (CachedResult.expires_at > time.time()))
+               .first())
+        # Размер результата без разбора payload неизвестен, поэтому неполный результат считается неподходящим
+        if row is None or not (row.amount == 0 or amount != 0 and amount <= row.amount):
+            return None
+        return row.expires_at
+
+    @staticmethod
+    def _set_persistent(key: str, entry: CacheEntry) -> None:
+        amount, cards, expires_at, tags = entry
+        with database.atomic():
+            CachedResult.replace(key=key, amount=amount, payload=encode_cards(cards),
+                                 expires_at=expires_at).execute()
+            CacheTag.delete().where(CacheTag.key == key).execute()
+            for batch in chunked([{'tag': tag, 'key': key} for tag in tags], 400):
+                CacheTag.insert_many(batch).execute()
+
+    @staticmethod
+    def _invalidate_persistent(tags: List[str]) -> None:
+        with database.atomic():
+            keys = CacheTag.select(CacheTag.key).where(CacheTag.tag.in_(tags))
+            CachedResult.delete().where(CachedResult.key.in_(keys)).execute()
+            CacheTag.delete().where(CacheTag.key.in_(
+                CacheTag.select(CacheTag.key).where(CacheTag.tag.in_(tags)))).execute()
+
+    def _purge_persistent(self) -> None:
+        deadline = time.time() - self.stale_ttl
+        with database.atomic():
+            expired = CachedResult.select(CachedResult.key).where(CachedResult.expires_at <= deadline)
+            CacheTag.delete().where(CacheTag.key.in_(expired)).execute()
+            CachedResult.delete().where(CachedResult.expires_at <= deadline).execute()
+
+    @staticmethod
+    def _clear_persistent() -> None:
+        with database.atomic():
+            CachedResult.delete().execute()
+            CacheTag.delete().execute()
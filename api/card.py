@@ -0,0 +1,115 @@
+from typing import List, Optional, Tuple, Dict, Any, Iterable
+import msgspec
+
+
+class Prices(msgspec.Struct, frozen=True, gc=False, omit_defaults=True):
+    """
+    Цены карты. Scryfall присылает цены строками, при разборе они сразу
+    переводятся в числа; None - цены нет.
+    """
+    usd: Optional[float] = None
+    usd_foil: Optional[float] = None
+    usd_etched: Optional[float] = None
+    eur: Optional[float] = None
+    eur_foil: Optional[float] = None
+    tix: Optional[float] = None
+
+    def get(self, currency: str) -> Optional[float]:
+        """
+        :param currency: Валюта (usd, usd_foil, eur, tix, ...)
+        :return: Цена или None
+        """
+        return getattr(self, currency, None)
+
+
+class ImageUris(msgspec.Struct, frozen=True, gc=False, omit_defaults=True):
+    """
+    Ссылки на изображения карты; бот использует только normal.
+    """
+    normal: Optional[str] = None
+
+
+class Card(msgspec.Struct, frozen=True, gc=False, omit_defaults=True):
+    """
+    Данные карты Scryfall, которые использует бот.
+
+    Неизменяемая структура со слотами: при разборе JSON остальные поля
+    карты (легальность, тексты, вложенные объекты) пропускаются, не создавая
+    объектов Python.
+    """
+    id: str
+    name: str
+    oracle_id: Optional[str] = None
+    set: str = ''
+    set_name: str = ''
+    type_line: str = ''
+    rarity: str = ''
+    collector_number: str = ''
+    frame_effects: Tuple[str, ...] = ()
+    prices: Prices = Prices()
+    image_uris: Optional[ImageUris] = None
+
+    @property
+    def image_url(self) -> Optional[str]:
+        """
+        :return: Ссылка на изображение normal или None
+        """
+        return self.image_uris.normal if self.image_uris is not None else None
+
+
+class SearchPage(msgspec.Struct, gc=False):
+    """
+    Страница ответа /cards/search.
+    """
+    data: List[Card] = []
+    has_more: bool = False
+    total_cards: int = 0
+    next_page: Optional[str] = None
+
+
+class CardIdentifier(msgspec.Struct, frozen=True, gc=False, omit_defaults=True):
+    """
+    Идентификатор карты в запросе /cards/collection (бот ищет только по имени).
+    """
+    name: str = ''
+
+
+class CollectionPage(msgspec.Struct, gc=False):
+    """
+    Ответ /cards/collection: найденные карты и ненайденные идентификаторы.
+    """
+    data: List[Card] = []
+    not_found: List[CardIdentifier] = []
+
+
+# strict=False разрешает перевод строковых цен Scryfall в числа
+page_decoder = msgspec.json.Decoder(SearchPage, strict=False)
+cards_decoder = msgspec.json.Decoder(List[Card], strict=False)
+collection_decoder = msgspec.json.Decoder(CollectionPage, strict=False)
+encoder = msgspec.json.Encoder()
+
+
+def to_card(data: Dict[str, Any]) -> Card:
+    """
+    Преобразовать уже разобранный JSON карты в Card.
+
+    :param data: Данные карты Scryfall
+    :return: Карта
+    """
+    return msgspec.convert(data, Card, strict=False)
+
+
+def encode_cards(cards: Iterable[Card]) -> str:
+    """
+    :param cards: Список карт
+    :return: JSON-массив карт
+    """
+    return encoder.encode(list(cards)).decode('utf-8')
+
+
+def decode_cards(payload: str) -> List[Card]:
+    """
+    :param payload: JSON-массив карт (в том числе в исходном формате Scryfall)
+    :return: Список карт
+    """
+    return cards_decoder.decode(payload)
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Dict, Iterable, Optional
+from config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, IMAGE_FETCH_CONCURRENCY
+
+
+class ImageDiskCache:
+    """
+    Дисковый кэш изображений карт с ограничением общего размера.
+
+    Файлы называются по хэшу адреса; время изменения файла обновляется
+    при каждом обращении, и при превышении лимита удаляются файлы, к которым
+    дольше всего не обращались.
+    """
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES) -> None:
+        """
+        :param directory: Каталог кэша
+        :param max_bytes: Максимальный общий размер файлов в байтах
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def path_for(self, url: str) -> str:
+        """
+        :param url: Адрес изображения
+        :return: Путь к файлу в кэше
+        """
+        name = hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+        extension = os.path.splitext(url.split('?', 1)[0])[1] or '.jpg'
+        return os.path.join(self.directory, name[:2], name + extension)
+
+    def get(self, url: str) -> Optional[bytes]:
+        """
+        :param url: Адрес изображения
+        :return: Содержимое файла или None, если его нет в кэше
+        """
+        path = self.path_for(url)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, url: str, data: bytes) -> None:
+        """
+        Сохранить изображение и при необходимости освободить место.
+
+        :param url: Адрес изображения
+        :param data: Содержимое файла
+        """
+        path = self.path_for(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.part"
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        existed = os.path.exists(path)
+        os.replace(temp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            elif not existed:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self) -> Iterable[os.DirEntry]:
+        if not os.path.isdir(self.directory):
+            return
+        for bucket in os.scandir(self.directory):
+            if bucket.is_dir():
+                yield from (entry for entry in os.scandir(bucket.path)
+                            if entry.is_file() and not entry.name.endswith('.part'))
+
+    def _scan_size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._files())
+
+    def _evict(self) -> None:
+        entries = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self._files()))
+        size = sum(size for _, size, _ in entries)
+        # Освобождается место с запасом, чтобы не сканировать каталог на каждой записи
+        target = self.max_bytes * 0.9
+        for _, file_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        self._size = size
+
+
+async def fetch_images(client, urls: Iterable[str], disk_cache: ImageDiskCache,
+                       concurrency: int = IMAGE_FETCH_CONCURRENCY) -> Dict[str, bytes]:
+    """
+    Получить изображения из дискового кэша или скачать недостающие одновременно.
+
+    Изображения лежат на CDN Scryfall, на который не распространяется
+    ограничение частоты API, поэтому запросы идут мимо планировщика.
+
+    :param client: Клиент Scryfall (см. api.scryfall.ScryfallClient)
+    :param urls: Адреса изображений
+    :param disk_cache: Дисковый кэш
+    :param concurrency: Максимальное число одновременных загрузок
+    :return: Словарь {адрес: содержимое}; неудачные загрузки пропускаются
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(url: str) -> Optional[bytes]:
+        data = await asyncio.to_thread(disk_cache.get, url)
+        if data is not None:
+            return data
+        async with semaphore:
+            data = await client.fetch_bytes(url)
+        if data is not None:
+            await asyncio.to_thread(disk_cache.put, url, data)
+        return data
+
+    urls = list(dict.fromkeys(urls))
+    results = await asyncio.gather(*(fetch(url) for url in urls), return_exceptions=True)
+    return {url: data for url, data in zip(urls, results) if isinstance(data, bytes)}
+
+
+# Общий дисковый кэш изображений
+image_cache = ImageDiskCache()
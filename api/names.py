@@ -0,0 +1,215 @@
+import asyncio
+import bisect
+import logging
+import re
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set
+import numpy as np
+from api.resilience import ScryfallUnavailable
+from api.scheduler import background_priority
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_card_name(value: str) -> str:
+    """
+    Привести имя карты или поисковую строку к виду для индекса.
+
+    :param value: Имя карты или начало имени
+    :return: Строка в нижнем регистре без диакритики, апострофов и знаков препинания
+    """
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    value = re.sub(r"['’]", '', value.lower())
+    value = re.sub(r"[^\w]+", ' ', value)
+    return ' '.join(value.split())
+
+
+def trigrams(value: str) -> Set[str]:
+    """
+    :param value: Нормализованная строка
+    :return: Множество триграмм строки, дополненной пробелами по краям
+    """
+    padded = f"  {value} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class CardNameIndex:
+    """
+    Индекс имён всех карт в памяти для автодополнения (inline-режим).
+
+    Поиск по началу имени или любого слова в имени идёт бинарным поиском
+    по отсортированному списку «хвостов» имён, начинающихся с границы слова.
+    Опечатки находятся по общим триграммам: для каждой триграммы хранится
+    массив номеров имён, а сходство всех имён с запросом считается
+    одним bincount. Индекс загружается из каталога /catalog/card-names
+    или из локальной копии bulk-данных и обновляется в фоне по истечении TTL.
+    """
+
+    def __init__(self, client=None, ttl: float = 86400.0) -> None:
+        """
+        :param client: Клиент Scryfall (см. api.scryfall.ScryfallClient)
+        :param ttl: Время жизни индекса в секундах
+        """
+        self.client = client
+        self.ttl = ttl
+        self._names: List[str] = []
+        self._suffixes: List[str] = []
+        self._suffix_ids: List[int] = []
+        self._suffix_whole: List[bool] = []
+        self._postings: Dict[str, np.ndarray] = {}
+        self._trigram_counts = np.zeros(0, dtype=np.int32)
+        self._loaded_at: float = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(self._names)
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def load(self, names: List[str]) -> None:
+        """
+        Построить индексы по списку имён.
+
+        :param names: Имена карт
+        """
+        names = sorted(set(names))
+        suffixes = []
+        postings: Dict[str, List[int]] = {}
+        counts = np.zeros(len(names), dtype=np.int32)
+        for name_id, name in enumerate(names):
+            key = normalize_card_name(name)
+            words = key.split(' ')
+            for position in range(len(words)):
+                suffixes.append((' '.join(words[position:]), name_id, position == 0))
+            grams = trigrams(key)
+            counts[name_id] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(name_id)
+        suffixes.sort()
+        self._names = names
+        self._suffixes = [suffix for suffix, _, _ in suffixes]
+        self._suffix_ids = [name_id for _, name_id, _ in suffixes]
+        self._suffix_whole = [whole for _, _, whole in suffixes]
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._trigram_counts = counts
+        self._loaded_at = time.monotonic()
+
+    async def refresh(self) -> None:
+        """
+        Загрузить каталог имён с Scryfall (или из bulk-данных в автономном режиме, см. loader).
+        """
+        async with self._lock:
+            await self._refresh()
+
+    async def _refresh(self) -> None:
+        catalog = await self.client.get_json("/catalog/card-names")
+        if catalog and catalog.get('data'):
+            await asyncio.to_thread(self.load, catalog['data'])
+
+    async def ensure_loaded(self) -> None:
+        """
+        Запустить загрузку индекса, если его ещё нет или он устарел. Не ждёт
+        загрузки: пока индекс пуст, поиск просто ничего не находит.
+        """
+        if self.client is not None and (not self.is_loaded or self.is_stale):
+            self._schedule_refresh()
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        with background_priority():
+            try:
+                await self.refresh()
+            except ScryfallUnavailable as e:
+                logger.warning("Не удалось загрузить индекс имён карт: %s", e)
+            except Exception:
+                logger.exception("Не удалось загрузить индекс имён карт")
+            finally:
+                # Неудачная загрузка повторяется не раньше, чем через минуту
+                if not self.is_loaded:
+                    self._loaded_at = time.monotonic() - self.ttl + 60
+
+    async def close(self) -> None:
+        """
+        Остановить фоновое обновление индекса.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        self._refresh_task = None
+
+    def find_prefix(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Найти карты, имя или одно из слов имени которых начинается с указанной строки.
+        Сначала идут совпадения с начала имени, затем более короткие имена.
+
+        :param prefix: Начало имени или слова
+        :param limit: Максимальное количество результатов
+        :return: Список имён
+        """
+        key = normalize_card_name(prefix)
+        if not key:
+            return []
+        position = bisect.bisect_left(self._suffixes, key)
+        found: Dict[int, bool] = {}
+        # Кандидатов берётся с запасом, чтобы совпадения с начала имени не вытеснялись словами в середине
+        for index in range(position, min(position + limit * 20, len(self._suffixes))):
+            if not self._suffixes[index].startswith(key):
+                break
+            name_id = self._suffix_ids[index]
+            found[name_id] = found.get(name_id, False) or self._suffix_whole[index]
+        ordered = sorted(found, key=lambda name_id: (not found[name_id], len(self._names[name_id]),
+                                                     self._names[name_id]))
+        return [self._names[name_id] for name_id in ordered[:limit]]
+
+    def find_fuzzy(self, value: str, limit: int = 10, cutoff: float = 0.5) -> List[str]:
+        """
+        Найти карты с похожим именем (опечатки, переставленные буквы).
+
+        Имена ранжируются по доле триграмм запроса, найденных в имени, а при
+        равенстве - по коэффициенту Жаккара, то есть более короткие имена выше.
+
+        :param value: Имя или начало имени
+        :param limit: Максимальное количество результатов
+        :param cutoff: Минимальная доля триграмм запроса от 0 до 1
+        :return: Список имён по убыванию сходства
+        """
+        grams = trigrams(normalize_card_name(value))
+        arrays = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not arrays:
+            return []
+        shared = np.bincount(np.concatenate(arrays), minlength=len(self._names))
+        containment = shared / len(grams)
+        scores = containment + shared / (len(grams) + self._trigram_counts - shared) * 1e-3
+        count = min(limit, len(scores))
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [self._names[name_id] for name_id in best if containment[name_id] >= cutoff]
+
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        """
+        Автодополнение: совпадения по началу имени или слова, затем похожие имена.
+
+        :param query: Введённый текст
+        :param limit: Максимальное количество результатов
+        :return: Список имён
+        """
+        names = self.find_prefix(query, limit)
+        if len(names) < limit and len(normalize_card_name(query)) >= 3:
+            seen = set(names)
+            names.extend(name for name in self.find_fuzzy(query, limit) if name not in seen)
+        return names[:limit]
@@ -0,0 +1,128 @@
+import asyncio
+import math
+from typing import AsyncIterator, List, Optional, Dict, Any
+from api.card import Card, SearchPage
+from api.scheduler import request_budget
+from utils.metrics import stage
+
+# Размер страницы /cards/search у Scryfall
+PAGE_SIZE = 175
+
+
+class PageStream:
+    """
+    Асинхронный итератор страниц поискового запроса (см. iter_pages).
+
+    После обхода complete показывает, получены ли все нужные страницы:
+    если одна из страниц не пришла, выдача обрывается на ней, и такой
+    результат нельзя сохранять в кэш как полный.
+    """
+
+    def __init__(self, client, url: str, params: Dict[str, Any], limit: Optional[int] = None,
+                 concurrency: int = 4) -> None:
+        """
+        :param client: Клиент Scryfall (см. api.scryfall.ScryfallClient)
+        :param url: Путь поискового запроса
+        :param params: Параметры запроса
+        :param limit: Сколько первых карт нужно в порядке сортировки сервера (None - все)
+        :param concurrency: Максимальное число одновременных запросов страниц
+        """
+        self.client = client
+        self.url = url
+        self.params = params
+        self.limit = limit
+        self.concurrency = concurrency
+        self.complete = False
+
+    def __aiter__(self) -> AsyncIterator[List[Card]]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[List[Card]]:
+        client, url, params = self.client, self.url, self.params
+        self.complete = False
+        with stage('http_page'):
+            first_page = await client.get_page(url, params=params)
+        if first_page is None:
+            return
+
+        cards = first_page.data
+        yield cards
+        if not first_page.has_more or not cards:
+            self.complete = True
+            return
+
+        page_size = len(cards) or PAGE_SIZE
+        needed = first_page.total_cards or len(cards)
+        if self.limit is not None:
+            needed = min(needed, self.limit)
+        last_page = math.ceil(needed / page_size)
+        if last_page <= 1:
+            self.complete = True
+            return
+        # Фоновая задача с лимитом запросов (см. api.scheduler.limit_requests) получает
+        # столько страниц, сколько позволяет остаток лимита; результат тогда неполный
+        budget = request_budget.get()
+        within_budget = budget is None or last_page - 1 <= budget.remaining
+        if not within_budget:
+            last_page = 1 + budget.remaining
+            if last_page <= 1:
+                return
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_page(page: int) -> Optional[SearchPage]:
+            async with semaphore:
+                with stage('http_page'):
+                    return await client.get_page(url, params={**params, 'page': page})
+
+        tasks = [asyncio.create_task(fetch_page(page)) for page in range(2, last_page + 1)]
+        try:
+            for task in tasks:
+                data = await task
+                # Без пропущенной страницы порядок сортировки нарушится, поэтому
+                # результат обрезается на первой неудачной странице
+                if data is None:
+                    return
+                yield data.data
+            self.complete = within_budget
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def iter_pages(client, url: str, params: Dict[str, Any], limit: Optional[int] = None,
+               concurrency: int = 4) -> PageStream:
+    """
+    Получать страницы поискового запроса по порядку, запрашивая их параллельно.
+
+    Первая страница запрашивается отдельно и отдаётся сразу: по полю
+    total_cards вычисляется число оставшихся страниц, которые затем
+    запрашиваются одновременно через параметр page, а не по цепочке next_page.
+
+    :param client: Клиент Scryfall (см. api.scryfall.ScryfallClient)
+    :param url: Путь поискового запроса
+    :param params: Параметры запроса
+    :param limit: Сколько первых карт нужно в порядке сортировки сервера (None - все)
+    :param concurrency: Максимальное число одновременных запросов страниц
+    :return: Асинхронный итератор карт каждой страницы; после обхода его поле
+        complete показывает, получены ли все страницы
+    """
+    return PageStream(client, url, params, limit, concurrency)
+
+
+async def fetch_pages(client, url: str, params: Dict[str, Any], limit: Optional[int] = None,
+                      concurrency: int = 4) -> List[Card]:
+    """
+    Получить все нужные страницы поискового запроса одним списком (см. iter_pages).
+
+    :param client: Клиент Scryfall (см. api.scryfall.ScryfallClient)
+    :param url: Путь поискового запроса
+    :param params: Параметры запроса
+    :param limit: Сколько первых карт нужно в порядке сортировки сервера (None - все)
+    :param concurrency: Максимальное число одновременных запросов страниц
+    :return: Карты всех нужных страниц по порядку
+    """
+    cards = []
+    async for page in iter_pages(client, url, params, limit, concurrency):
+        cards.extend(page)
+    return cards
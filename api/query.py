@@ -0,0 +1,85 @@
+from typing import List, Optional, Dict, NamedTuple
+from api.card import Card
+
+
+# Валюты, по которым Scryfall умеет сортировать и фильтровать выдачу (order=eur, eur>=1)
+SEARCH_CURRENCIES = ('usd', 'eur', 'tix')
+
+
+class QueryPlan(NamedTuple):
+    """
+    План поискового запроса к Scryfall.
+
+    params - параметры /cards/search, в которые перенесены фильтр и сортировка;
+    limit - сколько первых карт в порядке сервера нужно получить (None - все);
+    amount - сколько карт вернуть пользователю (0 - все);
+    price_filter - был ли задан ценовой диапазон;
+    currency - валюта сортировки и фильтра.
+    """
+    params: Dict[str, str]
+    limit: Optional[int]
+    amount: int
+    price_filter: bool
+    currency: str = 'usd'
+
+    def apply_fallback(self, cards: List[Card]) -> List[Card]:
+        """
+        Доработать ответ сервера локально только там, где это нужно:
+        убрать карты без цены при ценовом фильтре и гарантировать, что
+        карты без цены в валюте currency идут после карт с ценой.
+
+        :param cards: Карты в порядке сортировки сервера
+        :return: Итоговый список карт
+        """
+        priced = [card for card in cards if card.prices.get(self.currency) is not None]
+        if not self.price_filter and len(priced) != len(cards):
+            priced.extend(card for card in cards if card.prices.get(self.currency) is None)
+        return priced[:self.amount] if self.amount else priced
+
+
+def format_price(price: float) -> str:
+    """
+    Записать цену в синтаксисе поиска Scryfall.
+
+    :param price: Цена
+    :return: Строка вида 1.5
+    """
+    return f"{price:.2f}".rstrip('0').rstrip('.')
+
+
+def plan_query(data_choice: Optional[str], filter_choice: str, target: str, amount: int,
+               low_price: Optional[float] = None, high_price: Optional[float] = None,
+               currency: str = 'usd') -> QueryPlan:
+    """
+    Построить запрос, в котором сортировку и ценовой фильтр выполняет Scryfall.
+
+    :param data_choice: Порядок данных (low/high или None для /custom)
+    :param filter_choice: Фильтр (card/set)
+    :param target: Точное имя карты или код набора
+    :param amount: Количество карт (0 - все)
+    :param low_price: Нижняя граница цены (опционально)
+    :param high_price: Верхняя граница цены (опционально)
+    :param currency: Валюта сортировки и фильтра (см. SEARCH_CURRENCIES)
+    :return: План запроса
+    """
+    if filter_choice == "card":
+        terms = ['!"{}"'.format(target.replace('"', ''))]
+    else:
+        terms = [f'set:{target}']
+
+    if low_price is not None:
+        terms.append(f'{currency}>={format_price(low_price)}')
+    if high_price is not None:
+        terms.append(f'{currency}<={format_price(high_price)}')
+
+    params = {
+        'q': ' '.join(terms),
+        'order': currency,
+        'dir': 'desc' if data_choice == "high" else 'asc',
+        'unique': 'prints',
+    }
+    # Карты без цены Scryfall ставит в конец при любом направлении сортировки,
+    # поэтому первых amount карт ответа достаточно для /low и /high
+    limit = amount if data_choice and amount else None
+    price_filter = low_price is not None or high_price is not None
+    return QueryPlan(params, limit, amount, price_filter, currency)
@@ -0,0 +1,128 @@
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Deque, Optional
+from utils.metrics import CIRCUIT_STATE
+
+
+class ScryfallUnavailable(Exception):
+    """
+    Scryfall не ответил: исчерпаны повторные попытки или разомкнут предохранитель.
+    """
+
+
+class CircuitBreaker:
+    """
+    Предохранитель: после failure_threshold неудач подряд запросы к
+    Scryfall сразу завершаются ошибкой, не дожидаясь таймаутов. Через
+    reset_timeout секунд пропускается один пробный запрос; удачный
+    замыкает предохранитель, неудачный снова размыкает.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        """
+        :param failure_threshold: Сколько неудач подряд размыкают предохранитель
+        :param reset_timeout: Через сколько секунд пропустить пробный запрос
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._changed_at = 0.0
+
+    def allow(self) -> bool:
+        """
+        :return: Можно ли отправить запрос
+        """
+        if self.state == self.CLOSED:
+            return True
+        # Пробный запрос мог быть отменён, поэтому в полуоткрытом состоянии
+        # следующий пробный пропускается через тот же reset_timeout
+        if time.monotonic() - self._changed_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        self._changed_at = time.monotonic()
+        CIRCUIT_STATE.set({self.CLOSED: 0, self.HALF_OPEN: 0.5, self.OPEN: 1}[state])
+
+
+class LatencyTracker:
+    """
+    Скользящее окно длительностей удачных запросов для выбора момента
+    дублирующего (hedged) запроса.
+    """
+
+    def __init__(self, window: int = 200, quantile: float = 0.95, min_samples: int = 20,
+                 min_delay: float = 0.05) -> None:
+        """
+        :param window: Сколько последних замеров хранить
+        :param quantile: Квантиль, после которого отправляется дублирующий запрос
+        :param min_samples: Сколько замеров нужно, прежде чем дублировать запросы
+        :param min_delay: Минимальная задержка дублирующего запроса в секундах
+        """
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        :return: Через сколько секунд отправлять дублирующий запрос или None, если замеров мало
+        """
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return max(self.min_delay, ordered[int(self.quantile * (len(ordered) - 1))])
+
+
+def retry_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Задержка перед повторной попыткой: экспоненциальная с полным случайным разбросом.
+
+    :param attempt: Номер неудачной попытки (с 0)
+    :param base: Задержка после первой неудачи в секундах
+    :param cap: Максимальная задержка в секундах
+    :return: Задержка в секундах
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_retry_after(value: Optional[str], cap: float) -> Optional[float]:
+    """
+    Разобрать заголовок Retry-After (секунды или HTTP-дата).
+
+    :param value: Значение заголовка
+    :param cap: Максимальная задержка в секундах
+    :return: Задержка в секундах или None, если заголовка нет или он некорректен
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(cap, max(0.0, seconds))
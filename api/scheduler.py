@@ -0,0 +1,230 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+# Приоритеты запросов: чем меньше число, тем раньше запрос уходит в Scryfall
+INTERACTIVE = 0
+BACKGROUND = 10
+
+request_priority: ContextVar[int] = ContextVar('request_priority', default=INTERACTIVE)
+
+
+class RequestBudget:
+    """
+    Лимит запросов к Scryfall для одной фоновой задачи (например, прохода
+    прогрева кэша). Учитываются только запросы, отправленные внутри
+    limit_requests с этим лимитом; объединённые с уже идущими не считаются.
+    """
+
+    def __init__(self, limit: int) -> None:
+        """
+        :param limit: Сколько запросов можно отправить
+        """
+        self.limit = limit
+        self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - self.used)
+
+
+request_budget: ContextVar[Optional[RequestBudget]] = ContextVar('request_budget', default=None)
+
+
+@contextlib.contextmanager
+def background_priority() -> Iterator[None]:
+    """
+    Выполнить запросы внутри блока с фоновым приоритетом
+    (обновление каталогов, прогрев кэша).
+    """
+    token = request_priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+@contextlib.contextmanager
+def limit_requests(budget: RequestBudget) -> Iterator[RequestBudget]:
+    """
+    Учитывать запросы внутри блока в budget; постраничный поиск
+    (см. api.pagination) не запрашивает страниц сверх остатка лимита.
+
+    :param budget: Лимит запросов
+    """
+    token = request_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        request_budget.reset(token)
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов «ведро токенов».
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        :param rate: Сколько токенов добавляется в секунду
+        :param capacity: Максимальное число накопленных токенов
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self) -> float:
+        """
+        :return: Сколько секунд ждать до появления токена (0 - токен есть)
+        """
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """
+        Забрать один токен (после того, как delay() вернул 0).
+        """
+        self._refill()
+        self.tokens -= 1
+
+
+class RequestScheduler:
+    """
+    Общий планировщик запросов к Scryfall.
+
+    Запросы выстраиваются в очередь с приоритетами и отправляются не чаще,
+    чем позволяет ведро токенов. Одинаковые запросы, пока первый из них
+    не завершён, объединяются: все вызывающие получают один результат.
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = 10) -> None:
+        """
+        :param rate: Допустимое число запросов в секунду
+        :param burst: Сколько запросов можно отправить подряд без ожидания
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self._queue: List[Tuple[int, int, str]] = []
+        self._pending: Dict[str, Tuple[int, Callable[[], Awaitable[Any]], asyncio.Future]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {'submitted': 0, 'coalesced': 0, 'sent': 0, 'background': 0}
+
+    async def submit(self, key: str, factory: Callable[[], Awaitable[Any]],
+                     priority: Optional[int] = None) -> Any:
+        """
+        Поставить запрос в очередь и дождаться результата.
+
+        :param key: Ключ запроса; запросы с одинаковым ключом объединяются
+        :param factory: Функция без аргументов, выполняющая запрос
+        :param priority: Приоритет (по умолчанию берётся из request_priority)
+        :return: Результат factory()
+        """
+        if priority is None:
+            priority = request_priority.get()
+        self.stats['submitted'] += 1
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            pending = self._pending.get(key)
+            if pending is not None and priority < pending[0]:
+                # Интерактивный запрос поднимает приоритет ожидающего фонового
+                self._pending[key] = (priority, pending[1], future)
+                heapq.heappush(self._queue, (priority, next(self._counter), key))
+            return await asyncio.shield(future)
+
+        budget = request_budget.get()
+        if budget is not None:
+            budget.used += 1
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._inflight[key] = future
+        self._pending[key] = (priority, factory, future)
+        heapq.heappush(self._queue, (priority, next(self._counter), key))
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        return await asyncio.shield(future)
+
+    @property
+    def interactive_pending(self) -> int:
+        """
+        :return: Сколько интерактивных запросов ждут отправки
+        """
+        return sum(1 for priority, _, _ in self._pending.values() if priority < BACKGROUND)
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while True:
+            while not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            delay = self.bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            priority, _, key = heapq.heappop(self._queue)
+            pending = self._pending.get(key)
+            # Устаревшая запись после повышения приоритета или уже отправленный запрос
+            if pending is None or pending[0] != priority:
+                continue
+            del self._pending[key]
+            self.bucket.take()
+            self.stats['sent'] += 1
+            if priority >= BACKGROUND:
+                self.stats['background'] += 1
+            task = asyncio.create_task(self._run(key, pending[1], pending[2]))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: str, factory: Callable[[], Awaitable[Any]], future: asyncio.Future) -> None:
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            if not future.done():
+                future.set_exception(error)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def close(self) -> None:
+        """
+        Остановить диспетчер и отменить запросы в очереди.
+        """
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+        for task in list(self._running):
+            task.cancel()
+        for _, _, future in self._pending.values():
+            future.cancel()
+        for key in self._pending:
+            self._inflight.pop(key, None)
+        self._pending.clear()
+        self._queue.clear()
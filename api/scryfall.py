@@ -1,28 +1,418 @@
-import requests
-from typing import List, Optional, Dict
+import asyncio
+import os
+import time
+import httpx
+import msgspec
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple, Mapping
+from config import SCRYFALL_API_URL, SCRYFALL_TIMEOUT, SCRYFALL_MAX_CONNECTIONS, SET_CATALOG_TTL, \
+    SCRYFALL_PAGE_CONCURRENCY, RESULT_CACHE_SIZE, RESULT_CACHE_TTL, OFFLINE_MODE, SCRYFALL_RATE_LIMIT, \
+    SCRYFALL_BURST, COLLECTION_BATCH_SIZE, CARD_NAMES_TTL, SCRYFALL_ATTEMPT_TIMEOUT, SCRYFALL_RETRIES, \
+    SCRYFALL_RETRY_BASE, SCRYFALL_RETRY_MAX, SCRYFALL_HEDGE, BREAKER_FAILURES, BREAKER_RESET, STALE_RESULT_TTL, \
+    IMAGE_FETCH_TIMEOUT
+from api.scheduler import RequestScheduler
+from api.bulk import group_index, search_bulk
+from api.card import Card, CollectionPage, SearchPage, collection_decoder, page_decoder
+from api.cache import ResultCache, make_cache_key
+from api.resilience import CircuitBreaker, LatencyTracker, ScryfallUnavailable, parse_retry_after, retry_delay
+from api.sets import SetCatalog
+from api.names import CardNameIndex
+from api.pagination import iter_pages
+from api.query import plan_query
+from utils.metrics import CARDS_FETCHED, SCRYFALL_HEDGES, SCRYFALL_RESPONSES, SCRYFALL_RETRIED, \
+    SCRYFALL_SECONDS, endpoint_label, stage
+from utils.price_index import PriceIndex, PriceIndexCache
 
 
-def get_set_code(set_name: str) -> Optional[str]:
+class ScryfallClient:
+    """
+    Асинхронный клиент Scryfall с общим пулом keep-alive соединений.
+
+    Все запросы к API проходят через общий планировщик (см. api.scheduler),
+    который соблюдает ограничение частоты Scryfall и объединяет одинаковые
+    одновременные запросы. Каждая попытка ограничена по времени, ошибки
+    сети, 429 и 5xx повторяются с паузой (с учётом Retry-After), медленные
+    страницы поиска дублируются, а при серии неудач предохранитель
+    (см. api.resilience) сразу отвечает ScryfallUnavailable.
+    """
+
+    def __init__(self, base_url: str = SCRYFALL_API_URL, timeout: float = SCRYFALL_TIMEOUT,
+                 max_connections: int = SCRYFALL_MAX_CONNECTIONS, rate_limit: float = SCRYFALL_RATE_LIMIT,
+                 burst: int = SCRYFALL_BURST, attempt_timeout: float = SCRYFALL_ATTEMPT_TIMEOUT,
+                 retries: int = SCRYFALL_RETRIES, hedge: bool = SCRYFALL_HEDGE) -> None:
+        """
+        :param base_url: Базовый адрес API
+        :param timeout: Таймаут одной операции сокета в секундах
+        :param max_connections: Максимальное число одновременных соединений
+        :param rate_limit: Допустимое число запросов в секунду
+        :param burst: Сколько запросов можно отправить подряд без ожидания
+        :param attempt_timeout: Предельное время одной попытки запроса в секундах
+        :param retries: Сколько раз повторять неудачный запрос
+        :param hedge: Дублировать ли страницы поиска, отвечающие дольше p95
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.attempt_timeout = attempt_timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.scheduler = RequestScheduler(rate_limit, burst)
+        self.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET)
+        self.page_latency = LatencyTracker()
+        self._session: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        """
+        Открыть сессию. Вызывается один раз при запуске приложения.
+        """
+        if self._session is not None:
+            return
+        self._session = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+            headers={'User-Agent': 'ScryfallTelegramBot/1.0', 'Accept': 'application/json'},
+        )
+
+    async def close(self) -> None:
+        """
+        Закрыть сессию и все соединения пула.
+        """
+        await self.scheduler.close()
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
+
+    @staticmethod
+    def request_key(url: str, params: Optional[Dict[str, Any]] = None,
+                    headers: Optional[Dict[str, str]] = None) -> str:
+        """
+        Построить ключ запроса для объединения одинаковых запросов.
+
+        :param url: Путь или полный адрес
+        :param params: Параметры запроса
+        :param headers: Заголовки, влияющие на ответ
+        :return: Ключ запроса
+        """
+        parts = [url]
+        if params:
+            parts.append(str(httpx.QueryParams(sorted((k, str(v)) for k, v in params.items()))))
+        if headers:
+            parts.append(repr(sorted(headers.items())))
+        return ' '.join(parts)
+
+    async def get_json(self, url: str, params: Optional[Dict[str, Any]] = None,
+                       priority: Optional[int] = None) -> Optional[Dict]:
+        """
+        Выполнить GET-запрос через планировщик и вернуть JSON ответа.
+
+        :param url: Путь относительно base_url или полный адрес (например, next_page)
+        :param params: Параметры запроса
+        :param priority: Приоритет запроса (по умолчанию из api.scheduler.request_priority)
+        :return: Разобранный JSON или None, если ответ не 200
+        """
+        return await self.scheduler.submit(self.request_key(url, params),
+                                           lambda: self._get_json(url, params), priority)
+
+    async def get_page(self, url: str, params: Optional[Dict[str, Any]] = None,
+                       priority: Optional[int] = None) -> Optional[SearchPage]:
+        """
+        Выполнить поисковый запрос через планировщик и разобрать ответ сразу в SearchPage.
+
+        :param url: Путь относительно base_url или полный адрес
+        :param params: Параметры запроса
+        :param priority: Приоритет запроса (по умолчанию из api.scheduler.request_priority)
+        :return: Страница поиска или None, если ответ не 200
+        """
+        return await self.scheduler.submit('page ' + self.request_key(url, params),
+                                           lambda: self._get_json(url, params, page_decoder, self.hedge), priority)
+
+    async def get_collection(self, names: List[str], priority: Optional[int] = None) -> Optional[CollectionPage]:
+        """
+        Получить карты по именам одним POST-запросом /cards/collection через планировщик.
+
+        :param names: Имена карт (не больше COLLECTION_BATCH_SIZE)
+        :param priority: Приоритет запроса (по умолчанию из api.scheduler.request_priority)
+        :return: Ответ или None, если ответ не 200
+        """
+        payload = {'identifiers': [{'name': name} for name in names]}
+        return await self.scheduler.submit('collection ' + '\n'.join(names),
+                                           lambda: self._post_json("/cards/collection", payload,
+                                                                   collection_decoder), priority)
+
+    async def _post_json(self, url: str, payload: Dict[str, Any],
+                         decoder: Optional[msgspec.json.Decoder] = None) -> Any:
+        response = await self._send('POST', url, json=payload)
+        if response.status_code != 200:
+            return None
+        return decoder.decode(response.content) if decoder is not None else response.json()
+
+    async def _get_json(self, url: str, params: Optional[Dict[str, Any]] = None,
+                        decoder: Optional[msgspec.json.Decoder] = None, hedge: bool = False) -> Any:
+        response = await self._send('GET', url, hedge=hedge, params=params)
+        if response.status_code != 200:
+            return None
+        return decoder.decode(response.content) if decoder is not None else response.json()
+
+    async def _send(self, method: str, url: str, hedge: bool = False, **kwargs) -> httpx.Response:
+        """
+        Выполнить HTTP-запрос с ограничением времени попытки, повторами и предохранителем.
+
+        :param method: HTTP-метод
+        :param url: Путь относительно base_url или полный адрес
+        :param hedge: Дублировать запрос, если он отвечает дольше p95
+        :return: Ответ с кодом, который не нужно повторять (200, 304, 404, 422, ...)
+        :raises ScryfallUnavailable: Если предохранитель разомкнут или все попытки неудачны
+        """
+        if self._session is None:
+            await self.start()
+        if not self.breaker.allow():
+            raise ScryfallUnavailable("Scryfall временно недоступен, попробуйте позже.")
+        endpoint = endpoint_label(url)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(delay)
+                # Предохранитель мог разомкнуться после предыдущей попытки (в том числе из-за других запросов)
+                if not self.breaker.allow():
+                    break
+                await self._take_token()
+            try:
+                response = await self._attempt(method, url, hedge, **kwargs)
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                self.breaker.record_failure()
+                reason = 'timeout' if isinstance(e, (httpx.TimeoutException, asyncio.TimeoutError)) else 'network'
+                SCRYFALL_RETRIED.labels(endpoint, reason).inc()
+                delay = retry_delay(attempt, SCRYFALL_RETRY_BASE, SCRYFALL_RETRY_MAX)
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                # 429 означает превышение частоты, а не сбой Scryfall, и не размыкает предохранитель
+                if response.status_code != 429:
+                    self.breaker.record_failure()
+                SCRYFALL_RETRIED.labels(endpoint, str(response.status_code)).inc()
+                delay = parse_retry_after(response.headers.get('Retry-After'), SCRYFALL_RETRY_MAX)
+                if delay is None:
+                    delay = retry_delay(attempt, SCRYFALL_RETRY_BASE, SCRYFALL_RETRY_MAX)
+                continue
+            self.breaker.record_success()
+            return response
+        raise ScryfallUnavailable("Scryfall временно недоступен, попробуйте позже.")
+
+    async def _attempt(self, method: str, url: str, hedge: bool, **kwargs) -> httpx.Response:
+        delay = self.page_latency.hedge_delay() if hedge else None
+        if delay is None:
+            return await self._request(method, url, hedge, **kwargs)
+
+        first = asyncio.create_task(self._request(method, url, hedge, **kwargs))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            # Дублирующий запрос отправляется, только если ограничение частоты это позволяет
+            if done or self.scheduler.bucket.delay() > 0:
+                return await first
+            self.scheduler.bucket.take()
+            second = asyncio.create_task(self._request(method, url, hedge, **kwargs))
+            pending = {first, second}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Ошибки всех завершённых попыток забираются, успешная попытка проверяется первой
+                for task in sorted(done, key=lambda task: task.exception() is not None):
+                    if task.exception() is None or not pending:
+                        SCRYFALL_HEDGES.labels(endpoint_label(url),
+                                               'hedge' if task is second else 'original').inc()
+                        return task.result()
+        finally:
+            # В том числе если отменили сам запрос: попытки не должны продолжаться без владельца
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _request(self, method: str, url: str, track: bool, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await asyncio.wait_for(self._session.request(method, url, **kwargs), self.attempt_timeout)
+        self._observe(url, started, response.status_code)
+        if track and response.status_code == 200:
+            self.page_latency.add(time.perf_counter() - started)
+        return response
+
+    async def _take_token(self) -> None:
+        # Повторы идут в обход очереди планировщика, но соблюдают общее ограничение частоты
+        while (delay := self.scheduler.bucket.delay()) > 0:
+            await asyncio.sleep(delay)
+        self.scheduler.bucket.take()
+
+    @staticmethod
+    def _observe(url: str, started: float, status: int) -> None:
+        endpoint = endpoint_label(url)
+        SCRYFALL_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+        SCRYFALL_RESPONSES.labels(endpoint, str(status)).inc()
+
+    async def get_conditional(self, url: str, headers: Optional[Dict[str, str]] = None,
+                              priority: Optional[int] = None) -> Tuple[int, Optional[Dict], Mapping[str, str]]:
+        """
+        Выполнить условный GET-запрос (If-None-Match / If-Modified-Since) через планировщик.
+
+        :param url: Путь относительно base_url или полный адрес
+        :param headers: Дополнительные заголовки запроса
+        :param priority: Приоритет запроса (по умолчанию из api.scheduler.request_priority)
+        :return: Кортеж (код ответа, JSON или None, заголовки ответа без учёта регистра)
+        """
+        return await self.scheduler.submit(self.request_key(url, headers=headers),
+                                           lambda: self._get_conditional(url, headers), priority)
+
+    async def _get_conditional(self, url: str, headers: Optional[Dict[str, str]] = None
+                               ) -> Tuple[int, Optional[Dict], Mapping[str, str]]:
+        response = await self._send('GET', url, headers=headers)
+        data = response.json() if response.status_code == 200 else None
+        return response.status_code, data, response.headers
+
+    async def fetch_bytes(self, url: str) -> Optional[bytes]:
+        """
+        Скачать небольшой файл (например, изображение карты) целиком, минуя планировщик.
+
+        Файлы лежат на CDN, а не в API, поэтому запрос не повторяется и его
+        сбои не учитываются предохранителем и метриками повторов API.
+
+        :param url: Адрес файла
+        :return: Содержимое файла или None, если ответ не 200 или загрузка не удалась
+        """
+        if self._session is None:
+            await self.start()
+        try:
+            response = await self._session.get(url, timeout=IMAGE_FETCH_TIMEOUT)
+        except httpx.TransportError:
+            return None
+        if response.status_code != 200:
+            return None
+        return response.content
+
+    async def download(self, url: str, path: str) -> None:
+        """
+        Скачать файл потоком, не держа его целиком в памяти.
+
+        :param url: Адрес файла
+        :param path: Куда сохранить файл
+        """
+        if self._session is None:
+            await self.start()
+        temp_path = f"{path}.part"
+        async with self._session.stream("GET", url) as response:
+            response.raise_for_status()
+            with open(temp_path, 'wb') as file:
+                async for chunk in response.aiter_bytes(1 << 20):
+                    file.write(chunk)
+        os.replace(temp_path, path)
+
+
+# Общий клиент на всё время жизни приложения (см. loader.main)
+client = ScryfallClient()
+set_catalog = SetCatalog(client, ttl=SET_CATALOG_TTL)
+card_names = CardNameIndex(client, ttl=CARD_NAMES_TTL)
+result_cache = ResultCache(max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, stale_ttl=STALE_RESULT_TTL)
+set_indexes = PriceIndexCache(ttl=RESULT_CACHE_TTL)
+
+
+async def get_set_code(set_name: str) -> Optional[str]:
     """
     Получить код набора по его имени.
 
     :param set_name: Имя набора
     :return: Код набора или None, если не найден
     """
-    sets_url = "https://api.scryfall.com/sets"
-    response = requests.get(sets_url)
-    if response.status_code != 200:
-        return None
+    return await set_catalog.lookup(set_name)
+
+
+async def stream_data(data_choice: Optional[str], filter_choice: str, amount: int, name: str,
+                      low_price: Optional[float] = None, high_price: Optional[float] = None,
+                      offline: bool = OFFLINE_MODE, refresh: bool = False,
+                      currency: str = 'usd') -> AsyncIterator[List[Card]]:
+    """
+    Получать данные карт с сайта Scryfall по мере прихода страниц.
+
+    Каждый следующий результат - текущий итоговый список карт с учётом всех
+    уже полученных страниц; последний результат совпадает с fetch_data.
+
+    :param data_choice: Порядок данных (low/high)
+    :param filter_choice: Фильтр (card/set)
+    :param amount: Количество карт
+    :param name: Имя карты или набора
+    :param low_price: Нижняя граница цены (опционально)
+    :param high_price: Верхняя граница цены (опционально)
+    :param offline: Отвечать из локальной копии bulk-данных (см. api.bulk)
+    :param refresh: Не читать кэш, а запросить результат заново и обновить кэш
+    :param currency: Валюта сортировки и фильтра (см. api.query.SEARCH_CURRENCIES)
+    :return: Асинхронный итератор списков карт
+    """
+    if offline:
+        with stage('set_lookup'):
+            target = name if filter_choice == "card" else set_catalog.resolve(name)
+        if not target:
+            return
+        with stage('bulk_search'):
+            cards = await asyncio.to_thread(search_bulk, data_choice, filter_choice, target, amount,
+                                            low_price, high_price, currency)
+        if cards:
+            yield cards
+        return
+
+    key = make_cache_key(data_choice, filter_choice, name, low_price, high_price, currency)
+    if not refresh:
+        cached = await result_cache.get(key, amount)
+        if cached is not None:
+            yield cached
+            return
+
+    try:
+        async for result in search_remote(key, data_choice, filter_choice, amount, name, low_price, high_price,
+                                          currency):
+            yield result
+    except ScryfallUnavailable:
+        # Пока Scryfall недоступен, показывается последний известный результат (см. StaleCards)
+        stale = await result_cache.get_stale(key, amount) if not refresh else None
+        if stale is None:
+            raise
+        yield stale
+
+
+async def search_remote(key: str, data_choice: Optional[str], filter_choice: str, amount: int, name: str,
+                        low_price: Optional[float] = None, high_price: Optional[float] = None,
+                        currency: str = 'usd') -> AsyncIterator[List[Card]]:
+    """
+    Выполнить поиск в Scryfall и сохранить итог в кэш (см. stream_data).
+
+    :param key: Ключ кэша результата
+    :return: Асинхронный итератор списков карт
+    :raises ScryfallUnavailable: Если Scryfall не отвечает
+    """
+    if filter_choice == "card":
+        target = name
+    else:
+        with stage('set_lookup'):
+            target = await get_set_code(name)
+        if not target:
+            return
+
+    plan = plan_query(data_choice, filter_choice, target, amount, low_price, high_price, currency)
+    cards: List[Card] = []
+    pages = iter_pages(client, "/cards/search", plan.params, limit=plan.limit, concurrency=SCRYFALL_PAGE_CONCURRENCY)
+    async for page in pages:
+        cards.extend(page)
+        with stage('filter_sort'):
+            result = plan.apply_fallback(cards)
+        if result:
+            yield result
+
+    if not cards:
+        return
 
-    sets_data = response.json()
-    for set_item in sets_data['data']:
-        if set_item['name'].lower() == set_name.lower():
-            return set_item['code']
-    return None
+    CARDS_FETCHED.observe(len(cards))
+    # Результат с пропущенной страницей показывается, но не кэшируется: covers считала бы его полным
+    if pages.complete:
+        await result_cache.set(key, amount, result)
 
 
-def fetch_data(data_choice: Optional[str], filter_choice: str, amount: int, name: str,
-               low_price: Optional[float] = None, high_price: Optional[float] = None) -> List[Dict]:
+async def fetch_data(data_choice: Optional[str], filter_choice: str, amount: int, name: str,
+                     low_price: Optional[float] = None, high_price: Optional[float] = None,
+                     offline: bool = OFFLINE_MODE, refresh: bool = False, currency: str = 'usd') -> List[Card]:
     """
     Получить данные карт с сайта Scryfall.
 
@@ -32,59 +422,138 @@ def fetch_data(data_choice: Optional[str], filter_choice: str, amount: int, name
     :param name: Имя карты или набора
     :param low_price: Нижняя граница цены (опционально)
     :param high_price: Верхняя граница цены (опционально)
+    :param offline: Отвечать из локальной копии bulk-данных (см. api.bulk)
+    :param refresh: Не читать кэш, а запросить результат заново и обновить кэш
+    :param currency: Валюта сортировки и фильтра (см. api.query.SEARCH_CURRENCIES)
     :return: Список данных карт
     """
-    base_url = "https://api.scryfall.com/cards/search"
+    cards: List[Card] = []
+    async for cards in stream_data(data_choice, filter_choice, amount, name, low_price, high_price, offline,
+                                    refresh, currency):
+        pass
+    return cards
 
-    if filter_choice == "card":
-        query = f'!"{name}"'
-    else:
-        set_code = get_set_code(name)
-        if not set_code:
-            return []
-        query = f'set:{set_code}'
 
-    url = f"{base_url}?q={query}&order=usd"
-    response = requests.get(url)
+async def fetch_set_index(name: str, offline: bool = OFFLINE_MODE) -> Optional[PriceIndex]:
+    """
+    Получить индекс цен всех карт набора (для /stats).
+
+    Карты набора запрашиваются у Scryfall целиком и кэшируются как результат
+    поиска, а построенный индекс со сводкой хранится в памяти, пока этот
+    результат не истечёт; если пришли не все страницы, сводка не строится
+    (показывается устаревшая, если она есть). В автономном режиме индекс
+    строится по локальной копии bulk-данных и пересобирается после каждой
+    её загрузки с изменениями (см. api.bulk.group_index).
 
-    if response.status_code != 200:
-        return []
+    :param name: Имя или код набора
+    :param offline: Отвечать из локальной копии bulk-данных (см. api.bulk)
+    :return: Индекс цен или None, если набор не найден
+    """
+    if offline:
+        with stage('set_lookup'):
+            code = set_catalog.resolve(name)
+        if not code:
+            return None
+        with stage('bulk_search'):
+            index = await asyncio.to_thread(group_index, "set", code)
+        return index if len(index) else None
 
-    data = response.json()
-    cards = data.get('data', [])
+    with stage('set_lookup'):
+        code = await get_set_code(name)
+    if not code:
+        return None
+    index = set_indexes.get(code)
+    if index is not None:
+        return index
 
-    if len(cards) == 0:
-        return []
+    key = make_cache_key('stats', "set", code)
+    cards = await result_cache.get(key, 0)
+    if cards is None:
+        try:
+            cards = []
+            pages = iter_pages(client, "/cards/search", {'q': f'set:{code}', 'unique': 'prints'},
+                               concurrency=SCRYFALL_PAGE_CONCURRENCY)
+            async for page in pages:
+                cards.extend(page)
+            # Сводка по части набора была бы неверной, а в кэше продержалась бы до его истечения
+            if cards and not pages.complete:
+                raise ScryfallUnavailable("Scryfall вернул набор не полностью, попробуйте позже.")
+        except ScryfallUnavailable:
+            # Индекс по устаревшим картам не запоминается, чтобы потом запросить набор заново
+            stale = await result_cache.get_stale(key, 0)
+            if stale is None:
+                raise
+            return PriceIndex(stale)
+        if not cards:
+            return None
+        CARDS_FETCHED.observe(len(cards))
+        await result_cache.set(key, 0, cards)
+    index = PriceIndex(cards)
+    set_indexes.set(code, index, await result_cache.expires_at(key, 0))
+    return index
 
-    if filter_choice == "card" and len(cards) == 1:
-        oracle_id = cards[0]['oracle_id']
-        url = f"https://api.scryfall.com/cards/search?order=usd&q=oracleid:{oracle_id}&unique=prints"
-        response = requests.get(url)
-        if response.status_code != 200:
-            return []
 
-        data = response.json()
-        cards = data.get('data', [])
-        while len(cards) < amount and data.get('has_more'):
-            response = requests.get(data['next_page'])
-            if response.status_code != 200:
-                break
-            data = response.json()
-            cards.extend(data.get('data', []))
+def name_key(name: str) -> str:
+    """
+    :param name: Имя карты
+    :return: Имя в нижнем регистре с одиночными пробелами
+    """
+    return ' '.join(name.lower().split())
+
 
-    print(f"Fetched {len(cards)} cards before applying price filter")
+def card_name_keys(card: Card) -> List[str]:
+    """
+    Ключи, по которым карту можно найти по имени: полное имя и имена сторон
+    двусторонней карты (Delver of Secrets // Insectile Aberration).
 
-    if low_price is not None and high_price is not None:
-        cards = [card for card in cards if
-                 card['prices']['usd'] is not None and low_price <= float(card['prices']['usd']) <= high_price]
+    :param card: Карта
+    :return: Список ключей name_key
+    """
+    keys = [name_key(card.name)]
+    if ' // ' in card.name:
+        keys.extend(name_key(face) for face in card.name.split(' // '))
+    return keys
 
-    print(f"Filtered {len(cards)} cards within the price range {low_price} - {high_price}")
 
-    if data_choice:
-        if data_choice == "low":
-            sorted_cards = sorted(cards, key=lambda x: float(x['prices']['usd'] or float('inf')))
-        else:
-            sorted_cards = sorted(cards, key=lambda x: float(x['prices']['usd'] or 0), reverse=True)
-        return sorted_cards[:amount]
+async def fetch_collection(names: List[str], offline: bool = OFFLINE_MODE) -> Tuple[Dict[str, Card], List[str]]:
+    """
+    Получить карты списка имён (например, декклиста) пачками через /cards/collection.
 
-    return cards
+    Имена, уже найденные раньше, берутся из кэша результатов; остальные
+    делятся на пачки по COLLECTION_BATCH_SIZE, которые отправляются
+    одновременно в пределах ограничения частоты планировщика.
+
+    :param names: Имена карт
+    :param offline: Искать в локальной копии bulk-данных (самая дешёвая печать)
+    :return: Кортеж (карты по name_key, ненайденные имена)
+    """
+    unique = list(dict.fromkeys(name_key(name) for name in names if name.strip()))
+    if offline:
+        with stage('bulk_search'):
+            results = await asyncio.to_thread(
+                lambda: [search_bulk('low', 'card', name, 1) for name in unique])
+        found = {name: cards[0] for name, cards in zip(unique, results) if cards}
+        return found, [name for name in unique if name not in found]
+
+    keys = [make_cache_key('collection', 'card', name) for name in unique]
+    cached = await asyncio.gather(*(result_cache.get(key, 1) for key in keys))
+    found = {name: cards[0] for name, cards in zip(unique, cached) if cards}
+    missing = [name for name in unique if name not in found]
+
+    batches = [missing[start:start + COLLECTION_BATCH_SIZE]
+               for start in range(0, len(missing), COLLECTION_BATCH_SIZE)]
+    with stage('collection'):
+        pages = await asyncio.gather(*(client.get_collection(batch) for batch in batches))
+
+    fetched: Dict[str, Card] = {}
+    for page in pages:
+        if page is None:
+            continue
+        for card in page.data:
+            for key in card_name_keys(card):
+                fetched.setdefault(key, card)
+    new = {name: fetched[name] for name in missing if name in fetched}
+    await asyncio.gather(*(result_cache.set(make_cache_key('collection', 'card', name), 1, [card])
+                           for name, card in new.items()))
+    found.update(new)
+    return found, [name for name in unique if name not in found]
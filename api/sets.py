@@ -0,0 +1,217 @@
+import asyncio
+import bisect
+import difflib
+import json
+import logging
+import re
+import time
+import unicodedata
+from typing import Dict, List, Optional
+from api.resilience import ScryfallUnavailable
+from api.scheduler import background_priority
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_set_name(value: str) -> str:
+    """
+    Привести имя или код набора к виду для поиска по индексу.
+
+    :param value: Имя, код или псевдоним набора
+    :return: Строка в нижнем регистре без знаков препинания и лишних пробелов
+    """
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    value = re.sub(r"[^\w]+", ' ', value.lower())
+    return ' '.join(value.split())
+
+
+class SetCatalog:
+    """
+    Каталог наборов Scryfall, загружаемый один раз и хранящийся в памяти.
+
+    Индексирует наборы по нормализованному имени, коду и псевдонимам
+    (mtgo_code, arena_code), обновляется в фоне по истечении TTL с помощью
+    условных запросов (ETag / Last-Modified).
+    """
+
+    def __init__(self, client=None, ttl: float = 43200.0) -> None:
+        """
+        :param client: Клиент Scryfall (см. api.scryfall.ScryfallClient)
+        :param ttl: Время жизни каталога в секундах
+        """
+        self.client = client
+        self.ttl = ttl
+        self._index: Dict[str, str] = {}
+        self._names: Dict[str, str] = {}
+        self._sorted_names: List[str] = []
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._loaded_at: float = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(self._index)
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def load(self, sets_data: Dict) -> None:
+        """
+        Построить индексы по ответу /sets.
+
+        :param sets_data: JSON ответа /sets
+        """
+        index: Dict[str, str] = {}
+        names: Dict[str, str] = {}
+        for set_item in sets_data.get('data', []):
+            code = set_item['code']
+            name_key = normalize_set_name(set_item['name'])
+            names.setdefault(name_key, code)
+            for alias in (code, set_item.get('mtgo_code'), set_item.get('arena_code')):
+                if alias:
+                    index.setdefault(normalize_set_name(alias), code)
+        # Имена имеют приоритет перед кодами при совпадении ключей
+        index.update(names)
+        self._index = index
+        self._names = names
+        self._sorted_names = sorted(names)
+        self._loaded_at = time.monotonic()
+
+    def load_file(self, path: str) -> None:
+        """
+        Загрузить каталог из локального файла с ответом /sets.
+
+        :param path: Путь к JSON-файлу
+        """
+        with open(path, encoding='utf-8') as file:
+            self.load(json.load(file))
+
+    async def refresh(self) -> None:
+        """
+        Загрузить каталог с Scryfall. Если данные не изменились (304),
+        только продлевает срок жизни текущего каталога.
+        """
+        async with self._lock:
+            await self._refresh()
+
+    async def _refresh(self) -> None:
+        headers = {}
+        if self.is_loaded:
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+        status, sets_data, response_headers = await self.client.get_conditional("/sets", headers=headers)
+        if status == 304:
+            self._loaded_at = time.monotonic()
+            return
+        if status != 200 or sets_data is None:
+            return
+        self.load(sets_data)
+        self._etag = response_headers.get('ETag')
+        self._last_modified = response_headers.get('Last-Modified')
+
+    async def ensure_loaded(self) -> None:
+        """
+        Дождаться первой загрузки каталога; устаревший каталог обновляется в фоне.
+        """
+        if not self.is_loaded:
+            async with self._lock:
+                # Каталог мог загрузить другой запрос, пока этот ждал блокировку
+                if not self.is_loaded:
+                    await self._refresh()
+        elif self.is_stale and self.client is not None:
+            self._schedule_refresh()
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        with background_priority():
+            try:
+                await self.refresh()
+            except ScryfallUnavailable as e:
+                # Пока Scryfall недоступен, используется прежний каталог
+                logger.warning("Не удалось обновить каталог наборов: %s", e)
+            except Exception:
+                logger.exception("Не удалось обновить каталог наборов")
+
+    async def close(self) -> None:
+        """
+        Остановить фоновое обновление каталога.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        self._refresh_task = None
+
+    def get(self, value: str) -> Optional[str]:
+        """
+        Точный поиск по имени, коду или псевдониму.
+
+        :param value: Имя, код или псевдоним набора
+        :return: Код набора или None
+        """
+        return self._index.get(normalize_set_name(value))
+
+    def find_prefix(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Найти наборы, имя которых начинается с указанной строки.
+
+        :param prefix: Начало имени набора
+        :param limit: Максимальное количество результатов
+        :return: Список кодов наборов
+        """
+        key = normalize_set_name(prefix)
+        if not key:
+            return []
+        position = bisect.bisect_left(self._sorted_names, key)
+        codes = []
+        for name in self._sorted_names[position:]:
+            if not name.startswith(key) or len(codes) >= limit:
+                break
+            codes.append(self._names[name])
+        return codes
+
+    def find_fuzzy(self, value: str, limit: int = 3, cutoff: float = 0.75) -> List[str]:
+        """
+        Найти наборы с похожим именем (опечатки, пропущенные слова).
+
+        :param value: Имя набора
+        :param limit: Максимальное количество результатов
+        :param cutoff: Минимальная степень сходства от 0 до 1
+        :return: Список кодов наборов
+        """
+        matches = difflib.get_close_matches(normalize_set_name(value), self._sorted_names, n=limit, cutoff=cutoff)
+        return [self._names[name] for name in matches]
+
+    def resolve(self, value: str) -> Optional[str]:
+        """
+        Найти код набора: точное совпадение, затем префикс, затем нечёткий поиск.
+
+        :param value: Имя, код или псевдоним набора
+        :return: Код набора или None
+        """
+        code = self.get(value)
+        if code:
+            return code
+        codes = self.find_prefix(value, limit=1) or self.find_fuzzy(value, limit=1)
+        return codes[0] if codes else None
+
+    async def lookup(self, value: str) -> Optional[str]:
+        """
+        То же, что resolve, но с загрузкой каталога при необходимости.
+
+        :param value: Имя, код или псевдоним набора
+        :return: Код набора или None
+        """
+        await self.ensure_loaded()
+        return self.resolve(value)
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from config import CACHE_WARM_WINDOW, CACHE_WARM_TOP, CACHE_WARM_BUDGET, CACHE_WARM_AHEAD
+from api.cache import ResultCache, make_cache_key
+from api.resilience import ScryfallUnavailable
+from api.scheduler import RequestBudget, RequestScheduler, background_priority, limit_requests
+from api.scryfall import client, fetch_data, result_cache
+from database.history import popular_requests
+
+logger = logging.getLogger(__name__)
+
+
+class WarmQuery(NamedTuple):
+    """
+    Популярный запрос, результат которого держится в кэше.
+
+    amount - наибольшее запрошенное количество карт (0 - все);
+    hits - сколько раз запрос встречался в истории.
+    """
+    data_choice: Optional[str]
+    filter_choice: str
+    amount: int
+    name: str
+    low_price: Optional[float]
+    high_price: Optional[float]
+    hits: int
+
+    @property
+    def key(self) -> str:
+        return make_cache_key(self.data_choice, self.filter_choice, self.name, self.low_price, self.high_price)
+
+
+def parse_history_row(command: str, data_choice: Optional[str], filter_choice: str, amount: str,
+                      name: str, hits: int) -> Optional[WarmQuery]:
+    """
+    Восстановить параметры fetch_data по строке истории.
+
+    :return: Запрос или None, если строку разобрать не удалось или это не поиск (/prices)
+    """
+    if command not in ('low', 'high', 'custom'):
+        return None
+    try:
+        if command == 'custom':
+            low_price, high_price = (float(price) for price in amount.split('-', 1))
+            return WarmQuery(None, filter_choice, 0, name, low_price, high_price, hits)
+        return WarmQuery(data_choice, filter_choice, int(amount), name, None, None, hits)
+    except ValueError:
+        return None
+
+
+def merge_queries(rows: Iterable[Tuple[str, Optional[str], str, str, str, int]], limit: int) -> List[WarmQuery]:
+    """
+    Объединить строки истории с одинаковым ключом кэша (имена отличаются
+    только регистром или пробелами, разное количество карт).
+
+    :param rows: Строки popular_requests
+    :param limit: Сколько запросов вернуть
+    :return: Запросы по убыванию частоты
+    """
+    merged: Dict[str, WarmQuery] = {}
+    for row in rows:
+        query = parse_history_row(*row)
+        if query is None:
+            continue
+        previous = merged.get(query.key)
+        if previous is not None:
+            amount = 0 if 0 in (previous.amount, query.amount) else max(previous.amount, query.amount)
+            query = previous._replace(amount=amount, hits=previous.hits + query.hits)
+        merged[query.key] = query
+    return sorted(merged.values(), key=lambda query: query.hits, reverse=True)[:limit]
+
+
+class CacheWarmer:
+    """
+    Прогрев кэша результатов по истории запросов.
+
+    Популярные запросы обновляются заранее, до истечения срока жизни
+    результата, поэтому пользователь получает ответ из кэша, а не ждёт
+    Scryfall. Запросы прогрева идут с фоновым приоритетом, их число за
+    проход ограничено (считаются только запросы самого прогрева, а поиск
+    не запрашивает страниц сверх остатка лимита), и проход прерывается,
+    если в планировщике ждут интерактивные запросы.
+    """
+
+    def __init__(self, cache: ResultCache, scheduler: RequestScheduler, window: float = CACHE_WARM_WINDOW,
+                 top: int = CACHE_WARM_TOP, budget: int = CACHE_WARM_BUDGET, ahead: float = CACHE_WARM_AHEAD) -> None:
+        """
+        :param cache: Кэш результатов
+        :param scheduler: Планировщик запросов к Scryfall
+        :param window: За сколько секунд истории искать популярные запросы
+        :param top: Сколько популярных запросов держать в кэше
+        :param budget: Максимум запросов к Scryfall за один проход
+        :param ahead: За сколько секунд до истечения обновлять результат
+        """
+        self.cache = cache
+        self.scheduler = scheduler
+        self.window = window
+        self.top = top
+        self.budget = budget
+        self.ahead = ahead
+        self.stats: Dict[str, int] = {'runs': 0, 'refreshed': 0, 'fresh': 0, 'failed': 0, 'deferred': 0,
+                                      'budget_exhausted': 0}
+
+    async def popular(self) -> List[WarmQuery]:
+        """
+        :return: Самые частые запросы за окно истории
+        """
+        since = datetime.now() - timedelta(seconds=self.window)
+        # Строк берётся с запасом: варианты одного запроса объединяются в merge_queries
+        rows = await asyncio.to_thread(popular_requests, since, self.top * 4)
+        return merge_queries(rows, self.top)
+
+    async def run(self) -> int:
+        """
+        Выполнить один проход прогрева.
+
+        :return: Сколько результатов обновлено
+        """
+        self.stats['runs'] += 1
+        budget = RequestBudget(self.budget)
+        refreshed = 0
+        for query in await self.popular():
+            if not budget.remaining:
+                self.stats['budget_exhausted'] += 1
+                break
+            if self.scheduler.interactive_pending:
+                self.stats['deferred'] += 1
+                break
+            expires_at = await self.cache.expires_at(query.key, query.amount)
+            if expires_at is not None and expires_at - time.time() > self.ahead:
+                self.stats['fresh'] += 1
+                continue
+            try:
+                with background_priority(), limit_requests(budget):
+                    await fetch_data(query.data_choice, query.filter_choice, query.amount, query.name,
+                                     query.low_price, query.high_price, refresh=True)
+            except ScryfallUnavailable:
+                # Пока Scryfall недоступен, прогревать нечем: остаток прохода пропускается
+                self.stats['failed'] += 1
+                break
+            except Exception:
+                self.stats['failed'] += 1
+                logger.exception("Не удалось прогреть кэш для %s", query.key)
+                continue
+            if not budget.remaining and await self.cache.expires_at(query.key, query.amount) == expires_at:
+                # Лимит кончился посреди запроса: неполный результат не попал в кэш
+                self.stats['budget_exhausted'] += 1
+                break
+            refreshed += 1
+        self.stats['refreshed'] += refreshed
+        return refreshed
+
+
+# Общий прогрев кэша на всё время жизни приложения (см. loader.cache_warming)
+cache_warmer = CacheWarmer(result_cache, client.scheduler)
@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from aiohttp import web
+
+# Размер страницы /cards/search у Scryfall
+PAGE_SIZE = 175
+
+FRAME_EFFECTS = (None, None, None, ['legendary'], ['showcase'], ['extendedart'], ['etched'])
+RARITIES = ('common', 'uncommon', 'rare', 'mythic')
+
+
+def make_card(rng: random.Random, name: str, oracle_id: str, set_code: str, set_name: str,
+              number: int) -> Dict[str, Any]:
+    """
+    Построить одну карту в формате ответа Scryfall со всеми «лишними» полями
+    (легальность, тексты, несколько изображений), чтобы разбор ответа стоил
+    столько же, сколько у настоящего API.
+
+    :param rng: Генератор случайных чисел
+    :param name: Имя карты
+    :param oracle_id: Oracle id карты
+    :param set_code: Код набора
+    :param set_name: Имя набора
+    :param number: Номер карты в наборе
+    :return: Карта
+    """
+    price = None if rng.random() < 0.08 else round(rng.lognormvariate(0, 1.5), 2)
+    image = f"https://cards.scryfall.io/normal/front/{set_code}/{number}.jpg"
+    card = {
+        'object': 'card',
+        'id': f"{set_code}-{number:04d}",
+        'oracle_id': oracle_id,
+        'name': name,
+        'lang': 'en',
+        'released_at': '2020-01-01',
+        'uri': f"https://api.scryfall.com/cards/{set_code}/{number}",
+        'layout': 'normal',
+        'image_uris': {size: image.replace('/normal/', f'/{size}/')
+                       for size in ('small', 'normal', 'large', 'png', 'art_crop', 'border_crop')},
+        'mana_cost': '{2}{G}',
+        'cmc': 3.0,
+        'type_line': rng.choice(['Creature — Elf Druid', 'Instant', 'Sorcery', 'Artifact', 'Land']),
+        'oracle_text': 'When this enters the battlefield, draw a card. ' * rng.randint(1, 4),
+        'colors': ['G'],
+        'color_identity': ['G'],
+        'keywords': [],
+        'legalities': {fmt: rng.choice(['legal', 'not_legal']) for fmt in (
+            'standard', 'future', 'historic', 'gladiator', 'pioneer', 'explorer', 'modern', 'legacy',
+            'pauper', 'vintage', 'penny', 'commander', 'brawl', 'alchemy', 'duel', 'oldschool')},
+        'games': ['paper', 'mtgo'],
+        'set': set_code,
+        'set_name': set_name,
+        'collector_number': str(number),
+        'rarity': rng.choice(RARITIES),
+        'artist': 'Bench Artist',
+        'prices': {
+            'usd': None if price is None else f"{price:.2f}",
+            'usd_foil': None if price is None else f"{price * 2:.2f}",
+            'usd_etched': None,
+            'eur': None if price is None else f"{price * 0.9:.2f}",
+            'eur_foil': None,
+            'tix': None,
+        },
+        'related_uris': {'gatherer': 'https://gatherer.wizards.com/', 'edhrec': 'https://edhrec.com/'},
+    }
+    effects = rng.choice(FRAME_EFFECTS)
+    if effects:
+        card['frame_effects'] = effects
+    return card
+
+
+def generate_cards(sets: int = 20, cards_per_set: int = 300, prints_per_name: int = 4,
+                   seed: int = 1) -> List[Dict[str, Any]]:
+    """
+    Сгенерировать детерминированный набор карт в формате ответа Scryfall.
+
+    :param sets: Количество наборов
+    :param cards_per_set: Количество карт в наборе
+    :param prints_per_name: Сколько наборов содержат печать одной и той же карты
+    :param seed: Зерно генератора
+    :return: Список карт
+    """
+    rng = random.Random(seed)
+    names = [f"Bench Card {index}" for index in range(sets * cards_per_set // prints_per_name + 1)]
+    cards = []
+    for set_index in range(sets):
+        code = f"b{set_index:02d}"
+        for number in range(cards_per_set):
+            name_index = (set_index * cards_per_set + number) // prints_per_name
+            name_index = (name_index * 7919 + set_index) % len(names)
+            cards.append(make_card(rng, names[name_index], f"oracle-{name_index}", code,
+                                   f"Benchmark Set {set_index}", number))
+    return cards
+
+
+def price(card: Dict[str, Any], currency: str = 'usd') -> Optional[float]:
+    value = card['prices'].get(currency)
+    return float(value) if value else None
+
+
+class FakeScryfall:
+    """
+    Локальная замена API Scryfall для бенчмарков и нагрузочных прогонов.
+
+    Отдаёт /sets, /catalog/card-names, /cards/search (с постраничной выдачей, сортировкой
+    order=usd|eur|tix и фильтрами !"имя", set:, usd>=, usd<= и т. п.) и POST /cards/collection
+    (поиск по именам) по заранее
+    записанным или сгенерированным картам. Задержка каждого ответа
+    задаётся параметрами latency и jitter. Для проверки устойчивости бота
+    сервер может внедрять сбои: ответы 503, 429 с Retry-After, зависшие
+    запросы и полный отказ (атрибут outage); сбои из очереди planned
+    ('error', 'throttle', 'stall') выдаются первым запросам по порядку. Готовые страницы кэшируются,
+    чтобы время самого сервера не искажало измерения.
+    """
+
+    def __init__(self, cards: List[Dict[str, Any]], latency: float = 0.0, jitter: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0, page_size: int = PAGE_SIZE, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, stall_rate: float = 0.0, stall: float = 30.0,
+                 retry_after: float = 1.0) -> None:
+        """
+        :param cards: Карты в формате Scryfall
+        :param latency: Задержка ответа в секундах
+        :param jitter: Случайная добавка к задержке (от 0 до jitter секунд)
+        :param host: Адрес сервера
+        :param port: Порт сервера (0 - любой свободный)
+        :param page_size: Размер страницы поиска
+        :param error_rate: Доля ответов 503
+        :param throttle_rate: Доля ответов 429 с Retry-After
+        :param stall_rate: Доля запросов, которые зависают на stall секунд
+        :param stall: Длительность зависания в секундах
+        :param retry_after: Значение Retry-After в ответах 429 (в секундах)
+        """
+        self.cards = cards
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.retry_after = retry_after
+        self.outage = False
+        self.planned: Deque[str] = deque()
+        self.faults: Dict[str, int] = {}
+        self.host = host
+        self.port = port
+        self.page_size = page_size
+        self.stats: Dict[str, int] = {}
+        self._by_name: Dict[str, List[Dict]] = {}
+        self._by_set: Dict[str, List[Dict]] = {}
+        for card in cards:
+            self._by_name.setdefault(card['name'].lower(), []).append(card)
+            self._by_set.setdefault(card['set'], []).append(card)
+        # Как и Scryfall, /cards/collection находит двустороннюю карту по имени любой её стороны
+        self._by_face = {face: prints for name, prints in self._by_name.items() if ' // ' in name
+                         for face in name.split(' // ')}
+        sets = {card['set']: card['set_name'] for card in cards}
+        self._sets_body = json.dumps({'object': 'list', 'has_more': False, 'data': [
+            {'object': 'set', 'code': code, 'name': name} for code, name in sorted(sets.items())
+        ]}).encode()
+        self._sets_etag = f'"{hashlib.sha1(self._sets_body).hexdigest()}"'
+        self._names_body = json.dumps({'object': 'catalog', 'total_values': len(self._by_name), 'data': sorted(
+            {card['name'] for card in cards})}).encode()
+        self._pages: Dict[Tuple, Tuple[int, bytes]] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        """
+        Запустить сервер.
+
+        :return: Базовый адрес сервера
+        """
+        app = web.Application()
+        app.router.add_get('/sets', self._handle_sets)
+        app.router.add_get('/catalog/card-names', self._handle_names)
+        app.router.add_get('/cards/search', self._handle_search)
+        app.router.add_post('/cards/collection', self._handle_collection)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _delay(self, path: str) -> Optional[web.Response]:
+        """
+        Выдержать задержку ответа и, если нужно, внедрить сбой.
+
+        :param path: Путь запроса
+        :return: Ответ-сбой или None, если запрос нужно обработать как обычно
+        """
+        self.stats[path] = self.stats.get(path, 0) + 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        fault = None
+        roll = random.random()
+        if self.planned:
+            fault = self.planned.popleft()
+            if fault == 'stall':
+                delay += self.stall
+        elif self.outage or roll < self.error_rate:
+            fault = 'error'
+        elif roll < self.error_rate + self.throttle_rate:
+            fault = 'throttle'
+        elif roll < self.error_rate + self.throttle_rate + self.stall_rate:
+            fault = 'stall'
+            delay += self.stall
+        # Считается до ожидания: зависший запрос клиент обычно обрывает по таймауту
+        if fault is not None:
+            self.faults[fault] = self.faults.get(fault, 0) + 1
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if fault == 'error':
+            return web.json_response({'object': 'error', 'code': 'unavailable', 'status': 503}, status=503)
+        if fault == 'throttle':
+            return web.json_response({'object': 'error', 'code': 'rate_limited', 'status': 429}, status=429,
+                                     headers={'Retry-After': f'{self.retry_after:g}'})
+        return None
+
+    async def _handle_sets(self, request: web.Request) -> web.Response:
+        fault = await self._delay('/sets')
+        if fault is not None:
+            return fault
+        # Как и Scryfall, отвечает 304 на условный запрос с текущим ETag
+        if request.headers.get('If-None-Match') == self._sets_etag:
+            return web.Response(status=304, headers={'ETag': self._sets_etag})
+        return web.Response(body=self._sets_body, content_type='application/json', headers={'ETag': self._sets_etag})
+
+    async def _handle_names(self, request: web.Request) -> web.Response:
+        fault = await self._delay('/catalog/card-names')
+        if fault is not None:
+            return fault
+        return web.Response(body=self._names_body, content_type='application/json')
+
+    async def _handle_search(self, request: web.Request) -> web.Response:
+        fault = await self._delay('/cards/search')
+        if fault is not None:
+            return fault
+        query = request.query
+        key = (query.get('q', ''), query.get('order'), query.get('dir'), int(query.get('page', '1')))
+        response = self._pages.get(key)
+        if response is None:
+            response = self._pages[key] = self._search(*key)
+        status, body = response
+        return web.Response(status=status, body=body, content_type='application/json')
+
+    async def _handle_collection(self, request: web.Request) -> web.Response:
+        fault = await self._delay('/cards/collection')
+        if fault is not None:
+            return fault
+        identifiers = (await request.json()).get('identifiers', [])
+        if not identifiers or len(identifiers) > 75:
+            return web.json_response({'object': 'error', 'code': 'bad_request', 'status': 400}, status=400)
+        data, not_found = [], []
+        for identifier in identifiers:
+            name = identifier.get('name', '').lower()
+            prints = self._by_name.get(name) or self._by_face.get(name)
+            if prints:
+                data.append(prints[0])
+            else:
+                not_found.append(identifier)
+        return web.json_response({'object': 'list', 'not_found': not_found, 'data': data})
+
+    def _search(self, q: str, order: Optional[str], direction: Optional[str], page: int) -> Tuple[int, bytes]:
+        name = re.search(r'!"([^"]*)"', q)
+        set_code = re.search(r'\bset:(\S+)', q)
+        bounds = re.findall(r'\b(usd|eur|tix)(>=|<=)([\d.]+)', q)
+        if name:
+            cards = self._by_name.get(name.group(1).lower(), [])
+        elif set_code:
+            cards = self._by_set.get(set_code.group(1).lower(), [])
+        else:
+            cards = self.cards
+        for currency, operator, value in bounds:
+            bound = float(value)
+            cards = [card for card in cards if price(card, currency) is not None
+                     and (price(card, currency) >= bound if operator == '>=' else price(card, currency) <= bound)]
+        if order in ('usd', 'eur', 'tix'):
+            priced = sorted((card for card in cards if price(card, order) is not None),
+                            key=lambda card: price(card, order), reverse=direction == 'desc')
+            cards = priced + [card for card in cards if price(card, order) is None]
+        if not cards:
+            return 404, json.dumps({'object': 'error', 'code': 'not_found', 'status': 404}).encode()
+
+        last_page = math.ceil(len(cards) / self.page_size)
+        if page > last_page:
+            return 422, json.dumps({'object': 'error', 'code': 'bad_request', 'status': 422}).encode()
+        data = cards[(page - 1) * self.page_size:page * self.page_size]
+        body = {'object': 'list', 'total_cards': len(cards), 'has_more': page < last_page, 'data': data}
+        if page < last_page:
+            body['next_page'] = f"{self.url}/cards/search?q={q}&page={page + 1}"
+        return 200, json.dumps(body).encode()
+
+
+def load_cards(path: Optional[str], sets: int = 20, cards_per_set: int = 300) -> List[Dict[str, Any]]:
+    """
+    Загрузить записанные карты из JSON-файла (массив карт или ответ поиска)
+    или сгенерировать их, если файл не указан.
+
+    :param path: Путь к JSON-файлу или None
+    :param sets: Количество наборов для генерации
+    :param cards_per_set: Количество карт в наборе для генерации
+    :return: Список карт
+    """
+    if not path:
+        return generate_cards(sets, cards_per_set)
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+    cards = data['data'] if isinstance(data, dict) else data
+    return [card for card in cards if 'set' in card and 'prices' in card]
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Добавить параметры внедрения сбоев (см. FakeScryfall).
+
+    :param parser: Разбор аргументов командной строки
+    """
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="доля ответов 429 с Retry-After")
+    parser.add_argument('--stall-rate', type=float, default=0.0, help="доля зависающих запросов")
+    parser.add_argument('--stall', type=float, default=30.0, help="длительность зависания в секундах")
+
+
+def fault_options(args: argparse.Namespace) -> Dict[str, float]:
+    """
+    :param args: Разобранные аргументы с параметрами add_fault_arguments
+    :return: Именованные аргументы сбоев для FakeScryfall
+    """
+    return {'error_rate': args.error_rate, 'throttle_rate': args.throttle_rate,
+            'stall_rate': args.stall_rate, 'stall': args.stall}
+
+
+def main() -> None:
+    """
+    Запустить сервер отдельно: python -m benchmarks.fake_scryfall --port 8080 --latency 0.05,
+    после чего бота можно направить на него через SCRYFALL_API_URL.
+    """
+    parser = argparse.ArgumentParser(description="Локальная замена API Scryfall")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа в секундах")
+    parser.add_argument('--jitter', type=float, default=0.0, help="случайная добавка к задержке в секундах")
+    parser.add_argument('--cards', help="JSON-файл с записанными картами (по умолчанию - сгенерированные)")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        server = FakeScryfall(load_cards(args.cards), args.latency, args.jitter, args.host, args.port,
+                              **fault_options(args))
+        print(f"Fake Scryfall: {await server.start()} ({len(server.cards)} карт)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
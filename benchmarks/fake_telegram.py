@@ -0,0 +1,111 @@
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+
+class FakeTelegramRequest(BaseRequest):
+    """
+    Транспорт Bot API, который отвечает локально, не обращаясь к Telegram.
+
+    Запросы проходят всю обработку python-telegram-bot (сериализация
+    параметров и разбор ответа), но вместо сети ответ строится здесь же.
+    Для каждого чата запоминаются время первого и последнего ответа бота
+    и все ответы с временем отправки.
+    """
+
+    def __init__(self) -> None:
+        self._message_ids = itertools.count(1)
+        self.calls: Dict[str, int] = {}
+        self.first_reply: Dict[int, float] = {}
+        self.last_reply: Dict[int, float] = {}
+        self.replies: Dict[int, List[Tuple[float, str]]] = {}
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.first_reply.clear()
+        self.last_reply.clear()
+        self.replies.clear()
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout: Any = None, write_timeout: Any = None, connect_timeout: Any = None,
+                         pool_timeout: Any = None) -> Tuple[int, bytes]:
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        params = request_data.parameters if request_data is not None else {}
+        result = self._result(endpoint, params)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    def _result(self, endpoint: str, params: Dict[str, Any]) -> Any:
+        if endpoint == 'getMe':
+            return BOT_USER
+        if endpoint in ('sendMessage', 'editMessageText', 'sendPhoto'):
+            chat_id = int(params['chat_id'])
+            self._track(chat_id, params.get('text', ''))
+            return self._message(chat_id, params, endpoint == 'sendPhoto')
+        if endpoint == 'sendMediaGroup':
+            chat_id = int(params['chat_id'])
+            self._track(chat_id, '')
+            return [self._message(chat_id, params, True) for _ in params.get('media', [])]
+        return True
+
+    def _track(self, chat_id: int, text: str) -> None:
+        now = time.perf_counter()
+        self.first_reply.setdefault(chat_id, now)
+        self.last_reply[chat_id] = now
+        self.replies.setdefault(chat_id, []).append((now, text))
+
+    def _message(self, chat_id: int, params: Dict[str, Any], photo: bool) -> Dict[str, Any]:
+        message_id = int(params.get('message_id') or next(self._message_ids))
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if photo:
+            message['photo'] = [{'file_id': f"file-{message_id}", 'file_unique_id': f"u{message_id}",
+                                 'width': 488, 'height': 680}]
+        else:
+            message['text'] = params.get('text', '')
+        return message
+
+
+_update_ids = itertools.count(1)
+
+
+def make_update(text: str, chat_id: int, username: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Построить JSON обновления Telegram с текстовой командой от пользователя.
+
+    :param text: Текст сообщения (например, /low card 3 Black Lotus)
+    :param chat_id: id чата (совпадает с id пользователя)
+    :param username: username пользователя
+    :return: JSON обновления для Update.de_json
+    """
+    update_id = next(_update_ids)
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Bench',
+                 'username': username or f"bench{chat_id}"},
+        'text': text,
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': update_id, 'message': message}
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from benchmarks.fake_scryfall import FakeScryfall, add_fault_arguments, fault_options, generate_cards, make_card
+from benchmarks.run import configure_environment, summarize
+
+# Начало ответа бота -> результат команды
+OUTCOMES = (
+    ("⚠️", 'stale'),
+    ("Произошла ошибка", 'error'),
+    ("Карты не найдены", 'not_found'),
+    ("Неверный формат", 'bad_request'),
+    ("Извините, я не понял", 'bad_request'),
+)
+
+
+def load_records(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Прочитать журнал команд (см. utils.traffic). Если в файл дописано
+    несколько сеансов записи, время каждого следующего сеанса сдвигается
+    за конец предыдущего.
+
+    :param path: Путь к JSONL-файлу
+    :param limit: Максимальное число записей
+    :return: Записи с неубывающим временем t
+    """
+    from utils.traffic import read_traffic
+
+    records = []
+    offset = 0.0
+    previous = 0.0
+    for record in read_traffic(path):
+        if record['t'] + offset < previous:
+            offset = previous
+        record['t'] += offset
+        previous = record['t']
+        records.append(record)
+        if limit and len(records) >= limit:
+            break
+    return records
+
+
+def command_target(text: str) -> Optional[Tuple[str, str]]:
+    """
+    :param text: Текст команды
+    :return: Кортеж (card|set, имя) для /low, /high и /custom или None
+    """
+    parts = text.split()
+    command = parts[0][1:].split('@')[0] if parts else ''
+    if command in ('low', 'high') and len(parts) >= 4:
+        return parts[1], ' '.join(parts[3:])
+    if command == 'custom' and len(parts) >= 5:
+        return parts[1], ' '.join(parts[4:])
+    return None
+
+
+def synthesize_cards(records: List[Dict[str, Any]], seed: int = 1) -> List[Dict[str, Any]]:
+    """
+    Сгенерировать карты и наборы для имён из журнала, чтобы fake Scryfall
+    отвечал на записанные команды так же, как настоящий: у карты несколько
+    печатей, у набора - сотни карт.
+
+    :param records: Записи журнала
+    :param seed: Зерно генератора
+    :return: Список карт
+    """
+    rng = random.Random(seed)
+    cards = generate_cards(sets=4, cards_per_set=100)
+    card_names = set()
+    set_names = set()
+    for record in records:
+        target = command_target(record['text'])
+        if target is None:
+            continue
+        (card_names if target[0] == 'card' else set_names).add(target[1].lower())
+
+    for index, name in enumerate(sorted(set_names)):
+        code = f"s{index:03d}"
+        title = name.title()
+        for number in range(rng.randint(150, 400)):
+            cards.append(make_card(rng, f"{title} Card {number}", f"oracle-{code}-{number}", code, title, number))
+    for index, name in enumerate(sorted(card_names)):
+        title = name.title()
+        for print_index in range(rng.randint(1, 12)):
+            code = f"p{print_index:02d}"
+            cards.append(make_card(rng, title, f"oracle-card-{index}", code, f"Reprint Set {print_index}",
+                                   1000 + index))
+    return cards
+
+
+def classify(replies: List[str]) -> str:
+    """
+    :param replies: Тексты ответов бота на команду
+    :return: ok, stale, not_found, bad_request, error или no_reply
+    """
+    if not replies:
+        return 'no_reply'
+    for reply in replies:
+        for prefix, outcome in OUTCOMES:
+            if reply.startswith(prefix):
+                return outcome
+    return 'ok'
+
+
+async def replay(args: argparse.Namespace, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Модули бота импортируются после настройки окружения (см. main)
+    from telegram import Update
+    from database.models import database, initialize_database
+    from loader import build_application
+    from benchmarks.fake_telegram import FakeTelegramRequest, make_update
+
+    database.init(os.path.join(args.workdir, 'replay.db'))
+    initialize_database()
+
+    request = FakeTelegramRequest()
+    application = build_application(with_updater=False, with_retention=False, token='1:replay', request=request)
+    await application.initialize()
+    await application.post_init(application)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    # Обновления одного чата обрабатываются по очереди, как в CommandUpdateProcessor при PER_CHAT_IN_FLIGHT=1
+    chat_locks: Dict[int, asyncio.Lock] = {}
+    latencies: List[float] = []
+    first_replies: List[float] = []
+    lags: List[float] = []
+    outcomes: Dict[str, int] = {}
+
+    async def run(record: Dict[str, Any], arrival: float) -> None:
+        chat_id = record['chat']
+        async with semaphore:
+            lags.append(time.perf_counter() - arrival)
+            lock = chat_locks.setdefault(chat_id, asyncio.Lock())
+            async with lock:
+                before = len(request.replies.get(chat_id, []))
+                update = Update.de_json(make_update(record['text'], chat_id, f"u{record['user']}"), application.bot)
+                try:
+                    await application.process_update(update)
+                    replies = request.replies.get(chat_id, [])[before:]
+                    outcome = classify([text for _, text in replies])
+                    if replies:
+                        first_replies.append(replies[0][0] - arrival)
+                except Exception:
+                    outcome = 'exception'
+                latencies.append(time.perf_counter() - arrival)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    tasks = []
+    started = time.perf_counter()
+    try:
+        for record in records:
+            arrival = started + (record['t'] / args.speed if args.speed > 0 else 0.0)
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(run(record, max(arrival, started))))
+        await asyncio.gather(*tasks)
+    finally:
+        wall = time.perf_counter() - started
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    duration = records[-1]['t'] / args.speed if args.speed > 0 and records else 0.0
+    report = summarize(latencies, wall, len(latencies))
+    report.update({
+        'offered_rate': len(records) / duration if duration else None,
+        'first_reply_p50_ms': float(np.percentile(first_replies, 50) * 1000) if first_replies else None,
+        'first_reply_p95_ms': float(np.percentile(first_replies, 95) * 1000) if first_replies else None,
+        'admission_lag_p95_ms': float(np.percentile(lags, 95) * 1000) if lags else None,
+        'outcomes': outcomes,
+        'error_rate': (outcomes.get('error', 0) + outcomes.get('exception', 0)) / len(latencies) if latencies else 0.0,
+        'telegram_calls': dict(request.calls),
+    })
+    return report
+
+
+def main() -> None:
+    """
+    Запуск: python -m benchmarks.replay traffic.jsonl [--speed 10] [--concurrency 64] [--latency 0.05].
+    """
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных команд на fake Scryfall")
+    parser.add_argument('log', help="журнал команд (TRAFFIC_LOG)")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="множитель скорости относительно записи (0 - без пауз)")
+    parser.add_argument('--concurrency', type=int, default=64, help="максимум одновременно обрабатываемых команд")
+    parser.add_argument('--limit', type=int, help="воспроизвести только первые N команд")
+    parser.add_argument('--latency', type=float, default=0.05, help="задержка ответа fake Scryfall в секундах")
+    parser.add_argument('--jitter', type=float, default=0.02, help="случайная добавка к задержке в секундах")
+    parser.add_argument('--cards', help="JSON-файл с картами (по умолчанию - сгенерированные по журналу)")
+    parser.add_argument('--edit-interval', type=float, default=1.0,
+                        help="интервал обновления потоковых ответов (STREAM_EDIT_INTERVAL)")
+    parser.add_argument('--output', help="сохранить отчёт в JSON-файл")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    records = load_records(args.log, args.limit)
+    if not records:
+        print("Журнал пуст")
+        sys.exit(1)
+
+    async def run() -> Dict[str, Any]:
+        if args.cards:
+            from benchmarks.fake_scryfall import load_cards
+            cards = load_cards(args.cards)
+        else:
+            cards = synthesize_cards(records)
+        server = FakeScryfall(cards, args.latency, args.jitter, **fault_options(args))
+        url = await server.start()
+        with tempfile.TemporaryDirectory() as workdir:
+            args.workdir = workdir
+            configure_environment(url, workdir, args.edit_interval)
+            try:
+                report = await replay(args, records)
+            finally:
+                await server.stop()
+        report['scryfall_requests'] = dict(server.stats)
+        report['scryfall_faults'] = dict(server.faults)
+        return report
+
+    report = asyncio.run(run())
+    print(f"Команд: {report['n']}, время: {report['n'] / report['throughput']:.1f} с, "
+          f"пропускная способность: {report['throughput']:.1f} команд/с"
+          + (f" (подано {report['offered_rate']:.1f}/с)" if report['offered_rate'] else ""))
+    print(f"Задержка, мс: p50 {report['p50_ms']:.1f}, p95 {report['p95_ms']:.1f}, p99 {report['p99_ms']:.1f}")
+    if report['first_reply_p50_ms'] is not None:
+        print(f"Первый ответ, мс: p50 {report['first_reply_p50_ms']:.1f}, p95 {report['first_reply_p95_ms']:.1f}")
+    print(f"Ожидание очереди p95, мс: {report['admission_lag_p95_ms']:.1f}")
+    print(f"Результаты: {report['outcomes']}, доля ошибок: {report['error_rate'] * 100:.2f}%")
+    print(f"Запросы к Scryfall: {report['scryfall_requests']}, сбои: {report['scryfall_faults']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import numpy as np
+from benchmarks.fake_scryfall import FakeScryfall, load_cards
+
+# Допустимое ухудшение p50/p95 относительно базовой линии; разница меньше
+# MIN_DELTA_MS миллисекунд считается шумом измерения
+DEFAULT_TOLERANCE = 0.2
+MIN_DELTA_MS = 0.05
+
+
+def configure_environment(scryfall_url: str, workdir: str, edit_interval: float) -> None:
+    """
+    Настроить бота на работу с fake Scryfall. Вызывается до импорта модулей
+    бота, так как config читает окружение при импорте.
+
+    :param scryfall_url: Адрес fake Scryfall
+    :param workdir: Временный каталог для файлов бота
+    :param edit_interval: Интервал обновления потоковых ответов
+    """
+    os.environ.update({
+        'SCRYFALL_API_URL': scryfall_url,
+        'SCRYFALL_RATE_LIMIT': '100000',
+        'SCRYFALL_BURST': '100000',
+        'STREAM_EDIT_INTERVAL': str(edit_interval),
+        'IMAGE_CACHE_DIR': os.path.join(workdir, 'images'),
+        'OFFLINE_MODE': '0',
+        'WORKERS': '1',
+        'METRICS_PORT': '0',
+        'TRAFFIC_LOG': '',
+    })
+
+
+def summarize(samples: List[float], wall: float, operations: int) -> Dict[str, float]:
+    """
+    Посчитать сводку по замерам.
+
+    :param samples: Длительности отдельных операций в секундах
+    :param wall: Общее время прогона в секундах
+    :param operations: Количество выполненных операций
+    :return: Словарь n, throughput (оп/с) и mean/p50/p95/p99 в миллисекундах
+    """
+    values = np.array(samples) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'n': operations,
+        'throughput': operations / wall if wall else float('inf'),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+    }
+
+
+def bench_sync(function: Callable[[], Any], iterations: int, inner: int = 1, warmup: int = 3) -> Dict[str, float]:
+    """
+    Замерить синхронную функцию. Быстрые функции вызываются пачками по inner
+    раз, и длительность пачки делится на inner.
+
+    :param function: Функция без аргументов
+    :param iterations: Количество замеров
+    :param inner: Сколько вызовов в одном замере
+    :param warmup: Количество прогревочных замеров
+    :return: Сводка (см. summarize)
+    """
+    for _ in range(warmup):
+        for _ in range(inner):
+            function()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        for _ in range(inner):
+            function()
+        samples.append((time.perf_counter() - begin) / inner)
+    return summarize(samples, time.perf_counter() - started, iterations * inner)
+
+
+async def bench_async(function: Callable[[int], Awaitable[Any]], iterations: int, concurrency: int = 1,
+                      warmup: int = 2) -> Dict[str, float]:
+    """
+    Замерить асинхронную операцию, выполняя до concurrency операций одновременно.
+
+    :param function: Корутина-функция, принимающая номер итерации
+    :param iterations: Количество замеров
+    :param concurrency: Сколько операций выполняется одновременно
+    :param warmup: Количество прогревочных вызовов
+    :return: Сводка (см. summarize)
+    """
+    for index in range(warmup):
+        await function(-index - 1)
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def run(index: int) -> None:
+        async with semaphore:
+            begin = time.perf_counter()
+            await function(index)
+            samples.append(time.perf_counter() - begin)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(index) for index in range(iterations)))
+    return summarize(samples, time.perf_counter() - started, iterations)
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            min_delta_ms: float = MIN_DELTA_MS) -> List[str]:
+    """
+    Сравнить результаты с базовой линией.
+
+    :param results: Текущие результаты
+    :param baseline: Результаты базовой линии
+    :param tolerance: Допустимое относительное ухудшение
+    :param min_delta_ms: Минимальное абсолютное ухудшение в миллисекундах
+    :return: Описания регрессий
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if result[metric] > base[metric] * (1 + tolerance) and result[metric] - base[metric] >= min_delta_ms:
+                regressions.append(f"{name}: {metric} {base[metric]:.3f} -> {result[metric]:.3f} "
+                                   f"(+{(result[metric] / base[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]] = None) -> None:
+    header = f"{'бенчмарк':<28}{'n':>8}{'оп/с':>12}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}"
+    if baseline:
+        header += f"{'p50 база':>10}{'Δ':>8}"
+    print(header)
+    for name, result in results.items():
+        line = (f"{name:<28}{result['n']:>8}{result['throughput']:>12.1f}{result['p50_ms']:>10.3f}"
+                f"{result['p95_ms']:>10.3f}{result['p99_ms']:>10.3f}")
+        base = (baseline or {}).get(name)
+        if base:
+            delta = (result['p50_ms'] / base['p50_ms'] - 1) * 100 if base['p50_ms'] else 0.0
+            line += f"{base['p50_ms']:>10.3f}{delta:>+7.0f}%"
+        print(line)
+
+
+async def run_benchmarks(args: argparse.Namespace, cards: List[Dict]) -> Dict[str, Dict]:
+    # Модули бота импортируются после настройки окружения (см. main)
+    from telegram import Update
+    from api.card import to_card, page_decoder
+    from api.query import plan_query
+    from api.scryfall import client, fetch_data, result_cache
+    from database.models import database, initialize_database
+    from loader import build_application
+    from utils.formatting import card_formatter
+    from utils.helpers import format_data, parse_command, parse_custom_command
+    from utils.price_index import PriceIndex
+    from benchmarks.fake_telegram import FakeTelegramRequest, make_update
+
+    database.init(os.path.join(args.workdir, 'bench.db'))
+    initialize_database()
+
+    rng = random.Random(1)
+    names = sorted({card['name'] for card in cards})
+    set_codes = sorted({card['set'] for card in cards})
+    set_names = {card['set']: card['set_name'] for card in cards}
+    set_cards = [to_card(card) for card in cards if card['set'] == set_codes[0]]
+    page_body = json.dumps({'object': 'list', 'total_cards': 175, 'has_more': False,
+                            'data': cards[:175]}).encode()
+    results: Dict[str, Dict] = {}
+
+    def selected(name: str) -> bool:
+        return not args.only or any(pattern in name for pattern in args.only)
+
+    # Разбор команд
+    commands = itertools.cycle([f"/low card 3 {rng.choice(names)}" for _ in range(64)])
+    if selected('parse_command'):
+        results['parse_command'] = bench_sync(lambda: parse_command(next(commands)), args.iterations, inner=100)
+    if selected('parse_custom_command'):
+        results['parse_custom_command'] = bench_sync(
+            lambda: parse_custom_command("/custom set 1.5 20 Benchmark Set 3"), args.iterations, inner=100)
+
+    # Разбор страницы поиска в Card
+    if selected('decode_page'):
+        results['decode_page'] = bench_sync(lambda: page_decoder.decode(page_body), args.iterations, inner=5)
+
+    # Ценовой фильтр и сортировка
+    plan = plan_query('low', 'set', set_codes[0], 0, 1.0, 20.0)
+    if selected('apply_fallback'):
+        results['apply_fallback'] = bench_sync(lambda: plan.apply_fallback(set_cards), args.iterations, inner=10)
+    if selected('price_index_build'):
+        results['price_index_build'] = bench_sync(lambda: PriceIndex(set_cards), args.iterations)
+    index = PriceIndex(set_cards)
+    if selected('price_index_top_k'):
+        results['price_index_top_k'] = bench_sync(lambda: index.query('high', 10), args.iterations, inner=10)
+    if selected('price_index_range'):
+        results['price_index_range'] = bench_sync(lambda: index.query(None, 0, 1.0, 20.0), args.iterations,
+                                                  inner=10)
+    if selected('price_index_summary'):
+        def summary_cold() -> None:
+            index._summary = None
+            index.summary()
+        results['price_index_summary'] = bench_sync(summary_cold, args.iterations, inner=10)
+
+    # Отрисовка ответа
+    reply_cards = set_cards[:20]
+    if selected('format_data_cold'):
+        def format_cold() -> None:
+            card_formatter.clear()
+            format_data(reply_cards)
+        results['format_data_cold'] = bench_sync(format_cold, args.iterations, inner=5)
+    if selected('format_data_cached'):
+        results['format_data_cached'] = bench_sync(lambda: format_data(reply_cards), args.iterations, inner=50)
+
+    # fetch_data через fake Scryfall: без кэша и с попаданием в кэш
+    await client.start()
+    try:
+        if selected('fetch_data_card'):
+            async def fetch_card(index: int) -> None:
+                result_cache._entries.clear()
+                await fetch_data('low', 'card', 5, names[index % len(names)])
+            result_cache.persistent = False
+            results['fetch_data_card'] = await bench_async(fetch_card, args.iterations)
+        if selected('fetch_data_set'):
+            async def fetch_set(index: int) -> None:
+                result_cache._entries.clear()
+                await fetch_data('high', 'set', 0, set_names[set_codes[index % len(set_codes)]])
+            result_cache.persistent = False
+            results['fetch_data_set'] = await bench_async(fetch_set, max(1, args.iterations // 5))
+        if selected('fetch_data_cached'):
+            result_cache.persistent = True
+            await fetch_data('low', 'card', 5, names[0])
+            results['fetch_data_cached'] = await bench_async(
+                lambda index: fetch_data('low', 'card', 5, names[0]), args.iterations)
+    finally:
+        await client.close()
+
+    # Полный путь обновления через обработчики с fake Update и fake Bot API
+    request = FakeTelegramRequest()
+    application = build_application(with_updater=False, with_retention=False, token='1:bench', request=request)
+    await application.initialize()
+    await application.post_init(application)
+    try:
+        chat_ids = iter(range(10_000, 10_000_000))
+        scenarios = {
+            'handler_low_card': lambda: f"/low card 3 {rng.choice(names)}",
+            'handler_high_set': lambda: f"/high set 10 {set_names[rng.choice(set_codes)]}",
+            'handler_custom_set': lambda: f"/custom set 1 20 {set_names[rng.choice(set_codes)]}",
+        }
+        for name, make_text in scenarios.items():
+            if not selected(name):
+                continue
+            first_replies = []
+
+            async def round_trip(index: int) -> None:
+                chat_id = next(chat_ids)
+                sent = time.perf_counter()
+                update = Update.de_json(make_update(make_text(), chat_id), application.bot)
+                await application.process_update(update)
+                if chat_id in request.first_reply:
+                    first_replies.append(request.first_reply[chat_id] - sent)
+
+            results[name] = await bench_async(round_trip, args.iterations, concurrency=args.concurrency)
+            if first_replies:
+                results[name]['first_reply_p50_ms'] = float(np.percentile(first_replies, 50) * 1000)
+            request.reset()
+    finally:
+        await application.shutdown()
+        await application.post_shutdown(application)
+    return results
+
+
+def main() -> None:
+    """
+    Запуск: python -m benchmarks.run [--latency 0.05] [--baseline benchmarks/baseline.json]
+    [--save-baseline benchmarks/baseline.json].
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарки бота на локальной замене Scryfall")
+    parser.add_argument('--iterations', type=int, default=200, help="замеров на бенчмарк")
+    parser.add_argument('--concurrency', type=int, default=8, help="одновременных обновлений в сценариях обработчиков")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа fake Scryfall в секундах")
+    parser.add_argument('--jitter', type=float, default=0.0, help="случайная добавка к задержке в секундах")
+    parser.add_argument('--cards', help="JSON-файл с записанными картами (по умолчанию - сгенерированные)")
+    parser.add_argument('--edit-interval', type=float, default=0.0,
+                        help="интервал обновления потоковых ответов (STREAM_EDIT_INTERVAL)")
+    parser.add_argument('--only', nargs='*', help="запустить только бенчмарки, имена которых содержат эти строки")
+    parser.add_argument('--output', help="сохранить результаты в JSON-файл")
+    parser.add_argument('--baseline', help="сравнить с результатами из JSON-файла")
+    parser.add_argument('--save-baseline', help="сохранить результаты как базовую линию")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое ухудшение p50/p95 относительно базовой линии")
+    args = parser.parse_args()
+    # Без файла сравнивать не с чем: ошибка сразу, а не после прогона
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f"нет файла базовой линии {args.baseline}; создайте его с --save-baseline")
+
+    cards = load_cards(args.cards)
+
+    async def run() -> Dict[str, Dict]:
+        server = FakeScryfall(cards, args.latency, args.jitter)
+        url = await server.start()
+        with tempfile.TemporaryDirectory() as workdir:
+            args.workdir = workdir
+            configure_environment(url, workdir, args.edit_interval)
+            try:
+                return await run_benchmarks(args, cards)
+            finally:
+                await server.stop()
+
+    results = asyncio.run(run())
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cards': len(cards),
+            'latency': args.latency,
+            'iterations': args.iterations,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+    print_table(results, baseline)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nРегрессии:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nРегрессий нет.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,3 +5,134 @@ load_dotenv()
 
 TOKEN = os.getenv('TOKEN')
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'database/requests.db')
+
+# Настройки HTTP-клиента Scryfall
+SCRYFALL_API_URL = os.getenv('SCRYFALL_API_URL', 'https://api.scryfall.com')
+SCRYFALL_TIMEOUT = float(os.getenv('SCRYFALL_TIMEOUT', '10'))
+SCRYFALL_MAX_CONNECTIONS = int(os.getenv('SCRYFALL_MAX_CONNECTIONS', '20'))
+
+# Устойчивость запросов к Scryfall: предельное время одной попытки в секундах, число повторов,
+# базовая и максимальная задержка повтора (и предел Retry-After), дублирование медленных страниц
+SCRYFALL_ATTEMPT_TIMEOUT = float(os.getenv('SCRYFALL_ATTEMPT_TIMEOUT', '5'))
+SCRYFALL_RETRIES = int(os.getenv('SCRYFALL_RETRIES', '2'))
+SCRYFALL_RETRY_BASE = float(os.getenv('SCRYFALL_RETRY_BASE', '0.5'))
+SCRYFALL_RETRY_MAX = float(os.getenv('SCRYFALL_RETRY_MAX', '10'))
+SCRYFALL_HEDGE = os.getenv('SCRYFALL_HEDGE', '1') == '1'
+
+# Предохранитель: сколько неудач подряд размыкают его и через сколько секунд пробовать снова;
+# сколько секунд после истечения результат кэша можно показать, пока Scryfall недоступен
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '5'))
+BREAKER_RESET = float(os.getenv('BREAKER_RESET', '30'))
+STALE_RESULT_TTL = float(os.getenv('STALE_RESULT_TTL', str(7 * 86400)))
+
+# Сколько обновлений Telegram обрабатывается одновременно и сколько может ждать
+# своей очереди (сверх этого бот отвечает «перегружен»)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '256'))
+ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', '1024'))
+
+# Ограничения одного пользователя в чате: одновременно выполняемые и ожидающие обновления,
+# команды, которые отменяют его предыдущую такую же незавершённую команду
+PER_CHAT_IN_FLIGHT = int(os.getenv('PER_CHAT_IN_FLIGHT', '1'))
+PER_CHAT_QUEUED = int(os.getenv('PER_CHAT_QUEUED', '5'))
+SUPERSEDE_COMMANDS = [command.strip() for command in
+                      os.getenv('SUPERSEDE_COMMANDS', 'low,high,custom,prices,stats').split(',') if command.strip()]
+
+# Время жизни каталога наборов в секундах
+SET_CATALOG_TTL = float(os.getenv('SET_CATALOG_TTL', '43200'))
+
+# Сколько страниц поиска запрашивается одновременно
+SCRYFALL_PAGE_CONCURRENCY = int(os.getenv('SCRYFALL_PAGE_CONCURRENCY', '4'))
+
+# Кэш результатов поиска: размер уровня в памяти и время жизни в секундах
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '1024'))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '43200'))
+
+# Минимальный интервал между обновлениями потокового ответа в секундах
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.0'))
+
+# Сколько готовых ответов со списками карт хранится в кэше отрисовки
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '1024'))
+
+# Изображения карт: каталог и максимальный размер дискового кэша в байтах,
+# число одновременных загрузок, таймаут загрузки в секундах и максимум изображений в ответе
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'cache', 'images'))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+IMAGE_FETCH_CONCURRENCY = int(os.getenv('IMAGE_FETCH_CONCURRENCY', '4'))
+IMAGE_FETCH_TIMEOUT = float(os.getenv('IMAGE_FETCH_TIMEOUT', '10'))
+IMAGE_MAX_CARDS = int(os.getenv('IMAGE_MAX_CARDS', '10'))
+
+# Автономный режим: отвечать на запросы из локальной копии bulk-данных
+OFFLINE_MODE = os.getenv('OFFLINE_MODE', '0') == '1'
+
+# Ограничение частоты запросов к Scryfall (запросов в секунду и размер пачки)
+SCRYFALL_RATE_LIMIT = float(os.getenv('SCRYFALL_RATE_LIMIT', '10'))
+SCRYFALL_BURST = int(os.getenv('SCRYFALL_BURST', '10'))
+
+# Пакетная запись истории запросов: размер пачки и максимальная задержка в секундах
+HISTORY_FLUSH_SIZE = int(os.getenv('HISTORY_FLUSH_SIZE', '100'))
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '1.0'))
+
+# История запросов: размер страницы /history, лимит записей на пользователя
+# и период очистки старых записей в секундах
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '20'))
+HISTORY_MAX_ROWS_PER_USER = int(os.getenv('HISTORY_MAX_ROWS_PER_USER', '1000'))
+HISTORY_RETENTION_INTERVAL = float(os.getenv('HISTORY_RETENTION_INTERVAL', '3600'))
+
+# Режим webhook вместо long polling: адрес и порт локального сервера, путь,
+# внешний адрес для регистрации в Telegram и секретный токен
+WEBHOOK_MODE = os.getenv('WEBHOOK_MODE', '0') == '1'
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+
+# Количество рабочих процессов; при значении больше 1 бот запускается
+# в режиме супервизора (webhook-приёмник + рабочие процессы)
+WORKERS = int(os.getenv('WORKERS', '1'))
+
+# Супервизор: сколько раз доставлять обновление, после которого рабочий процесс падает
+# (дальше оно откладывается), и базовая и максимальная пауза перед перезапуском процесса в секундах
+SUPERVISOR_MAX_DELIVERIES = int(os.getenv('SUPERVISOR_MAX_DELIVERIES', '3'))
+SUPERVISOR_RESTART_BASE = float(os.getenv('SUPERVISOR_RESTART_BASE', '1'))
+SUPERVISOR_RESTART_MAX = float(os.getenv('SUPERVISOR_RESTART_MAX', '60'))
+
+# Уровень журнала (DEBUG, INFO, WARNING, ...)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Метрики в формате Prometheus: порт сервера /metrics (0 - выключено) и адрес;
+# в режиме супервизора рабочий процесс i слушает порт METRICS_PORT + 1 + i
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+
+# Профилирование медленных команд: порог в секундах (0 - выключено),
+# интервал снимков стека и каталог для профилей
+PROFILE_SLOW_COMMANDS = float(os.getenv('PROFILE_SLOW_COMMANDS', '0'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+# Журнал входящих команд для воспроизведения нагрузки (пусто - выключено)
+# и соль псевдонимов пользователей (пусто - случайная при каждом запуске)
+TRAFFIC_LOG = os.getenv('TRAFFIC_LOG', '')
+TRAFFIC_SALT = os.getenv('TRAFFIC_SALT', '')
+
+# Прогрев кэша результатов по истории запросов: период в секундах (0 - выключен),
+# за сколько секунд истории искать популярные запросы, сколько запросов прогревать,
+# лимит запросов к Scryfall за один проход и за сколько секунд до истечения обновлять результат
+CACHE_WARM_INTERVAL = float(os.getenv('CACHE_WARM_INTERVAL', '600'))
+CACHE_WARM_WINDOW = float(os.getenv('CACHE_WARM_WINDOW', '86400'))
+CACHE_WARM_TOP = int(os.getenv('CACHE_WARM_TOP', '100'))
+CACHE_WARM_BUDGET = int(os.getenv('CACHE_WARM_BUDGET', '30'))
+CACHE_WARM_AHEAD = float(os.getenv('CACHE_WARM_AHEAD', '3600'))
+
+# Декклисты /prices: сколько имён в одном запросе /cards/collection (не больше 75 - лимит Scryfall)
+# и сколько разных карт принимается в одном списке
+COLLECTION_BATCH_SIZE = min(int(os.getenv('COLLECTION_BATCH_SIZE', '75')), 75)
+DECKLIST_MAX_CARDS = int(os.getenv('DECKLIST_MAX_CARDS', '250'))
+
+# Inline-режим: время жизни индекса имён карт в секундах, число вариантов в ответе,
+# сколько секунд Telegram может кэшировать ответ и период фоновой подгрузки цен
+CARD_NAMES_TTL = float(os.getenv('CARD_NAMES_TTL', '86400'))
+INLINE_RESULTS = min(int(os.getenv('INLINE_RESULTS', '10')), 50)
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '300'))
+INLINE_PREFETCH_INTERVAL = float(os.getenv('INLINE_PREFETCH_INTERVAL', '1.0'))
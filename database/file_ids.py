@@ -0,0 +1,66 @@
+import asyncio
+import time
+from typing import Dict, Iterable
+from peewee import chunked
+from database.models import database, TelegramFile
+
+
+class FileIdCache:
+    """
+    Кэш file_id изображений Telegram: словарь в памяти поверх таблицы TelegramFile.
+    """
+
+    def __init__(self) -> None:
+        self._file_ids: Dict[str, str] = {}
+
+    async def get_many(self, urls: Iterable[str]) -> Dict[str, str]:
+        """
+        :param urls: Адреса изображений
+        :return: Словарь {адрес: file_id} для уже загруженных изображений
+        """
+        urls = list(urls)
+        found = {url: self._file_ids[url] for url in urls if url in self._file_ids}
+        missing = [url for url in urls if url not in found]
+        if missing:
+            loaded = await asyncio.to_thread(self._load, missing)
+            self._file_ids.update(loaded)
+            found.update(loaded)
+        return found
+
+    async def set_many(self, file_ids: Dict[str, str]) -> None:
+        """
+        :param file_ids: Словарь {адрес: file_id}
+        """
+        if not file_ids:
+            return
+        self._file_ids.update(file_ids)
+        await asyncio.to_thread(self._store, file_ids)
+
+    async def forget(self, url: str) -> None:
+        """
+        Удалить file_id, который Telegram перестал принимать.
+
+        :param url: Адрес изображения
+        """
+        self._file_ids.pop(url, None)
+        await asyncio.to_thread(lambda: TelegramFile.delete().where(TelegramFile.url == url).execute())
+
+    @staticmethod
+    def _load(urls: list) -> Dict[str, str]:
+        result = {}
+        for batch in chunked(urls, 500):
+            query = TelegramFile.select(TelegramFile.url, TelegramFile.file_id).where(TelegramFile.url.in_(batch))
+            result.update(query.tuples())
+        return result
+
+    @staticmethod
+    def _store(file_ids: Dict[str, str]) -> None:
+        now = time.time()
+        rows = [{'url': url, 'file_id': file_id, 'updated_at': now} for url, file_id in file_ids.items()]
+        with database.atomic():
+            for batch in chunked(rows, 300):
+                TelegramFile.replace_many(batch).execute()
+
+
+# Общий кэш file_id на всё время жизни приложения
+file_id_cache = FileIdCache()
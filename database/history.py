@@ -0,0 +1,103 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from peewee import fn
+from database.models import database, UserRequest
+
+Cursor = Tuple[datetime, int]
+
+CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def encode_cursor(request: UserRequest) -> str:
+    """
+    Записать позицию строки истории для callback_data кнопок.
+
+    :param request: Строка истории
+    :return: Строка вида 20241116120000123456:42
+    """
+    return f"{request.timestamp.strftime(CURSOR_FORMAT)}:{request.id}"
+
+
+def decode_cursor(value: str) -> Optional[Cursor]:
+    """
+    Разобрать позицию, записанную encode_cursor.
+
+    :param value: Строка позиции
+    :return: Кортеж (timestamp, id) или None, если строка некорректна
+    """
+    try:
+        timestamp, request_id = value.split(':')
+        return datetime.strptime(timestamp, CURSOR_FORMAT), int(request_id)
+    except ValueError:
+        return None
+
+
+def history_page(username: str, limit: int, before: Optional[Cursor] = None,
+                 after: Optional[Cursor] = None) -> Tuple[List[UserRequest], bool, bool]:
+    """
+    Получить страницу истории пользователя по ключу (username, timestamp, id).
+
+    Страница выбирается условием на позицию, а не OFFSET, поэтому любая
+    страница читается по индексу (username, timestamp) так же быстро, как первая.
+
+    :param username: Имя пользователя
+    :param limit: Размер страницы
+    :param before: Вернуть записи старше этой позиции
+    :param after: Вернуть записи новее этой позиции
+    :return: Кортеж (записи от новых к старым, есть ли новее, есть ли старее)
+    """
+    query = UserRequest.select().where(UserRequest.username == username)
+    with database.connection_context():
+        if after is not None:
+            timestamp, request_id = after
+            query = query.where((UserRequest.timestamp > timestamp) |
+                                ((UserRequest.timestamp == timestamp) & (UserRequest.id > request_id)))
+            rows = list(query.order_by(UserRequest.timestamp.asc(), UserRequest.id.asc()).limit(limit + 1))
+            return rows[:limit][::-1], len(rows) > limit, True
+
+        if before is not None:
+            timestamp, request_id = before
+            query = query.where((UserRequest.timestamp < timestamp) |
+                                ((UserRequest.timestamp == timestamp) & (UserRequest.id < request_id)))
+        rows = list(query.order_by(UserRequest.timestamp.desc(), UserRequest.id.desc()).limit(limit + 1))
+        return rows[:limit], before is not None, len(rows) > limit
+
+
+def compact_history(max_rows_per_user: int) -> int:
+    """
+    Оставить для каждого пользователя только последние max_rows_per_user записей.
+
+    :param max_rows_per_user: Сколько записей хранить на пользователя
+    :return: Количество удалённых записей
+    """
+    row_number = fn.ROW_NUMBER().over(partition_by=[UserRequest.username],
+                                      order_by=[UserRequest.timestamp.desc(), UserRequest.id.desc()])
+    ranked = UserRequest.select(UserRequest.id, row_number.alias('position')).alias('ranked')
+    expired = (UserRequest
+               .select(ranked.c.id)
+               .from_(ranked)
+               .where(ranked.c.position > max_rows_per_user))
+    with database.connection_context():
+        with database.atomic():
+            return UserRequest.delete().where(UserRequest.id.in_(expired)).execute()
+
+
+def popular_requests(since: datetime, limit: int) -> List[Tuple[str, Optional[str], str, str, str, int]]:
+    """
+    Найти самые частые запросы карт за период.
+
+    :param since: Учитывать запросы не раньше этого времени
+    :param limit: Сколько запросов вернуть
+    :return: Кортежи (command, data_choice, filter_choice, amount, name, число запросов) по убыванию частоты
+    """
+    hits = fn.COUNT(UserRequest.id)
+    query = (UserRequest
+             .select(UserRequest.command, UserRequest.data_choice, UserRequest.filter_choice,
+                     UserRequest.amount, UserRequest.name, hits.alias('hits'))
+             .where(UserRequest.timestamp >= since)
+             .group_by(UserRequest.command, UserRequest.data_choice, UserRequest.filter_choice,
+                       UserRequest.amount, UserRequest.name)
+             .order_by(hits.desc())
+             .limit(limit))
+    with database.connection_context():
+        return list(query.tuples())
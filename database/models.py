@@ -1,9 +1,19 @@
-from peewee import SqliteDatabase, Model, CharField, DateTimeField
+from peewee import SqliteDatabase, Model, CharField, DateTimeField, TextField, IntegerField, FloatField
 import os
 
 # Указываем путь к базе данных
 db_path = os.path.join(os.path.dirname(__file__), 'requests.db')
-database = SqliteDatabase(db_path)
+database = SqliteDatabase(db_path, pragmas={
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -8000,
+    'temp_store': 'memory',
+    'busy_timeout': 5000,
+})
+
+# Отдельная база для локальной копии bulk-данных Scryfall
+bulk_db_path = os.path.join(os.path.dirname(__file__), 'bulk.db')
+bulk_database = SqliteDatabase(bulk_db_path, pragmas={'journal_mode': 'wal', 'synchronous': 'normal'})
 
 class UserRequest(Model):
     """
@@ -19,10 +29,85 @@ class UserRequest(Model):
 
     class Meta:
         database = database
+        indexes = (
+            (('username', 'timestamp'), False),
+        )
+
+class CachedResult(Model):
+    """
+    Модель для хранения кэшированных результатов поиска карт.
+    """
+    key: CharField = CharField(primary_key=True)
+    amount: IntegerField = IntegerField()
+    payload: TextField = TextField()
+    expires_at: FloatField = FloatField(index=True)
+
+    class Meta:
+        database = database
+
+class CacheTag(Model):
+    """
+    Метки кэшированных результатов (set:<код>, oracle:<id>) для инвалидации.
+    """
+    tag: CharField = CharField(index=True)
+    key: CharField = CharField(index=True)
+
+    class Meta:
+        database = database
+
+class TelegramFile(Model):
+    """
+    Соответствие адреса изображения Scryfall и file_id, полученного от Telegram
+    после первой загрузки: повторно изображение отправляется по file_id.
+    """
+    url: CharField = CharField(primary_key=True)
+    file_id: CharField = CharField()
+    updated_at: FloatField = FloatField()
+
+    class Meta:
+        database = database
+
+class BulkCard(Model):
+    """
+    Модель для хранения карты из bulk-файла Scryfall в сжатом виде.
+    """
+    id: CharField = CharField(primary_key=True)
+    oracle_id: CharField = CharField(null=True, index=True)
+    name_key: CharField = CharField()
+    set_code: CharField = CharField()
+    set_name: CharField = CharField()
+    usd: FloatField = FloatField(null=True)
+    digest: CharField = CharField()
+    payload: TextField = TextField()
+
+    class Meta:
+        database = bulk_database
+        indexes = (
+            (('name_key', 'usd'), False),
+            (('set_code', 'usd'), False),
+            (('usd',), False),
+        )
+
+class BulkMeta(Model):
+    """
+    Служебные значения локальной копии (например, дата выгрузки bulk-файла).
+    """
+    key: CharField = CharField(primary_key=True)
+    value: TextField = TextField()
+
+    class Meta:
+        database = bulk_database
 
 def initialize_database() -> None:
     """
     Инициализировать базу данных и создать таблицы.
     """
     with database:
-        database.create_tables([UserRequest])
+        database.create_tables([UserRequest, CachedResult, CacheTag, TelegramFile])
+
+def initialize_bulk_database() -> None:
+    """
+    Инициализировать базу bulk-данных и создать таблицы.
+    """
+    with bulk_database:
+        bulk_database.create_tables([BulkCard, BulkMeta])
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+from peewee import chunked
+from config import HISTORY_FLUSH_SIZE, HISTORY_FLUSH_INTERVAL
+from database.models import database, UserRequest
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryRecorder:
+    """
+    Отложенная пакетная запись истории запросов пользователей.
+
+    Обработчики команд только кладут запись в очередь, а фоновая задача
+    сохраняет накопленные записи одной транзакцией insert_many, когда
+    набирается flush_size записей или проходит flush_interval секунд.
+    """
+
+    def __init__(self, flush_size: int = 100, flush_interval: float = 1.0, max_pending: int = 10000) -> None:
+        """
+        :param flush_size: Сколько записей сохранять за одну транзакцию
+        :param flush_interval: Максимальная задержка записи в секундах
+        :param max_pending: Максимальная длина очереди; лишние записи отбрасываются
+        """
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {'recorded': 0, 'written': 0, 'dropped': 0, 'batches': 0}
+
+    def start(self) -> None:
+        """
+        Запустить фоновую задачу записи.
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Остановить запись, предварительно сохранив все записи из очереди.
+        """
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    def record(self, username: str, command: str, data_choice: Optional[str], filter_choice: str,
+               amount: str, name: str) -> None:
+        """
+        Поставить запрос пользователя в очередь на запись.
+
+        :param username: Имя пользователя
+        :param command: Команда (low/high/custom)
+        :param data_choice: Порядок данных (low/high)
+        :param filter_choice: Фильтр (card/set)
+        :param amount: Количество карт или ценовой диапазон
+        :param name: Имя карты или набора
+        """
+        if self._queue is None:
+            self.start()
+        row = {
+            'username': username,
+            'command': command,
+            'data_choice': data_choice,
+            'filter_choice': filter_choice,
+            'amount': amount,
+            'name': name,
+            'timestamp': datetime.now(),
+        }
+        try:
+            self._queue.put_nowait(row)
+            self.stats['recorded'] += 1
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is None:
+                return
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.flush_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            try:
+                await self._write(batch)
+            except Exception:
+                logger.exception("Не удалось сохранить историю запросов")
+
+    async def _write(self, rows: List[Dict]) -> None:
+        if not rows:
+            return
+        await asyncio.to_thread(self._insert, rows)
+        self.stats['written'] += len(rows)
+        self.stats['batches'] += 1
+
+    @staticmethod
+    def _insert(rows: List[Dict]) -> None:
+        with database.connection_context():
+            with database.atomic():
+                for batch in chunked(rows, 100):
+                    UserRequest.insert_many(batch).execute()
+
+
+# Общий регистратор истории на всё время жизни приложения (см. loader.main)
+history_recorder = HistoryRecorder(HISTORY_FLUSH_SIZE, HISTORY_FLUSH_INTERVAL)
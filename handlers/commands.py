@@ -1,16 +1,37 @@
-from telegram import Update
+import asyncio
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
-from api.scryfall import fetch_data
-from database.models import UserRequest
-from utils.helpers import format_data, parse_command, parse_custom_command
-from typing import List
+from api.query import SEARCH_CURRENCIES
+from api.scryfall import fetch_collection, fetch_data, fetch_set_index, stream_data
+from config import HISTORY_PAGE_SIZE, STREAM_EDIT_INTERVAL, DECKLIST_MAX_CARDS
+from database.history import history_page, encode_cursor, decode_cursor
+from database.recorder import history_recorder
+from handlers.media import send_card_images
+from handlers.streaming import StreamingReply, reply_in_chunks
+from utils.formatting import PARSE_MODE, render_price_list
+from utils.helpers import format_data, format_set_summary, parse_command, parse_custom_command, parse_decklist, \
+    parse_stats_command
+from utils.metrics import instrumented, record_error, stage
+from typing import Optional, Tuple
 
+def get_username(update: Update) -> str:
+    """
+    Получить имя пользователя для истории запросов.
+
+    :param update: Обновление Telegram
+    :return: username или id пользователя, если username не задан
+    """
+    user = update.effective_user
+    return user.username or str(user.id)
+
+@instrumented("start")
 async def start(update: Update, context: CallbackContext) -> None:
     """
     Начальное приветствие бота.
     """
     await update.message.reply_text("Привет! Я бот Scryfall. Вы можете использовать команды, например, /low или /high, чтобы искать цены на карты.")
 
+@instrumented("test")
 async def run_tests(update: Update, context: CallbackContext) -> None:
     """
     Тестовые команды для проверки работы бота.
@@ -25,68 +46,196 @@ async def run_tests(update: Update, context: CallbackContext) -> None:
         await update.message.reply_text(f"Выполняется: {command}")
         data_choice, filter_choice, amount, name = parse_command(command)
         if data_choice and filter_choice and amount and name:
-            cards = fetch_data(data_choice, filter_choice, amount, name)
+            cards = await fetch_data(data_choice, filter_choice, amount, name)
             if cards:
-                formatted_data = format_data(cards)
-                await update.message.reply_text(formatted_data, parse_mode='Markdown')
+                await reply_in_chunks(update.message, format_data(cards), parse_mode=PARSE_MODE)
             else:
                 await update.message.reply_text("Карты не найдены.")
         else:
             await update.message.reply_text("Неверный формат команды.")
 
+@instrumented("search")
 async def fetch_and_display_data(update: Update, context: CallbackContext) -> None:
     """
     Получить и отобразить данные карт.
     """
     command = update.message.text
-    data_choice, filter_choice, amount, name = parse_command(command)
+    with stage('parse'):
+        data_choice, filter_choice, amount, name = parse_command(command)
     if not data_choice or not filter_choice or not amount or not name:
         await update.message.reply_text("Неверный формат команды. Используйте формат: /low|high card|set число имя")
         return
+    history_recorder.record(get_username(update), data_choice, data_choice, filter_choice, str(amount), name)
     try:
-        cards = fetch_data(data_choice, filter_choice, amount, name)
-        if not cards:
+        reply = StreamingReply(update.message, parse_mode=PARSE_MODE, edit_interval=STREAM_EDIT_INTERVAL)
+        currency = context.user_data.get('currency', 'usd')
+        cards = []
+        async for cards in stream_data(data_choice, filter_choice, amount, name, currency=currency):
+            await reply.update(format_data(cards, currency))
+        if not reply.started:
             await update.message.reply_text("Карты не найдены.")
             return
-        formatted_data = format_data(cards)
-        await update.message.reply_text(formatted_data, parse_mode='Markdown')
+        await reply.finish()
+        if context.user_data.get('images'):
+            await send_card_images(update.message, cards, currency=currency)
     except Exception as e:
+        record_error()
         await update.message.reply_text(f"Произошла ошибка: {str(e)}")
 
+def render_history_page(username: str, before: Optional[str] = None,
+                        after: Optional[str] = None) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """
+    Подготовить страницу истории и кнопки перехода между страницами.
+
+    :param username: Имя пользователя
+    :param before: Позиция, старше которой нужны записи
+    :param after: Позиция, новее которой нужны записи
+    :return: Кортеж (текст сообщения, клавиатура или None)
+    """
+    rows, has_newer, has_older = history_page(username, HISTORY_PAGE_SIZE,
+                                              before=decode_cursor(before) if before else None,
+                                              after=decode_cursor(after) if after else None)
+    if not rows:
+        return "История запросов отсутствует.", None
+
+    lines = ["История ваших запросов:"]
+    for request in rows:
+        timestamp = request.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        lines.append(f"{timestamp}: {request.command} {request.filter_choice} {request.amount} {request.name[:100]}")
+
+    buttons = []
+    if has_newer:
+        buttons.append(InlineKeyboardButton("« Новее", callback_data=f"history:newer:{encode_cursor(rows[0])}"))
+    if has_older:
+        buttons.append(InlineKeyboardButton("Старее »", callback_data=f"history:older:{encode_cursor(rows[-1])}"))
+    return "\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
+
+@instrumented("history")
 async def history(update: Update, context: CallbackContext) -> None:
     """
-    Показать историю команд пользователя.
+    Показать первую страницу истории команд пользователя.
     """
-    username = update.message.from_user.username
-    requests = UserRequest.select().where(UserRequest.username == username).order_by(UserRequest.timestamp.desc())
-    if not requests:
-        await update.message.reply_text("История запросов отсутствует.")
-        return
+    text, keyboard = await asyncio.to_thread(render_history_page, get_username(update))
+    await update.message.reply_text(text, reply_markup=keyboard)
 
-    history_message = "История ваших запросов:\n"
-    for request in requests:
-        history_message += f"{request.timestamp}: {request.command} {request.filter_choice} {request.amount} {request.name}\n"
-    await update.message.reply_text(history_message)
+@instrumented("history_page")
+async def history_navigation(update: Update, context: CallbackContext) -> None:
+    """
+    Перейти на соседнюю страницу истории по нажатию кнопки.
+    """
+    query = update.callback_query
+    await query.answer()
+    _, direction, cursor = query.data.split(':', 2)
+    if direction == "older":
+        text, keyboard = await asyncio.to_thread(render_history_page, get_username(update), before=cursor)
+    else:
+        text, keyboard = await asyncio.to_thread(render_history_page, get_username(update), after=cursor)
+    await query.edit_message_text(text, reply_markup=keyboard)
 
+@instrumented("custom")
 async def custom(update: Update, context: CallbackContext) -> None:
     """
     Обработка пользовательских команд с ценовым диапазоном.
     """
     command = update.message.text
-    filter_choice, low_price, high_price, name = parse_custom_command(command)
+    with stage('parse'):
+        filter_choice, low_price, high_price, name = parse_custom_command(command)
     if not filter_choice or low_price is None or high_price is None or not name:
         await update.message.reply_text("Неверный формат команды. Используйте формат: /custom card|set нижняя_цена верхняя_цена имя")
         return
+    history_recorder.record(get_username(update), 'custom', None, filter_choice, f"{low_price}-{high_price}", name)
     try:
-        cards = fetch_data(None, filter_choice, 0, name, low_price, high_price)
-        if not cards:
+        reply = StreamingReply(update.message, parse_mode=PARSE_MODE, edit_interval=STREAM_EDIT_INTERVAL)
+        currency = context.user_data.get('currency', 'usd')
+        cards = []
+        async for cards in stream_data(None, filter_choice, 0, name, low_price, high_price, currency=currency):
+            await reply.update(format_data(cards, currency))
+        if not reply.started:
             await update.message.reply_text("Карты не найдены в указанном диапазоне цен.")
             return
-        formatted_data = format_data(cards)
-        await update.message.reply_text(formatted_data, parse_mode='Markdown')
+        await reply.finish()
+        if context.user_data.get('images'):
+            await send_card_images(update.message, cards, currency=currency)
     except Exception as e:
+        record_error()
         await update.message.reply_text(f"Произошла ошибка: {str(e)}")
 
+@instrumented("prices")
+async def prices(update: Update, context: CallbackContext) -> None:
+    """
+    Посчитать цены декклиста: /prices, затем по одной карте в строке (4 Lightning Bolt).
+    """
+    with stage('parse'):
+        parts = update.message.text.split(maxsplit=1)
+        deck = parse_decklist(parts[1] if len(parts) > 1 else '', DECKLIST_MAX_CARDS)
+    if not deck:
+        await update.message.reply_text("Пришлите список карт после /prices, по одной в строке: 4 Lightning Bolt")
+        return
+    history_recorder.record(get_username(update), 'prices', None, 'card',
+                            str(sum(quantity for quantity, _ in deck)), ', '.join(name for _, name in deck)[:255])
+    try:
+        cards, not_found = await fetch_collection([name for _, name in deck])
+        if not cards:
+            await update.message.reply_text("Карты не найдены.")
+            return
+        with stage('format'):
+            text = render_price_list(deck, cards, not_found)
+        await reply_in_chunks(update.message, text, parse_mode=PARSE_MODE)
+    except Exception as e:
+        record_error()
+        await update.message.reply_text(f"Произошла ошибка: {str(e)}")
+
+@instrumented("stats")
+async def stats(update: Update, context: CallbackContext) -> None:
+    """
+    Показать сводку цен всех карт набора: /stats set имя набора.
+    """
+    with stage('parse'):
+        name = parse_stats_command(update.message.text)
+    if not name:
+        await update.message.reply_text("Неверный формат команды. Используйте формат: /stats set имя набора")
+        return
+    history_recorder.record(get_username(update), 'stats', None, 'set', '-', name)
+    try:
+        index = await fetch_set_index(name)
+        if index is None:
+            await update.message.reply_text("Набор не найден.")
+            return
+        await reply_in_chunks(update.message, format_set_summary(index), parse_mode=PARSE_MODE)
+    except Exception as e:
+        record_error()
+        await update.message.reply_text(f"Произошла ошибка: {str(e)}")
+
+@instrumented("images")
+async def images(update: Update, context: CallbackContext) -> None:
+    """
+    Включить или выключить отправку изображений карт: /images on|off (без аргумента - переключить).
+    """
+    argument = context.args[0].lower() if context.args else None
+    if argument in ("on", "off"):
+        enabled = argument == "on"
+    else:
+        enabled = not context.user_data.get('images', False)
+    context.user_data['images'] = enabled
+    if enabled:
+        await update.message.reply_text("Изображения карт включены: после списка будут приходить картинки.")
+    else:
+        await update.message.reply_text("Изображения карт выключены.")
+
+@instrumented("currency")
+async def currency_command(update: Update, context: CallbackContext) -> None:
+    """
+    Выбрать валюту сортировки и цен для /low, /high и /custom: /currency usd|eur|tix.
+    """
+    argument = context.args[0].lower() if context.args else None
+    if argument not in SEARCH_CURRENCIES:
+        current = context.user_data.get('currency', 'usd')
+        await update.message.reply_text(f"Текущая валюта: {current}. Используйте формат: /currency usd|eur|tix")
+        return
+    context.user_data['currency'] = argument
+    await update.message.reply_text(f"Цены будут показаны и отсортированы в валюте {argument}.")
+
+@instrumented("help")
 async def help_command(update: Update, context: CallbackContext) -> None:
     """
     Отображение доступных команд.
@@ -100,11 +249,17 @@ async def help_command(update: Update, context: CallbackContext) -> None:
         "/high set <число> <имя набора> - Высшие цены на карты из набора\n"
         "/custom card <нижняя цена> <верхняя цена> <имя> - Карты в указанном диапазоне цен\n"
         "/custom set <нижняя цена> <верхняя цена> <имя набора> - Карты из набора в указанном диапазоне цен\n"
+        "/prices <список карт> - Цены декклиста (по одной карте в строке)\n"
+        "/stats set <имя набора> - Сводка цен всех карт набора\n"
         "/history - История ваших запросов\n"
-        "/help - Показать это сообщение"
+        "/images on|off - Присылать изображения карт\n"
+        "/currency usd|eur|tix - Валюта цен и сортировки\n"
+        "/help - Показать это сообщение\n"
+        "@бот <начало имени> - Поиск карты в любом чате (inline-режим)"
     )
     await update.message.reply_text(help_text, parse_mode='Markdown')
 
+@instrumented("unknown")
 async def unknown_command(update: Update, context: CallbackContext) -> None:
     """
     Обработка неизвестных команд.
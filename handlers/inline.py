@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import logging
+from typing import List, Optional, Set
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import CallbackContext
+from api.cache import make_cache_key
+from api.resilience import ScryfallUnavailable
+from api.scheduler import background_priority
+from api.scryfall import card_names, fetch_collection, result_cache
+from config import COLLECTION_BATCH_SIZE, INLINE_RESULTS, INLINE_CACHE_TIME, INLINE_PREFETCH_INTERVAL
+from utils.formatting import PARSE_MODE, TEMPLATES, render_card
+from utils.metrics import instrumented, stage
+
+logger = logging.getLogger(__name__)
+
+
+class PricePrefetcher:
+    """
+    Фоновая подгрузка цен для вариантов автодополнения.
+
+    Имена без цены в кэше копятся и раз в interval секунд отправляются
+    одним запросом /cards/collection с фоновым приоритетом, поэтому число
+    запросов к Scryfall не зависит от того, сколько символов набрал пользователь.
+    """
+
+    def __init__(self, interval: float = 1.0, max_pending: int = 75) -> None:
+        """
+        :param interval: Период отправки накопленных имён в секундах
+        :param max_pending: Сколько имён отправлять за раз
+        """
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, names: List[str]) -> None:
+        """
+        :param names: Имена карт, цены которых нужно загрузить
+        """
+        for name in names:
+            if len(self._pending) >= self.max_pending:
+                break
+            self._pending.add(name)
+        if self._pending and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        await asyncio.sleep(self.interval)
+        names, self._pending = list(self._pending), set()
+        try:
+            with background_priority():
+                await fetch_collection(names)
+        except ScryfallUnavailable as e:
+            logger.warning("Не удалось загрузить цены для автодополнения: %s", e)
+        except Exception:
+            logger.exception("Не удалось загрузить цены для автодополнения")
+
+    async def close(self) -> None:
+        """
+        Отменить ожидающую подгрузку.
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._pending.clear()
+
+
+# Общая подгрузка цен на всё время жизни приложения
+price_prefetcher = PricePrefetcher(INLINE_PREFETCH_INTERVAL, COLLECTION_BATCH_SIZE)
+
+
+@instrumented("inline")
+async def inline_search(update: Update, context: CallbackContext) -> None:
+    """
+    Inline-режим (@бот имя карты): варианты из локального индекса имён,
+    цены - только из кэша результатов, без запроса к Scryfall на каждый символ.
+    """
+    query = update.inline_query
+    text = query.query.strip()
+    if len(text) < 2:
+        await query.answer([], cache_time=INLINE_CACHE_TIME)
+        return
+    await card_names.ensure_loaded()
+    with stage('name_lookup'):
+        names = card_names.search(text, INLINE_RESULTS)
+
+    cached = await asyncio.gather(*(result_cache.get(make_cache_key('collection', 'card', name), 1)
+                                    for name in names))
+    results = []
+    missing = []
+    with stage('format'):
+        for name, cards in zip(names, cached):
+            if cards:
+                card = cards[0]
+                price = f"${card.prices.usd:.2f}" if card.prices.usd is not None else "нет цены"
+                results.append(InlineQueryResultArticle(
+                    id=card.id,
+                    title=card.name,
+                    description=f"{card.set_name}, {price}",
+                    thumbnail_url=card.image_url,
+                    input_message_content=InputTextMessageContent(render_card(TEMPLATES['card'], card),
+                                                                  parse_mode=PARSE_MODE),
+                ))
+            else:
+                missing.append(name)
+                # Пока цены нет, в чат отправляется только имя карты: команда /low в чужом
+                # чате выглядела бы как сообщение пользователя и не дошла бы до бота
+                results.append(InlineQueryResultArticle(
+                    id=hashlib.md5(name.encode()).hexdigest(),
+                    title=name,
+                    description="Цена ещё не загружена",
+                    input_message_content=InputTextMessageContent(name),
+                ))
+    price_prefetcher.add(missing)
+    # Ответ без загруженных цен кэшируется Telegram недолго, чтобы следующий запрос уже показал цены
+    await query.answer(results, cache_time=INLINE_CACHE_TIME if not missing else 5)
@@ -0,0 +1,80 @@
+from typing import Dict, List, Tuple, Union
+from telegram import InputMediaPhoto, Message
+from telegram.error import BadRequest
+from api.card import Card
+from api.images import fetch_images, image_cache
+from api.scryfall import client
+from config import IMAGE_MAX_CARDS
+from database.file_ids import file_id_cache
+from utils.formatting import PARSE_MODE, TEMPLATES, render_card
+
+# Максимальное число изображений в одной медиагруппе Telegram
+MEDIA_GROUP_SIZE = 10
+
+
+async def send_card_images(message: Message, cards: List[Card], limit: int = IMAGE_MAX_CARDS,
+                           currency: str = 'usd') -> int:
+    """
+    Отправить изображения карт медиагруппами.
+
+    Изображения, уже загруженные в Telegram, отправляются по file_id;
+    остальные берутся из дискового кэша или скачиваются одновременно,
+    а file_id из ответа Telegram запоминается для следующих отправок.
+
+    :param message: Сообщение пользователя, на которое отправляется ответ
+    :param cards: Список карт
+    :param limit: Максимальное число изображений
+    :param currency: Валюта цены в подписях (usd, eur, tix)
+    :return: Количество отправленных изображений
+    """
+    cards = [card for card in cards if card.image_url][:limit]
+    if not cards:
+        return 0
+
+    file_ids = await file_id_cache.get_many(card.image_url for card in cards)
+    images = await fetch_images(client, [card.image_url for card in cards if card.image_url not in file_ids],
+                                image_cache)
+    sent = 0
+    for start in range(0, len(cards), MEDIA_GROUP_SIZE):
+        group = cards[start:start + MEDIA_GROUP_SIZE]
+        try:
+            sent += await _send_group(message, group, file_ids, images, currency)
+        except BadRequest:
+            # Telegram мог перестать принимать сохранённые file_id: они
+            # забываются, и группа отправляется повторно с загрузкой файлов
+            stale = [card.image_url for card in group if card.image_url in file_ids]
+            if not stale:
+                raise
+            for url in stale:
+                del file_ids[url]
+                await file_id_cache.forget(url)
+            images.update(await fetch_images(client, stale, image_cache))
+            sent += await _send_group(message, group, file_ids, images, currency)
+    return sent
+
+
+async def _send_group(message: Message, group: List[Card], file_ids: Dict[str, str],
+                      images: Dict[str, bytes], currency: str = 'usd') -> int:
+    media: List[Tuple[str, Union[str, bytes], str]] = []
+    for card in group:
+        source = file_ids.get(card.image_url) or images.get(card.image_url)
+        if source is not None:
+            media.append((card.image_url, source, render_card(TEMPLATES['caption'], card, currency)))
+    if not media:
+        return 0
+
+    if len(media) == 1:
+        _, source, caption = media[0]
+        messages = [await message.reply_photo(source, caption=caption, parse_mode=PARSE_MODE)]
+    else:
+        messages = await message.reply_media_group([
+            InputMediaPhoto(source, caption=caption, parse_mode=PARSE_MODE) for _, source, caption in media
+        ])
+
+    uploaded = {}
+    for (url, source, _), sent_message in zip(media, messages):
+        if isinstance(source, bytes) and sent_message.photo:
+            uploaded[url] = sent_message.photo[-1].file_id
+    file_ids.update(uploaded)
+    await file_id_cache.set_many(uploaded)
+    return len(messages)
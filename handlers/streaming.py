@@ -0,0 +1,108 @@
+import asyncio
+import time
+from typing import List, Optional
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+from utils.chunking import split_message
+from utils.metrics import stage
+
+
+class StreamingReply:
+    """
+    Ответ, который показывается пользователю по мере получения данных.
+
+    Первый вызов update() сразу отправляет сообщение, последующие
+    редактируют уже отправленные сообщения или добавляют новые, если текст
+    перестал помещаться в лимит Telegram. Редактирование выполняется не
+    чаще одного раза в edit_interval секунд; промежуточные версии текста,
+    пришедшие за это время, пропускаются.
+    """
+
+    def __init__(self, message: Message, parse_mode: Optional[str] = None, edit_interval: float = 1.0) -> None:
+        """
+        :param message: Сообщение пользователя, на которое отправляется ответ
+        :param parse_mode: Режим разметки ответа
+        :param edit_interval: Минимальный интервал между обновлениями в секундах
+        """
+        self.message = message
+        self.parse_mode = parse_mode
+        self.edit_interval = edit_interval
+        self.sent: List[Message] = []
+        self.texts: List[str] = []
+        self._pending: Optional[str] = None
+        self._flushed_at = 0.0
+
+    @property
+    def started(self) -> bool:
+        return bool(self.sent) or self._pending is not None
+
+    async def update(self, text: str) -> None:
+        """
+        Показать новую версию текста, если с прошлого обновления прошло достаточно времени.
+
+        :param text: Полный текст ответа
+        """
+        self._pending = text
+        if time.monotonic() - self._flushed_at >= self.edit_interval:
+            await self._flush()
+
+    async def finish(self, text: Optional[str] = None) -> None:
+        """
+        Показать окончательную версию текста.
+
+        :param text: Полный текст ответа (по умолчанию - последний переданный в update)
+        """
+        if text is not None:
+            self._pending = text
+        if self._pending is None:
+            return
+        delay = self.edit_interval - (time.monotonic() - self._flushed_at)
+        if self.sent and delay > 0:
+            await asyncio.sleep(delay)
+        await self._flush()
+
+    async def _flush(self) -> None:
+        with stage('reply'):
+            await self._send(split_message(self._pending))
+
+    async def _send(self, chunks: List[str]) -> None:
+        self._pending = None
+        for index, chunk in enumerate(chunks):
+            if index < len(self.sent):
+                if self.texts[index] != chunk:
+                    await self._call(self.sent[index].edit_text, chunk)
+                    self.texts[index] = chunk
+            else:
+                self.sent.append(await self._call(self.message.reply_text, chunk))
+                self.texts.append(chunk)
+        # Если текст стал короче, лишние сообщения удаляются
+        while len(self.sent) > len(chunks):
+            await self._call(self.sent.pop().delete)
+            self.texts.pop()
+        self._flushed_at = time.monotonic()
+
+    async def _call(self, method, *args):
+        kwargs = {'parse_mode': self.parse_mode} if args else {}
+        try:
+            return await method(*args, **kwargs)
+        except RetryAfter as e:
+            await asyncio.sleep(e.retry_after if isinstance(e.retry_after, (int, float))
+                                else e.retry_after.total_seconds())
+            return await method(*args, **kwargs)
+        except BadRequest as e:
+            # Telegram отклоняет редактирование, не меняющее текст
+            if 'not modified' not in str(e):
+                raise
+
+
+async def reply_in_chunks(message: Message, text: str, parse_mode: Optional[str] = None) -> None:
+    """
+    Отправить длинный текст несколькими сообщениями в пределах лимита Telegram.
+
+    :param message: Сообщение пользователя, на которое отправляется ответ
+    :param text: Текст ответа
+    :param parse_mode: Режим разметки ответа
+    """
+    with stage('reply'):
+        for chunk in split_message(text):
+            await message.reply_text(chunk, parse_mode=parse_mode)
@@ -1,7 +1,41 @@
-from telegram.ext import Application, CommandHandler, MessageHandler, filters
-from config import TOKEN
-from handlers.commands import fetch_and_display_data, run_tests, start, history, custom, help_command, unknown_command
-from database.models import database
+import asyncio
+import logging
+from typing import Optional
+from telegram import Update
+from telegram.ext import Application, CallbackContext, CallbackQueryHandler, CommandHandler, InlineQueryHandler, \
+    MessageHandler, TypeHandler, filters
+from telegram.request import BaseRequest
+from config import TOKEN, CONCURRENT_UPDATES, ADMISSION_QUEUE_SIZE, PER_CHAT_IN_FLIGHT, PER_CHAT_QUEUED, \
+    SUPERSEDE_COMMANDS, OFFLINE_MODE, HISTORY_MAX_ROWS_PER_USER, HISTORY_RETENTION_INTERVAL, \
+    WEBHOOK_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET, WORKERS, METRICS_PORT, \
+    METRICS_LISTEN, PROFILE_SLOW_COMMANDS, PROFILE_INTERVAL, PROFILE_DIR, TRAFFIC_LOG, TRAFFIC_SALT, \
+    CACHE_WARM_INTERVAL, LOG_LEVEL
+from handlers.commands import fetch_and_display_data, run_tests, start, history, history_navigation, custom, images, \
+    currency_command, prices, stats, help_command, unknown_command
+from handlers.inline import inline_search, price_prefetcher
+from database.models import initialize_database, initialize_bulk_database
+from database.recorder import history_recorder
+from database.history import compact_history
+from api.scryfall import client, set_catalog, card_names, result_cache
+from api.resilience import ScryfallUnavailable
+from api.bulk import bulk_sets, bulk_card_names
+from api.warming import cache_warmer
+from webhook import serve_webhook, webhook_secret
+from supervisor import run_supervisor
+from utils.update_processor import CommandUpdateProcessor
+from utils.metrics import enable_profiler, disable_profiler, start_metrics_server
+from utils.profiler import SlowCommandProfiler
+from utils.traffic import traffic_recorder
+
+logger = logging.getLogger(__name__)
+
+def setup_logging() -> None:
+    """
+    Настроить журнал процесса: время, уровень и модуль каждой записи.
+    """
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s', level=LOG_LEVEL)
+    # httpx пишет каждый запрос с уровнем INFO
+    logging.getLogger('httpx').setLevel(logging.WARNING)
 
 def setup_dispatcher(application: Application) -> None:
     """
@@ -9,27 +43,149 @@ def setup_dispatcher(application: Application) -> None:
 
     :param application: Экземпляр приложения Telegram
     """
+    # Запись входящих команд выполняется до основных обработчиков
+    application.add_handler(TypeHandler(Update, traffic_recorder.capture), group=-1)
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CommandHandler('test', run_tests))
     application.add_handler(CommandHandler(['low', 'high'], fetch_and_display_data))
     application.add_handler(CommandHandler('history', history))
+    application.add_handler(CallbackQueryHandler(history_navigation, pattern=r'^history:'))
     application.add_handler(CommandHandler('custom', custom))
+    application.add_handler(CommandHandler('images', images))
+    application.add_handler(CommandHandler('currency', currency_command))
+    application.add_handler(CommandHandler('prices', prices))
+    application.add_handler(CommandHandler('stats', stats))
     application.add_handler(CommandHandler('help', help_command))
+    application.add_handler(InlineQueryHandler(inline_search))
     application.add_handler(MessageHandler(filters.COMMAND, unknown_command))  # Обработка неизвестных команд
 
+async def on_startup(application: Application) -> None:
+    """
+    Открыть общий пул соединений Scryfall, запустить запись истории,
+    загрузить каталог наборов и индекс имён карт (индекс - в фоне)
+    и очистить просроченный кэш при запуске приложения.
+    Если настроены, запускаются метрики, профилирование и журнал команд.
+
+    :param application: Экземпляр приложения Telegram
+    """
+    start_metrics_server(application.bot_data.get('metrics_port', METRICS_PORT), METRICS_LISTEN)
+    if PROFILE_SLOW_COMMANDS > 0:
+        enable_profiler(SlowCommandProfiler(PROFILE_SLOW_COMMANDS, PROFILE_INTERVAL, PROFILE_DIR))
+    traffic_log = application.bot_data.get('traffic_log', TRAFFIC_LOG)
+    if traffic_log:
+        traffic_recorder.start(traffic_log, TRAFFIC_SALT)
+    await client.start()
+    history_recorder.start()
+    if OFFLINE_MODE:
+        # В автономном режиме каталог наборов и индекс имён строятся по локальной копии bulk-данных
+        set_catalog.load(await asyncio.to_thread(bulk_sets))
+        set_catalog.ttl = float('inf')
+        await asyncio.to_thread(card_names.load, await asyncio.to_thread(bulk_card_names))
+        card_names.ttl = float('inf')
+    else:
+        try:
+            await set_catalog.refresh()
+        except ScryfallUnavailable as e:
+            # Бот запускается и без каталога: он загрузится при первом запросе набора,
+            # когда Scryfall снова ответит (см. SetCatalog.ensure_loaded)
+            logger.warning("Не удалось загрузить каталог наборов: %s", e)
+        await card_names.ensure_loaded()
+    await result_cache.purge_expired()
+
+async def on_shutdown(application: Application) -> None:
+    """
+    Сохранить накопленную историю и закрыть пул соединений Scryfall
+    при остановке приложения.
+
+    :param application: Экземпляр приложения Telegram
+    """
+    await history_recorder.stop()
+    await traffic_recorder.stop()
+    await set_catalog.close()
+    await card_names.close()
+    await price_prefetcher.close()
+    await client.close()
+    disable_profiler()
+
+async def history_retention(context: CallbackContext) -> None:
+    """
+    Периодически удалять старые записи истории сверх лимита на пользователя.
+
+    :param context: Контекст задачи
+    """
+    deleted = await asyncio.to_thread(compact_history, HISTORY_MAX_ROWS_PER_USER)
+    if deleted:
+        logger.info("Удалено %d старых записей истории", deleted)
+
+async def cache_warming(context: CallbackContext) -> None:
+    """
+    Периодически обновлять результаты популярных запросов до истечения их срока жизни.
+
+    :param context: Контекст задачи
+    """
+    refreshed = await cache_warmer.run()
+    if refreshed:
+        logger.info("Прогрето %d результатов поиска", refreshed)
+
+def build_application(with_updater: bool = True, with_retention: bool = True, token: Optional[str] = None,
+                      request: Optional[BaseRequest] = None) -> Application:
+    """
+    Создать и настроить приложение Telegram.
+
+    :param with_updater: Создавать ли Updater (не нужен рабочим процессам, см. supervisor)
+    :param with_retention: Запускать ли периодическую очистку истории и прогрев кэша
+    :param token: Токен бота (по умолчанию из config)
+    :param request: Транспорт Bot API вместо стандартного (см. benchmarks)
+    :return: Экземпляр приложения Telegram
+    """
+    builder = (
+        Application.builder()
+        .token(token or TOKEN)
+        .concurrent_updates(CommandUpdateProcessor(CONCURRENT_UPDATES, ADMISSION_QUEUE_SIZE, PER_CHAT_IN_FLIGHT,
+                                                   PER_CHAT_QUEUED, SUPERSEDE_COMMANDS))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request)
+    if not with_updater:
+        builder = builder.updater(None)
+    application = builder.build()
+
+    setup_dispatcher(application)
+    if with_retention:
+        application.job_queue.run_repeating(history_retention, interval=HISTORY_RETENTION_INTERVAL, first=60)
+        if CACHE_WARM_INTERVAL > 0 and not OFFLINE_MODE:
+            application.job_queue.run_repeating(cache_warming, interval=CACHE_WARM_INTERVAL, first=120)
+    return application
+
 def main() -> None:
     """
     Основная функция для запуска бота.
     """
-    application = Application.builder().token(TOKEN).build()
-
+    setup_logging()
     # Инициализация базы данных
-    database.connect()
-    database.create_tables([], safe=True)  # Обновление таблиц по мере необходимости
-    database.close()
+    initialize_database()
+    if OFFLINE_MODE:
+        initialize_bulk_database()
 
-    setup_dispatcher(application)
-    application.run_polling()
+    secret_token = None
+    if WORKERS > 1 or WEBHOOK_MODE:
+        try:
+            secret_token = webhook_secret(WEBHOOK_SECRET, WEBHOOK_URL)
+        except ValueError as e:
+            logger.error("%s", e)
+            return
+
+    if WORKERS > 1:
+        run_supervisor(WORKERS, secret_token)
+        return
+
+    application = build_application()
+    if WEBHOOK_MODE:
+        asyncio.run(serve_webhook(application, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, secret_token, WEBHOOK_URL))
+    else:
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
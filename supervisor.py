@@ -0,0 +1,316 @@
+import asyncio
+import bisect
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+from telegram import Bot, Update
+from config import TOKEN, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, \
+    SCRYFALL_RATE_LIMIT, SCRYFALL_BURST, METRICS_PORT, TRAFFIC_LOG, SUPERVISOR_MAX_DELIVERIES, \
+    SUPERVISOR_RESTART_BASE, SUPERVISOR_RESTART_MAX
+from webhook import WebhookServer, register_webhook, stop_on_signals
+
+logger = logging.getLogger(__name__)
+
+
+def stable_hash(value: str) -> int:
+    """
+    Хэш строки, одинаковый во всех процессах (в отличие от hash()).
+
+    :param value: Строка
+    :return: 64-битное число
+    """
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Кольцо консистентного хэширования для распределения чатов по рабочим процессам.
+    """
+
+    def __init__(self, nodes: int, replicas: int = 100) -> None:
+        """
+        :param nodes: Количество рабочих процессов
+        :param replicas: Количество виртуальных узлов на процесс
+        """
+        points = sorted((stable_hash(f"{node}:{replica}"), node)
+                        for node in range(nodes) for replica in range(replicas))
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: Any) -> int:
+        """
+        :param key: Ключ (id чата)
+        :return: Номер рабочего процесса
+        """
+        position = bisect.bisect(self._keys, stable_hash(str(key))) % len(self._keys)
+        return self._nodes[position]
+
+
+def raw_chat_id(data: Dict[str, Any]) -> Any:
+    """
+    Найти id чата (или пользователя) в JSON обновления без его полного разбора.
+
+    :param data: JSON обновления Telegram
+    :return: id чата, id пользователя или update_id, если ни того, ни другого нет
+    """
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        if isinstance(value.get('chat'), dict):
+            return value['chat']['id']
+        if isinstance(value.get('message'), dict) and isinstance(value['message'].get('chat'), dict):
+            return value['message']['chat']['id']
+        if isinstance(value.get('from'), dict):
+            return value['from']['id']
+    return data.get('update_id')
+
+
+def worker_main(index: int, workers: int, inbox: multiprocessing.Queue, acks: multiprocessing.Queue) -> None:
+    """
+    Точка входа рабочего процесса.
+
+    :param index: Номер рабочего процесса
+    :param workers: Общее количество рабочих процессов
+    :param inbox: Очередь обновлений этого процесса
+    :param acks: Общая очередь подтверждений обработки
+    """
+    from loader import setup_logging
+
+    # Останавливается супервизор, рабочие процессы завершаются по его команде
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging()
+    asyncio.run(run_worker(index, workers, inbox, acks))
+
+
+async def run_worker(index: int, workers: int, inbox: multiprocessing.Queue, acks: multiprocessing.Queue) -> None:
+    """
+    Обрабатывать обновления из очереди процесса до получения None.
+
+    :param index: Номер рабочего процесса
+    :param workers: Общее количество рабочих процессов
+    :param inbox: Очередь обновлений этого процесса
+    :param acks: Общая очередь подтверждений обработки
+    """
+    from loader import build_application
+    from api.scryfall import client
+    from api.scheduler import TokenBucket
+
+    # Ограничение частоты Scryfall общее на все процессы
+    client.scheduler.bucket = TokenBucket(SCRYFALL_RATE_LIMIT / workers, max(1, SCRYFALL_BURST // workers))
+
+    application = build_application(with_updater=False, with_retention=index == 0)
+    # У каждого процесса свой сервер метрик
+    application.bot_data['metrics_port'] = METRICS_PORT + 1 + index if METRICS_PORT else 0
+    if TRAFFIC_LOG:
+        application.bot_data['traffic_log'] = f"{TRAFFIC_LOG}.{index}"
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    async def process(seq: int, data: Dict[str, Any]) -> None:
+        try:
+            update = Update.de_json(data, application.bot)
+            await application.update_processor.process_update(update, application.process_update(update))
+        except Exception:
+            logger.exception("Рабочий процесс %d: ошибка обработки обновления %s", index, data.get('update_id'))
+        finally:
+            acks.put((index, seq))
+
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    try:
+        while True:
+            item = await loop.run_in_executor(None, inbox.get)
+            if item is None:
+                break
+            task = asyncio.create_task(process(*item))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+class Supervisor:
+    """
+    Супервизор рабочих процессов бота.
+
+    Принимает обновления через webhook и направляет их рабочим процессам
+    по консистентному хэшу id чата, поэтому обновления одного чата всегда
+    обрабатывает один процесс в порядке поступления. Обновления хранятся
+    до подтверждения обработки; упавший процесс перезапускается и получает
+    заново все неподтверждённые обновления. Обновление, доставленное
+    max_deliveries раз без подтверждения, больше не доставляется и
+    откладывается в quarantine, а перезапуски процесса, который падает
+    снова и снова, выполняются с растущей паузой.
+    """
+
+    def __init__(self, workers: int, secret_token: str, max_deliveries: int = SUPERVISOR_MAX_DELIVERIES,
+                 restart_base: float = SUPERVISOR_RESTART_BASE, restart_max: float = SUPERVISOR_RESTART_MAX) -> None:
+        """
+        :param workers: Количество рабочих процессов
+        :param secret_token: Секретный токен webhook (см. webhook.webhook_secret)
+        :param max_deliveries: Сколько раз доставлять обновление без подтверждения
+        :param restart_base: Пауза перед первым перезапуском процесса в секундах
+        :param restart_max: Максимальная пауза перед перезапуском в секундах
+        """
+        self.workers = workers
+        self.secret_token = secret_token
+        self.max_deliveries = max_deliveries
+        self.restart_base = restart_base
+        self.restart_max = restart_max
+        self.ring = HashRing(workers)
+        self.context = multiprocessing.get_context('spawn')
+        self.acks = self.context.Queue()
+        self.inboxes: List[Optional[multiprocessing.Queue]] = [None] * workers
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.unacked: List['OrderedDict[int, Dict[str, Any]]'] = [OrderedDict() for _ in range(workers)]
+        # Сколько раз доставлено каждое неподтверждённое обновление
+        self.deliveries: List[Dict[int, int]] = [{} for _ in range(workers)]
+        # Падения процесса подряд (без подтверждений между ними) и когда его перезапустить
+        self.crashes: List[int] = [0] * workers
+        self.restart_at: List[Optional[float]] = [None] * workers
+        self.quarantine: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats: Dict[str, int] = {'routed': 0, 'acked': 0, 'restarts': 0, 'redelivered': 0, 'quarantined': 0}
+
+    def start_worker(self, index: int) -> None:
+        """
+        Запустить рабочий процесс с новой очередью и передать ему неподтверждённые обновления.
+
+        :param index: Номер рабочего процесса
+        """
+        inbox = self.context.Queue()
+        process = self.context.Process(target=worker_main, args=(index, self.workers, inbox, self.acks),
+                                       name=f"worker-{index}", daemon=True)
+        process.start()
+        for seq, data in list(self.unacked[index].items()):
+            deliveries = self.deliveries[index].get(seq, 0)
+            if deliveries >= self.max_deliveries:
+                self._quarantine(index, seq, deliveries)
+                continue
+            self.deliveries[index][seq] = deliveries + 1
+            inbox.put((seq, data))
+            if deliveries:
+                self.stats['redelivered'] += 1
+        self.inboxes[index] = inbox
+        self.processes[index] = process
+
+    async def route(self, data: Dict[str, Any]) -> None:
+        """
+        Передать обновление рабочему процессу его чата.
+
+        :param data: JSON обновления Telegram
+        """
+        index = self.ring.node_for(raw_chat_id(data))
+        seq = next(self._sequence)
+        self.unacked[index][seq] = data
+        self.stats['routed'] += 1
+        # Пока упавший процесс ждёт перезапуска, обновление хранится и будет доставлено при запуске
+        if self.restart_at[index] is None:
+            self.deliveries[index][seq] = 1
+            self.inboxes[index].put((seq, data))
+
+    def _ack(self, index: int, seq: int) -> None:
+        self.deliveries[index].pop(seq, None)
+        if self.unacked[index].pop(seq, None) is not None:
+            self.stats['acked'] += 1
+            # Процесс обработал обновление, значит, он снова работает
+            self.crashes[index] = 0
+
+    def _quarantine(self, index: int, seq: int, deliveries: int) -> None:
+        data = self.unacked[index].pop(seq)
+        self.deliveries[index].pop(seq, None)
+        self.quarantine.append(data)
+        self.stats['quarantined'] += 1
+        logger.warning("Обновление %s отложено: рабочий процесс %d падает при его обработке (доставок: %d)",
+                       data.get('update_id'), index, deliveries)
+
+    def check_workers(self, now: float) -> None:
+        """
+        Перезапустить завершившиеся рабочие процессы. Перед перезапуском
+        выдерживается пауза, которая удваивается с каждым падением подряд.
+
+        :param now: Текущее время (time.monotonic())
+        """
+        for index, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            if self.restart_at[index] is None:
+                self.crashes[index] += 1
+                delay = min(self.restart_max, self.restart_base * 2 ** (self.crashes[index] - 1))
+                self.restart_at[index] = now + delay
+                logger.warning("Рабочий процесс %d завершился с кодом %s, перезапуск через %.0f с",
+                               index, process.exitcode, delay)
+            if now >= self.restart_at[index]:
+                self.restart_at[index] = None
+                self.stats['restarts'] += 1
+                self.inboxes[index].cancel_join_thread()
+                self.start_worker(index)
+
+    def _read_acks(self) -> None:
+        while True:
+            item = self.acks.get()
+            if item is None:
+                return
+            self._loop.call_soon_threadsafe(self._ack, *item)
+
+    async def _monitor(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+            if stop_event.is_set():
+                return
+            self.check_workers(time.monotonic())
+
+    async def run(self) -> None:
+        """
+        Запустить рабочие процессы и webhook-приёмник и работать до SIGINT/SIGTERM.
+        """
+        self._loop = asyncio.get_running_loop()
+        for index in range(self.workers):
+            self.start_worker(index)
+        ack_reader = threading.Thread(target=self._read_acks, name='ack-reader', daemon=True)
+        ack_reader.start()
+
+        stop_event = stop_on_signals()
+        server = WebhookServer(self.route, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, self.secret_token)
+        try:
+            await server.start()
+            if WEBHOOK_URL:
+                async with Bot(TOKEN) as bot:
+                    await register_webhook(bot, WEBHOOK_URL, WEBHOOK_PATH, self.secret_token)
+            await self._monitor(stop_event)
+        finally:
+            await server.stop()
+            for inbox in self.inboxes:
+                inbox.put(None)
+            for process in self.processes:
+                await asyncio.to_thread(process.join, 30)
+                if process.is_alive():
+                    process.terminate()
+            self.acks.put(None)
+            await asyncio.to_thread(ack_reader.join, 5)
+
+
+def run_supervisor(workers: int, secret_token: str) -> None:
+    """
+    Запустить бота в режиме супервизора с указанным числом рабочих процессов.
+
+    :param workers: Количество рабочих процессов
+    :param secret_token: Секретный токен webhook
+    """
+    asyncio.run(Supervisor(workers, secret_token).run())
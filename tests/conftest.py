@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import tempfile
+import uuid
+
+# config читает окружение при импорте, поэтому настройки тестов задаются до импорта модулей бота
+_workdir = tempfile.mkdtemp(prefix='scryfall-bot-tests-')
+os.environ.update({
+    'SCRYFALL_API_URL': 'http://127.0.0.1:9',
+    'SCRYFALL_RATE_LIMIT': '100000',
+    'SCRYFALL_BURST': '100000',
+    'SCRYFALL_RETRY_BASE': '0.01',
+    'IMAGE_CACHE_DIR': os.path.join(_workdir, 'images'),
+    'OFFLINE_MODE': '0',
+    'WORKERS': '1',
+    'METRICS_PORT': '0',
+    'TRAFFIC_LOG': '',
+    'WEBHOOK_SECRET': '',
+})
+
+import pytest
+from database.models import database, bulk_database, initialize_database, initialize_bulk_database
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture(autouse=True)
+def databases(tmp_path):
+    """
+    Отдельные пустые базы истории, кэша и bulk-данных на каждый тест.
+    """
+    database.init(str(tmp_path / 'requests.db'))
+    bulk_database.init(str(tmp_path / 'bulk.db'))
+    initialize_database()
+    initialize_bulk_database()
+    yield
+    database.close()
+    bulk_database.close()
+
+
+@pytest.fixture
+def fixture_path():
+    """
+    :return: Функция, возвращающая путь к файлу из tests/fixtures
+    """
+    return lambda name: os.path.join(FIXTURES, name)
+
+
+@pytest.fixture
+def memory_database():
+    """
+    База истории в памяти вместо файла. Соединения открываются и закрываются
+    в разных потоках (asyncio.to_thread), поэтому используется общий кэш
+    SQLite, а отдельное соединение держит базу, пока идёт тест.
+    """
+    uri = f"file:history-{uuid.uuid4().hex}?mode=memory&cache=shared"
+    keeper = sqlite3.connect(uri, uri=True)
+    database.init(uri, uri=True)
+    initialize_database()
+    yield database
+    database.close()
+    keeper.close()
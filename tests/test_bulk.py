@@ -0,0 +1,125 @@
+import asyncio
+import io
+import json
+import pytest
+import api.scryfall as scryfall
+from api.bulk import bulk_sets, ingest_bulk_file, iter_json_array, price_indexes, search_bulk
+from api.sets import SetCatalog
+from database.models import BulkCard
+from utils.helpers import format_data, parse_command, parse_custom_command
+
+
+@pytest.fixture
+def dump(fixture_path):
+    return fixture_path('default_cards.json')
+
+
+@pytest.fixture
+def offline_catalog(monkeypatch, dump):
+    ingest_bulk_file(dump)
+    catalog = SetCatalog()
+    catalog.load(bulk_sets())
+    monkeypatch.setattr(scryfall, 'set_catalog', catalog)
+    return catalog
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 100, 1 << 20])
+def test_iter_json_array_across_chunk_boundaries(dump, chunk_size):
+    with open(dump, encoding='utf-8') as file:
+        expected = json.load(file)
+    with open(dump, encoding='utf-8') as file:
+        assert list(iter_json_array(file, chunk_size=chunk_size)) == expected
+
+
+def test_iter_json_array_edge_cases():
+    assert list(iter_json_array(io.StringIO(' [ ] '), chunk_size=1)) == []
+    assert list(iter_json_array(io.StringIO('[1, "a]b", {"x": [2]}]'), chunk_size=3)) == [1, "a]b", {"x": [2]}]
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"object": "list"}')))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('[{"id": 1}, {"id": '), chunk_size=4))
+
+
+def test_ingest_skips_non_cards(dump):
+    stats = ingest_bulk_file(dump)
+    assert stats == {'added': 11, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    assert BulkCard.select().count() == 11
+
+
+def test_reingest_unchanged_dump_writes_nothing(dump, monkeypatch):
+    ingest_bulk_file(dump)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unchanged cards must not be rewritten")
+
+    monkeypatch.setattr(BulkCard, 'replace_many', fail)
+    assert ingest_bulk_file(dump) == {'added': 0, 'updated': 0, 'unchanged': 11, 'deleted': 0}
+
+
+def test_reingest_updates_changed_and_deletes_removed(dump, tmp_path):
+    ingest_bulk_file(dump)
+    with open(dump, encoding='utf-8') as file:
+        cards = json.load(file)
+    cards = [card for card in cards if card.get('name') != "Serra Angel"]
+    for card in cards:
+        if card.get('name') == "Black Lotus":
+            card['prices']['usd'] = "31000.00"
+    changed = tmp_path / 'default_cards.json'
+    changed.write_text(json.dumps(cards), encoding='utf-8')
+
+    assert ingest_bulk_file(str(changed)) == {'added': 0, 'updated': 1, 'unchanged': 9, 'deleted': 1}
+    assert search_bulk('high', 'set', 'lea', 1)[0].prices.usd == 31000.0
+
+
+def test_offline_low_and_high_card(offline_catalog):
+    low = search_bulk('low', 'card', "Lightning Bolt", 2)
+    assert [(card.set, card.prices.usd) for card in low] == [('2xm', 1.5), ('m10', 2.1)]
+    high = search_bulk('high', 'card', "lightning bolt", 0)
+    # Печать без цены в USD идёт последней
+    assert [card.set for card in high] == ['lea', 'm10', '2xm', 'sld']
+
+
+def test_offline_custom_range_excludes_unpriced(offline_catalog):
+    cards = search_bulk(None, 'card', "Lightning Bolt", 0, 1.0, 5.0)
+    assert sorted(card.prices.usd for card in cards) == [1.5, 2.1]
+
+
+def test_offline_commands_through_fetch_data(offline_catalog):
+    async def run(command):
+        if command.startswith('/custom'):
+            filter_choice, low_price, high_price, name = parse_custom_command(command)
+            return await scryfall.fetch_data(None, filter_choice, 0, name, low_price, high_price, offline=True)
+        data_choice, filter_choice, amount, name = parse_command(command)
+        return await scryfall.fetch_data(data_choice, filter_choice, amount, name, offline=True)
+
+    assert [card.name for card in asyncio.run(run("/high set 2 Limited Edition Alpha"))] == \
+        ["Black Lotus", "Lightning Bolt"]
+    assert [card.name for card in asyncio.run(run("/low set 1 Limited Edition"))] == ["Serra Angel"]
+    assert [card.name for card in asyncio.run(run("/low card 1 Jötun Grunt"))] == ["Jötun Grunt"]
+    assert [card.prices.usd for card in asyncio.run(run("/custom card 100 1000 Counterspell"))] == [120.0]
+    assert asyncio.run(run("/low set 3 No Such Set At All")) == []
+
+
+def test_reingest_in_another_process_invalidates_price_indexes(dump, tmp_path, monkeypatch):
+    ingest_bulk_file(dump)
+    assert search_bulk('high', 'set', 'lea', 1)[0].prices.usd == 30000.0
+
+    with open(dump, encoding='utf-8') as file:
+        cards = json.load(file)
+    for card in cards:
+        if card.get('name') == "Black Lotus":
+            card['prices']['usd'] = "32000.00"
+    changed = tmp_path / 'default_cards.json'
+    changed.write_text(json.dumps(cards), encoding='utf-8')
+    # Загрузка в другом процессе (python -m api.bulk) не очищает кэш индексов этого процесса
+    monkeypatch.setattr(price_indexes, 'clear', lambda: None)
+    ingest_bulk_file(str(changed))
+
+    assert search_bulk('high', 'set', 'lea', 1)[0].prices.usd == 32000.0
+
+
+def test_offline_sort_by_other_currency(offline_catalog):
+    # У печати sld нет цены в USD, но есть цена в EUR
+    cards = asyncio.run(scryfall.fetch_data('low', 'card', 2, "Lightning Bolt", offline=True, currency='eur'))
+    assert [card.set for card in cards] == ['sld', '2xm']
+    assert "€0\\.95" in format_data(cards, 'eur')
@@ -0,0 +1,70 @@
+import random
+import pytest
+from utils.chunking import MARKDOWN_MARKERS, cut_position, is_safe_cut, safe_cuts, split_message
+
+
+def reference_is_safe_cut(text: str, position: int) -> bool:
+    """
+    Прямая проверка одной позиции: разбор префикса заново (как до safe_cuts).
+    """
+    prefix = text[:position]
+    counts = {marker: 0 for marker in MARKDOWN_MARKERS}
+    brackets = 0
+    in_link_url = False
+    escaped = False
+    for index, char in enumerate(prefix):
+        if escaped:
+            escaped = False
+            continue
+        if char == '\\':
+            escaped = True
+        elif in_link_url:
+            if char == ')':
+                in_link_url = False
+        elif char in counts:
+            counts[char] += 1
+        elif char == '[':
+            brackets += 1
+        elif char == ']' and brackets:
+            brackets -= 1
+            if prefix[index + 1:index + 2] == '(':
+                in_link_url = True
+    # Разрез после '\\' или между ']' и '(' ссылки тоже разрывает сущность
+    if escaped or prefix.endswith(']') and text[position:position + 1] == '(':
+        return False
+    return not brackets and not in_link_url and all(count % 2 == 0 for count in counts.values())
+
+
+def test_safe_cuts_match_direct_check():
+    rng = random.Random(7)
+    alphabet = 'ab \\[]()' + ''.join(MARKDOWN_MARKERS)
+    for _ in range(300):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        safe = safe_cuts(text, len(text))
+        assert safe == [reference_is_safe_cut(text, position) for position in range(len(text) + 1)], text
+
+
+@pytest.mark.parametrize('text, position, expected', [
+    ("*bold* text", 3, False),
+    ("*bold* text", 6, True),
+    ("a\\*b", 2, False),
+    ("[link](http://x) y", 5, False),
+    ("[link](http://x) y", 6, False),
+    ("[link](http://x) y", 16, True),
+])
+def test_is_safe_cut(text, position, expected):
+    assert is_safe_cut(text, position) is expected
+
+
+def test_cut_position_prefers_spaces_outside_entities():
+    text = "word *bold words here* tail"
+    assert cut_position(text, 12) == 5
+    assert cut_position("x" * 50, 10) == 10
+
+
+def test_split_message_keeps_entities_whole():
+    text = ' '.join(f"*card {i}*" for i in range(2000))
+    chunks = split_message(text, 4096)
+    assert all(len(chunk) <= 4096 for chunk in chunks)
+    assert all(chunk.count('*') % 2 == 0 for chunk in chunks)
+    assert ' '.join(chunks) == text
@@ -0,0 +1,82 @@
+import asyncio
+import api.scryfall as scryfall
+from api.cache import ResultCache
+from api.card import Card, Prices
+from api.scryfall import ScryfallClient, fetch_collection
+from benchmarks.fake_scryfall import FakeScryfall, generate_cards
+from config import DECKLIST_MAX_CARDS
+from utils.formatting import render_price_list
+from utils.helpers import parse_decklist
+
+DECKLIST = """Deck
+4 Lightning Bolt
+4x Counterspell
+Brainstorm
+// Сайдборд
+Sideboard:
+2 lightning  bolt
+1 Opt (M21) 59
+"""
+
+
+def test_decklist_line_formats():
+    assert parse_decklist(DECKLIST) == [(6, 'Lightning Bolt'), (4, 'Counterspell'), (1, 'Brainstorm'), (1, 'Opt')]
+
+
+def test_decklist_is_capped_by_distinct_cards():
+    text = '\n'.join(f"1 Card {index}" for index in range(DECKLIST_MAX_CARDS + 10)) + '\n3 Card 0'
+    deck = parse_decklist(text, DECKLIST_MAX_CARDS)
+    assert len(deck) == DECKLIST_MAX_CARDS
+    # Повтор уже принятой карты учитывается и после достижения лимита
+    assert deck[0] == (4, 'Card 0')
+    assert deck[-1] == (1, f"Card {DECKLIST_MAX_CARDS - 1}")
+
+
+def test_collection_is_fetched_in_batches(monkeypatch):
+    cards = generate_cards(sets=2, cards_per_set=400, prints_per_name=1)
+    dfc = dict(cards[0], id='dfc-0001', name='Delver of Secrets // Insectile Aberration')
+    names = sorted({card['name'] for card in cards})[:160]
+
+    async def scenario():
+        server = FakeScryfall(cards + [dfc])
+        await server.start()
+        client = ScryfallClient(base_url=server.url, hedge=False)
+        monkeypatch.setattr(scryfall, 'client', client)
+        monkeypatch.setattr(scryfall, 'result_cache', ResultCache(persistent=False))
+        try:
+            found, not_found = await fetch_collection(names + ['Delver of Secrets', 'No Such Card', 'no  such card',
+                                                               'Another Missing Card'], offline=False)
+            requests = server.stats['/cards/collection']
+            # Повторный список берётся из кэша результатов
+            await fetch_collection(names[:10], offline=False)
+            return found, not_found, requests, server.stats['/cards/collection']
+        finally:
+            await client.close()
+            await server.stop()
+
+    found, not_found, requests, requests_after = asyncio.run(scenario())
+    # 162 уникальных имени: пачки по 75 (больше FakeScryfall, как и Scryfall, не принимает)
+    assert requests == 3
+    assert requests_after == 3
+    assert not_found == ['no such card', 'another missing card']
+    assert len(found) == 161
+    assert found['delver of secrets'].name == 'Delver of Secrets // Insectile Aberration'
+    assert all(found[name.lower()].name == name for name in names)
+
+
+def test_price_list_total():
+    deck = [(4, 'Lightning Bolt'), (2, 'Delver of Secrets'), (1, 'Unpriced Card'), (3, 'Missing Card')]
+    cards = {
+        'lightning bolt': Card(id='a', name='Lightning Bolt', set_name='Magic 2010', prices=Prices(usd=1.25)),
+        'delver of secrets': Card(id='b', name='Delver of Secrets // Insectile Aberration', set_name='Innistrad',
+                                  prices=Prices(usd=0.5)),
+        'unpriced card': Card(id='c', name='Unpriced Card', set_name='Promo'),
+    }
+    text = render_price_list(deck, cards, ['missing card'])
+    lines = text.split('\n')
+    assert lines[0] == "4 × Lightning Bolt \\(Magic 2010\\) — $5\\.00 \\($1\\.25 за шт\\.\\)"
+    assert lines[1] == "2 × Delver of Secrets // Insectile Aberration \\(Innistrad\\) — $1\\.00 \\($0\\.50 за шт\\.\\)"
+    assert lines[2] == "1 × Unpriced Card — нет цены"
+    assert "*Итого:* $6\\.00 за 7 карт" in lines
+    assert lines[-2] == "Без цены в USD: 1 карт"
+    assert lines[-1] == "Не найдены: Missing Card"
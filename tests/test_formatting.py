@@ -0,0 +1,69 @@
+import re
+from api.card import Card, ImageUris, Prices
+from utils.formatting import CardFormatter, escape_markdown
+
+# Символы, которые Telegram в MarkdownV2 принимает только экранированными или как разметку
+RESERVED = set('_*[]()~`>#+-=|{}.!')
+
+
+def unescaped(text):
+    """
+    :return: Неэкранированные служебные символы MarkdownV2 в порядке появления
+    """
+    found = []
+    escaped = False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in RESERVED:
+            found.append(char)
+    assert not escaped, "текст заканчивается одиночной \\"
+    return found
+
+
+def plain(text):
+    """
+    :return: Текст, который увидит пользователь: без разметки и экранирования
+    """
+    return re.sub(r'\\(.)|\*', lambda match: match.group(1) or '', text)
+
+
+def test_escape_markdown_escapes_every_reserved_character():
+    text = ''.join(sorted(RESERVED)) + '\\'
+    escaped = escape_markdown(text)
+    assert unescaped(escaped) == []
+    assert re.sub(r'\\(.)', r'\1', escaped) == text
+
+
+def test_card_with_special_names_is_valid_markdown_v2():
+    card = Card(id='special', name="Borrowed_Time *Foil* [Promo] (2020) v1.0 - Wow!",
+                set_name="Set_Name (Special) [X] - Ed. 2!", type_line="Creature — Elf.Druid",
+                frame_effects=('showcase', 'extended-art'), prices=Prices(usd=1234.5),
+                image_uris=ImageUris(normal="https://cards.scryfall.io/normal/front/a/b.jpg?1700000000"))
+    text = CardFormatter().render([card, card], 'card')
+    # Неэкранированы только звёздочки жирных подписей шаблона: по 6 пар на карту
+    assert unescaped(text) == ['*'] * 24
+    assert card.name in plain(text)
+    assert card.set_name in plain(text)
+    assert "$1234.50" in plain(text)
+
+    caption = CardFormatter().render([card], 'caption')
+    assert unescaped(caption) == ['*', '*']
+
+
+def test_price_change_gives_new_render():
+    formatter = CardFormatter()
+    card = Card(id='bolt', name='Lightning Bolt', set_name='Magic 2010', prices=Prices(usd=1.0, eur=0.9))
+    first = formatter.render([card])
+    assert formatter.render([card]) is first
+
+    repriced = Card(id='bolt', name='Lightning Bolt', set_name='Magic 2010', prices=Prices(usd=2.0, eur=0.9))
+    second = formatter.render([repriced])
+    assert second != first
+    assert "$2\\.00" in second and "$1\\.00" not in second
+    assert formatter.stats == {'hits': 1, 'misses': 2}
+    # Цена в другой валюте не изменилась, но ключ кэша учитывает валюту
+    assert "€0\\.90" in formatter.render([repriced], currency='eur')
+    assert formatter.stats['misses'] == 3
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from database.history import compact_history, decode_cursor, encode_cursor, history_page
+from database.models import database, UserRequest
+
+START = datetime(2024, 11, 16, 12, 0, 0)
+
+
+def add_history(username, count, same_time_pairs=False):
+    """
+    Добавить count записей пользователя; при same_time_pairs у соседних записей одинаковое время.
+    """
+    rows = [{'username': username, 'command': 'low', 'data_choice': 'low', 'filter_choice': 'card',
+             'amount': '5', 'name': f"{username} {index}",
+             'timestamp': START + timedelta(seconds=index // 2 if same_time_pairs else index)}
+            for index in range(count)]
+    with database.connection_context():
+        UserRequest.insert_many(rows).execute()
+
+
+def names(rows):
+    return [int(row.name.split()[-1]) for row in rows]
+
+
+def cursor(row):
+    return decode_cursor(encode_cursor(row))
+
+
+def test_keyset_pages_in_both_directions(memory_database):
+    # Одинаковое время у пар записей: порядок внутри пары задаёт id
+    add_history('alice', 7, same_time_pairs=True)
+    add_history('bob', 3)
+
+    first, has_newer, has_older = history_page('alice', 3)
+    assert names(first) == [6, 5, 4] and (has_newer, has_older) == (False, True)
+
+    second, has_newer, has_older = history_page('alice', 3, before=cursor(first[-1]))
+    assert names(second) == [3, 2, 1] and (has_newer, has_older) == (True, True)
+
+    last, has_newer, has_older = history_page('alice', 3, before=cursor(second[-1]))
+    assert names(last) == [0] and (has_newer, has_older) == (True, False)
+
+    back, has_newer, has_older = history_page('alice', 3, after=cursor(last[0]))
+    assert names(back) == [3, 2, 1] and (has_newer, has_older) == (True, True)
+
+    newest, has_newer, has_older = history_page('alice', 3, after=cursor(back[0]))
+    assert names(newest) == [6, 5, 4] and (has_newer, has_older) == (False, True)
+
+
+def test_short_history_fits_one_page(memory_database):
+    add_history('alice', 3)
+    rows, has_newer, has_older = history_page('alice', 3)
+    assert names(rows) == [2, 1, 0] and (has_newer, has_older) == (False, False)
+    assert history_page('carol', 3) == ([], False, False)
+
+
+def test_retention_keeps_newest_rows_per_user(memory_database):
+    add_history('alice', 7, same_time_pairs=True)
+    add_history('bob', 2)
+
+    assert compact_history(3) == 4
+    kept = {}
+    with database.connection_context():
+        for username, name in UserRequest.select(UserRequest.username, UserRequest.name).tuples():
+            kept.setdefault(username, []).append(int(name.split()[-1]))
+    assert {username: sorted(indexes) for username, indexes in kept.items()} == {'alice': [4, 5, 6], 'bob': [0, 1]}
+    assert compact_history(3) == 0
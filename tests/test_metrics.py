@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import handlers.commands as commands
+from api.resilience import ScryfallUnavailable
+from utils.metrics import COMMANDS_TOTAL, instrumented, record_error
+
+
+def count(command: str, outcome: str) -> float:
+    return COMMANDS_TOTAL.labels(command, outcome)._value.get()
+
+
+class FakeMessage:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text: str, **kwargs) -> None:
+        self.replies.append(text)
+
+
+def test_outcomes():
+    @instrumented('test_ok')
+    async def ok():
+        return 1
+
+    @instrumented('test_handled')
+    async def handled():
+        record_error()
+
+    @instrumented('test_raised')
+    async def raised():
+        raise ValueError
+
+    before = count('test_ok', 'ok'), count('test_handled', 'error'), count('test_raised', 'error')
+    asyncio.run(ok())
+    asyncio.run(handled())
+    with pytest.raises(ValueError):
+        asyncio.run(raised())
+    assert (count('test_ok', 'ok'), count('test_handled', 'error'), count('test_raised', 'error')) == \
+        tuple(value + 1 for value in before)
+    # Вне команды record_error ничего не делает
+    record_error()
+
+
+def test_handler_error_reply_is_counted_as_error(monkeypatch):
+    async def fetch_set_index(name):
+        raise ScryfallUnavailable("Scryfall временно недоступен, попробуйте позже.")
+
+    monkeypatch.setattr(commands, 'fetch_set_index', fetch_set_index)
+    monkeypatch.setattr(commands, 'history_recorder', SimpleNamespace(record=lambda *args: None))
+    message = FakeMessage("/stats set Theros")
+    update = SimpleNamespace(message=message, effective_user=SimpleNamespace(username='test', id=1))
+
+    errors, oks = count('stats', 'error'), count('stats', 'ok')
+    asyncio.run(commands.stats(update, SimpleNamespace(user_data={}, args=['set', 'Theros'])))
+    assert message.replies == ["Произошла ошибка: Scryfall временно недоступен, попробуйте позже."]
+    assert count('stats', 'error') == errors + 1
+    assert count('stats', 'ok') == oks
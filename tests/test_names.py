@@ -0,0 +1,55 @@
+from api.names import CardNameIndex
+
+NAMES = ['Lightning Bolt', 'Lightning Helix', 'Chain Lightning', 'Bolt Bend', 'Boltwave', 'Fireball',
+         'Jötun Grunt', "Urza's Saga", 'Delver of Secrets // Insectile Aberration']
+
+
+class CountingList(list):
+    """
+    Список, считающий обращения по индексу.
+    """
+
+    reads = 0
+
+    def __getitem__(self, index):
+        CountingList.reads += 1
+        return super().__getitem__(index)
+
+
+def make_index(names=NAMES):
+    index = CardNameIndex()
+    index.load(names)
+    return index
+
+
+def test_prefix_matches_rank_before_word_matches():
+    index = make_index()
+    assert index.find_prefix('bolt') == ['Boltwave', 'Bolt Bend', 'Lightning Bolt']
+    assert index.find_prefix('LIGHTNING') == ['Lightning Bolt', 'Lightning Helix', 'Chain Lightning']
+    # Диакритика, апострофы и вторая сторона карты не мешают поиску
+    assert index.find_prefix('jotun') == ['Jötun Grunt']
+    assert index.find_prefix('urzas s') == ["Urza's Saga"]
+    assert index.find_prefix('insectile') == ['Delver of Secrets // Insectile Aberration']
+
+
+def test_typo_is_found():
+    index = make_index()
+    assert index.search('Lightnig Bolt')[0] == 'Lightning Bolt'
+    assert index.search('Firebsll')[0] == 'Fireball'
+    assert index.find_fuzzy('Zzzzzz') == []
+
+
+def test_short_query_does_not_scan_index(monkeypatch):
+    index = make_index([f"Card {number:05d}" for number in range(5000)])
+    assert index.search('') == []
+    assert index.search('   ') == []
+
+    def no_fuzzy(*args, **kwargs):
+        raise AssertionError("нечёткий поиск для короткого запроса")
+
+    monkeypatch.setattr(index, 'find_fuzzy', no_fuzzy)
+    index._suffixes = CountingList(index._suffixes)
+    CountingList.reads = 0
+    assert index.search('c', limit=10) == [f"Card {number:05d}" for number in range(10)]
+    # Бинарный поиск и не больше limit * 20 кандидатов, а не все 10 000 «хвостов» имён
+    assert CountingList.reads <= 10 * 20 + 20
@@ -0,0 +1,120 @@
+import asyncio
+from typing import Any, Dict, Optional
+import pytest
+import api.scryfall as scryfall
+from api.cache import ResultCache, covers
+from api.card import Card, Prices, SearchPage
+from api.pagination import fetch_pages, iter_pages
+from api.resilience import ScryfallUnavailable
+from utils.price_index import PriceIndexCache
+
+
+class PagedClient:
+    """
+    Клиент-заглушка: отдаёт карты страницами по page_size, страницы из failing отвечают не 200.
+    """
+
+    def __init__(self, count: int, page_size: int = 10, failing=()) -> None:
+        self.cards = [Card(id=f"id-{i}", name="Paged Card", set='pgd', prices=Prices(usd=float(i + 1)))
+                      for i in range(count)]
+        self.page_size = page_size
+        self.failing = set(failing)
+        self.requested = []
+
+    async def get_page(self, url: str, params: Optional[Dict[str, Any]] = None,
+                       priority: Optional[int] = None) -> Optional[SearchPage]:
+        page = int(params.get('page', 1))
+        self.requested.append(page)
+        if page in self.failing:
+            return None
+        start = (page - 1) * self.page_size
+        return SearchPage(data=self.cards[start:start + self.page_size],
+                          has_more=start + self.page_size < len(self.cards), total_cards=len(self.cards))
+
+
+async def collect(pages):
+    cards = []
+    async for page in pages:
+        cards.extend(page)
+    return cards
+
+
+def test_all_pages_complete():
+    client = PagedClient(35)
+    pages = iter_pages(client, "/cards/search", {'q': 'x'})
+    cards = asyncio.run(collect(pages))
+    assert [card.id for card in cards] == [card.id for card in client.cards]
+    assert pages.complete
+
+
+def test_failed_page_truncates_and_marks_incomplete():
+    client = PagedClient(35, failing={3})
+    pages = iter_pages(client, "/cards/search", {'q': 'x'})
+    cards = asyncio.run(collect(pages))
+    assert len(cards) == 20
+    assert not pages.complete
+
+
+def test_limit_stops_early_and_is_complete():
+    client = PagedClient(100)
+    pages = iter_pages(client, "/cards/search", {'q': 'x'}, limit=15)
+    cards = asyncio.run(collect(pages))
+    assert len(cards) == 20
+    assert sorted(client.requested) == [1, 2]
+    assert pages.complete
+
+
+def test_fetch_pages_returns_list():
+    assert len(asyncio.run(fetch_pages(PagedClient(12), "/cards/search", {'q': 'x'}))) == 12
+
+
+def test_covers():
+    assert covers(0, 3, 10)
+    assert covers(10, 3, 50)
+    assert covers(10, 10, 5)
+    assert not covers(10, 10, 20)
+    assert not covers(10, 10, 0)
+
+
+@pytest.mark.parametrize('failing, cached', [((), True), ({2}, False)])
+def test_incomplete_result_is_not_cached(monkeypatch, failing, cached):
+    client = PagedClient(25, failing=failing)
+    cache = ResultCache(persistent=False)
+    monkeypatch.setattr(scryfall, 'client', client)
+    monkeypatch.setattr(scryfall, 'result_cache', cache)
+
+    async def scenario():
+        cards = await scryfall.fetch_data(None, "card", 0, "Paged Card", 0.0, 1000.0)
+        return cards, await cache.get(scryfall.make_cache_key(None, "card", "Paged Card", 0.0, 1000.0), 0)
+
+    cards, from_cache = asyncio.run(scenario())
+    assert len(cards) == (25 if cached else 10)
+    assert (from_cache is not None) == cached
+
+
+@pytest.mark.parametrize('failing', [(), {2}])
+def test_partial_set_is_not_summarized_or_cached(monkeypatch, failing):
+    client = PagedClient(25, failing=failing)
+    cache = ResultCache(persistent=False)
+    set_indexes = PriceIndexCache()
+    monkeypatch.setattr(scryfall, 'client', client)
+    monkeypatch.setattr(scryfall, 'result_cache', cache)
+    monkeypatch.setattr(scryfall, 'set_indexes', set_indexes)
+
+    async def get_set_code(name):
+        return 'pgd'
+
+    monkeypatch.setattr(scryfall, 'get_set_code', get_set_code)
+
+    async def scenario():
+        index = await scryfall.fetch_set_index("Paged Set", offline=False)
+        return index, await cache.get(scryfall.make_cache_key('stats', "set", 'pgd'), 0)
+
+    if failing:
+        with pytest.raises(ScryfallUnavailable):
+            asyncio.run(scenario())
+        assert set_indexes.get('pgd') is None
+    else:
+        index, cached = asyncio.run(scenario())
+        assert len(index) == len(cached) == 25
+        assert set_indexes.get('pgd') is index
@@ -0,0 +1,23 @@
+from api.cache import make_cache_key
+from api.card import Card, Prices
+from api.query import plan_query
+
+
+def test_plan_query_usd_by_default():
+    plan = plan_query('low', 'card', "Lightning Bolt", 3)
+    assert plan.params['order'] == 'usd'
+    assert plan.params['q'] == '!"Lightning Bolt"'
+    assert plan.limit == 3
+
+
+def test_plan_query_other_currency():
+    plan = plan_query(None, 'set', 'm10', 0, 1.0, 5.0, currency='eur')
+    assert plan.params['order'] == 'eur'
+    assert plan.params['q'] == 'set:m10 eur>=1 eur<=5'
+    cards = [Card(id='a', name='A', prices=Prices(usd=2.0)), Card(id='b', name='B', prices=Prices(eur=1.5))]
+    assert [card.id for card in plan.apply_fallback(cards)] == ['b']
+
+
+def test_cache_key_depends_on_currency():
+    assert make_cache_key('low', 'card', "Bolt") == 'low|card|bolt|-|-'
+    assert make_cache_key('low', 'card', "Bolt", currency='tix') == 'low|card|bolt|-|-|tix'
@@ -0,0 +1,70 @@
+import asyncio
+from database.models import database, UserRequest
+from database.recorder import HistoryRecorder
+
+
+def stored_rows():
+    with database.connection_context():
+        return list(UserRequest.select().order_by(UserRequest.id).tuples())
+
+
+def record(recorder, count, username='alice'):
+    for index in range(count):
+        recorder.record(username, 'low', 'low', 'card', '5', f"Card {index}")
+
+
+def test_rows_are_written_in_one_transaction(memory_database, monkeypatch):
+    batches = []
+    insert = HistoryRecorder._insert
+
+    def spy(rows):
+        batches.append(len(rows))
+        insert(rows)
+
+    monkeypatch.setattr(HistoryRecorder, '_insert', staticmethod(spy))
+
+    async def scenario():
+        recorder = HistoryRecorder(flush_size=10, flush_interval=60)
+        record(recorder, 10)
+        # Пачка набрана: запись не ждёт flush_interval
+        for _ in range(100):
+            if recorder.stats['batches']:
+                break
+            await asyncio.sleep(0.01)
+        written = len(stored_rows())
+        await recorder.stop()
+        return recorder.stats, written
+
+    stats, written = asyncio.run(scenario())
+    assert batches == [10]
+    assert written == 10
+    assert stats['written'] == 10 and stats['batches'] == 1
+
+
+def test_partial_batch_is_written_after_interval(memory_database):
+    async def scenario():
+        recorder = HistoryRecorder(flush_size=100, flush_interval=0.05)
+        record(recorder, 3)
+        await asyncio.sleep(0.3)
+        written = len(stored_rows())
+        await recorder.stop()
+        return recorder.stats, written
+
+    stats, written = asyncio.run(scenario())
+    assert written == 3
+    assert stats['batches'] == 1
+
+
+def test_stop_drains_queue(memory_database):
+    async def scenario():
+        recorder = HistoryRecorder(flush_size=100, flush_interval=60)
+        record(recorder, 5)
+        record(recorder, 2, username='bob')
+        await recorder.stop()
+        return recorder.stats
+
+    stats = asyncio.run(scenario())
+    rows = stored_rows()
+    assert len(rows) == 7
+    assert [row[1] for row in rows] == ['alice'] * 5 + ['bob'] * 2
+    assert stats['recorded'] == stats['written'] == 7
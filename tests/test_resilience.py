@@ -0,0 +1,165 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+import api.scryfall as scryfall
+import loader
+from api.cache import ResultCache, StaleCards
+from api.names import CardNameIndex
+from api.resilience import CircuitBreaker, ScryfallUnavailable
+from api.scryfall import ScryfallClient
+from api.sets import SetCatalog
+from benchmarks.fake_scryfall import FakeScryfall, generate_cards
+
+SEARCH = {'q': 'set:b01', 'unique': 'prints'}
+
+
+def run_with_server(scenario, **options):
+    """
+    Запустить сценарий scenario(server, client) против FakeScryfall.
+    """
+    async def main():
+        server = FakeScryfall(generate_cards(sets=2, cards_per_set=20), **options)
+        await server.start()
+        client = ScryfallClient(base_url=server.url, retries=1, hedge=False)
+        try:
+            return await scenario(server, client)
+        finally:
+            await client.close()
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+def test_breaker_opens_and_fails_fast():
+    async def scenario(server, client):
+        client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        server.outage = True
+        with pytest.raises(ScryfallUnavailable):
+            await client.get_page("/cards/search", SEARCH)
+        assert client.breaker.state == CircuitBreaker.OPEN
+        requests = server.stats['/cards/search']
+
+        server.outage = False
+        with pytest.raises(ScryfallUnavailable):
+            await client.get_page("/cards/search", SEARCH)
+        # Разомкнутый предохранитель отвечает сразу, не обращаясь к серверу
+        assert server.stats['/cards/search'] == requests
+
+    run_with_server(scenario)
+
+
+def test_retries_stop_when_breaker_opens():
+    async def scenario(server, client):
+        client.retries = 3
+        client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        server.outage = True
+        with pytest.raises(ScryfallUnavailable):
+            await client.get_page("/cards/search", SEARCH)
+        # После первой неудачи предохранитель разомкнут, и повторы уже не отправляются
+        assert server.stats['/cards/search'] == 1
+
+    run_with_server(scenario)
+
+
+def test_retry_after_is_honored():
+    async def scenario(server, client):
+        server.planned.append('throttle')
+        started = time.perf_counter()
+        page = await client.get_page("/cards/search", SEARCH)
+        elapsed = time.perf_counter() - started
+        assert page is not None and len(page.data) == 20
+        assert server.faults == {'throttle': 1}
+        # Без Retry-After повтор ждал бы не больше SCRYFALL_RETRY_BASE (0.01 с)
+        assert elapsed >= 0.3
+        assert client.breaker.state == CircuitBreaker.CLOSED
+
+    run_with_server(scenario, retry_after=0.3)
+
+
+def test_slow_page_is_hedged():
+    async def scenario(server, client):
+        client.hedge = True
+        for _ in range(client.page_latency.min_samples):
+            client.page_latency.add(0.01)
+        server.planned.append('stall')
+        started = time.perf_counter()
+        page = await client.get_page("/cards/search", SEARCH)
+        assert page is not None
+        assert time.perf_counter() - started < server.stall
+        assert server.stats['/cards/search'] == 2
+
+    run_with_server(scenario, stall=1.0)
+
+
+def test_cancelled_hedged_request_leaves_no_tasks():
+    async def scenario(server, client):
+        client.hedge = True
+        for _ in range(client.page_latency.min_samples):
+            client.page_latency.add(0.5)
+        server.planned.append('stall')
+        # Запрос отменяется, пока первая попытка ждёт момента для дублирующей
+        request = asyncio.create_task(client._send('GET', "/cards/search", hedge=True, params=SEARCH))
+        await asyncio.sleep(0.1)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        attempts = [task for task in asyncio.all_tasks() if task.get_coro().__name__ == '_request']
+        assert attempts == []
+
+    run_with_server(scenario, stall=1.0)
+
+
+def test_stale_result_is_shown_during_outage(monkeypatch):
+    async def scenario(server, client):
+        cache = ResultCache(persistent=False, ttl=-1, stale_ttl=3600)
+        monkeypatch.setattr(scryfall, 'client', client)
+        monkeypatch.setattr(scryfall, 'result_cache', cache)
+        monkeypatch.setattr(scryfall, 'set_catalog', SetCatalog(client))
+        cards = await scryfall.fetch_data('low', 'set', 5, "Benchmark Set 1")
+        assert len(cards) == 5 and not isinstance(cards, StaleCards)
+
+        server.outage = True
+        stale = await scryfall.fetch_data('low', 'set', 5, "Benchmark Set 1")
+        assert isinstance(stale, StaleCards)
+        assert [card.id for card in stale] == [card.id for card in cards]
+
+        with pytest.raises(ScryfallUnavailable):
+            await scryfall.fetch_data('low', 'set', 5, "Benchmark Set 2")
+
+    run_with_server(scenario)
+
+
+def test_startup_survives_outage(monkeypatch):
+    async def scenario(server, client):
+        catalog = SetCatalog(client)
+        monkeypatch.setattr(loader, 'client', client)
+        monkeypatch.setattr(loader, 'set_catalog', catalog)
+        monkeypatch.setattr(loader, 'card_names', CardNameIndex(client))
+        monkeypatch.setattr(scryfall, 'set_catalog', catalog)
+        application = SimpleNamespace(bot_data={})
+        server.outage = True
+        await loader.on_startup(application)
+        try:
+            assert not catalog.is_loaded
+            # Когда Scryfall снова отвечает, каталог загружается при первом запросе набора
+            server.outage = False
+            client.breaker = CircuitBreaker()
+            assert await scryfall.get_set_code("Benchmark Set 1") == 'b01'
+        finally:
+            await loader.on_shutdown(application)
+
+    run_with_server(scenario)
+
+
+def test_image_failures_do_not_open_breaker():
+    async def scenario(server, client):
+        client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        # Изображения лежат на CDN: его сбои не должны отключать запросы к API
+        server.outage = True
+        for _ in range(3):
+            assert await client.fetch_bytes(server.url + '/missing.jpg') is None
+        assert await client.fetch_bytes('http://127.0.0.1:1/card.jpg') is None
+        assert client.breaker.state == CircuitBreaker.CLOSED
+
+    run_with_server(scenario)
@@ -0,0 +1,127 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import api.scheduler as scheduler
+from api.scheduler import BACKGROUND, INTERACTIVE, RequestScheduler, TokenBucket
+
+real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """
+    Часы планировщика: время идёт только во время asyncio.sleep.
+    """
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        # Сначала выполняются уже отправленные запросы, затем проходит время
+        await real_sleep(0)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler, 'time', SimpleNamespace(monotonic=clock))
+    monkeypatch.setattr(asyncio, 'sleep', clock.sleep)
+    return clock
+
+
+def test_token_bucket_allows_burst_then_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        assert bucket.delay() == 0
+        bucket.take()
+    assert bucket.delay() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.delay() == 0
+    # Простой не накапливает токенов больше capacity
+    clock.now += 100
+    bucket.take()
+    assert bucket.tokens == pytest.approx(2)
+
+
+def test_requests_are_spaced_by_rate(clock):
+    async def scenario():
+        requests = RequestScheduler(rate=2, burst=2)
+        sent = []
+
+        def factory(index):
+            async def request():
+                sent.append((index, clock.now))
+                return index
+            return request
+
+        try:
+            results = await asyncio.gather(*(requests.submit(f"key {index}", factory(index)) for index in range(5)))
+        finally:
+            await requests.close()
+        return results, sent
+
+    results, sent = asyncio.run(scenario())
+    assert results == [0, 1, 2, 3, 4]
+    assert [index for index, _ in sent] == [0, 1, 2, 3, 4]
+    assert [at for _, at in sent] == pytest.approx([0, 0, 0.5, 1.0, 1.5])
+
+
+def test_interactive_requests_go_before_queued_background(clock):
+    async def scenario():
+        requests = RequestScheduler(rate=1, burst=1)
+        sent = []
+
+        def factory(name):
+            async def request():
+                sent.append(name)
+            return request
+
+        submits = [requests.submit(f"bg {index}", factory(f"bg {index}"), BACKGROUND) for index in range(3)]
+        submits.append(requests.submit('user', factory('user'), INTERACTIVE))
+        try:
+            await asyncio.gather(*submits)
+        finally:
+            await requests.close()
+        return sent, requests.stats
+
+    sent, stats = asyncio.run(scenario())
+    assert sent == ['user', 'bg 0', 'bg 1', 'bg 2']
+    assert stats['background'] == 3
+
+
+def test_identical_requests_share_one_call(clock):
+    async def scenario(outcome):
+        requests = RequestScheduler(rate=100, burst=100)
+        release = asyncio.Event()
+        calls = []
+
+        async def request():
+            calls.append(1)
+            await release.wait()
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        waiters = [asyncio.ensure_future(requests.submit('same', request)) for _ in range(5)]
+        await real_sleep(0)
+        await real_sleep(0)
+        release.set()
+        try:
+            results = await asyncio.gather(*waiters, return_exceptions=True)
+        finally:
+            await requests.close()
+        return results, len(calls), requests.stats
+
+    result = object()
+    results, calls, stats = asyncio.run(scenario(result))
+    assert calls == 1
+    assert all(item is result for item in results)
+    assert stats['coalesced'] == 4 and stats['sent'] == 1
+
+    error = ValueError("Scryfall ответил ошибкой")
+    results, calls, _ = asyncio.run(scenario(error))
+    assert calls == 1
+    assert all(item is error for item in results)
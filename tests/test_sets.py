@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from api.scryfall import ScryfallClient
+from api.sets import SetCatalog, normalize_set_name
+from benchmarks.fake_scryfall import FakeScryfall, generate_cards
+
+
+@pytest.fixture
+def catalog(fixture_path):
+    catalog = SetCatalog()
+    catalog.load_file(fixture_path('sets.json'))
+    return catalog
+
+
+def test_normalize_set_name():
+    assert normalize_set_name("  Ravnica: City of  Guilds ") == 'ravnica city of guilds'
+    assert normalize_set_name("Duel Decks: Ajani vs. Nicol Bolas") == 'duel decks ajani vs nicol bolas'
+
+
+@pytest.mark.parametrize('value, code', [
+    ("Theros", 'ths'),
+    ("theros", 'ths'),
+    ("ravnica city of guilds", 'rav'),
+    ("Ravnica: City of Guilds", 'rav'),
+    ("LEA", 'lea'),
+])
+def test_exact_name_and_code(catalog, value, code):
+    assert catalog.get(value) == code
+    assert catalog.resolve(value) == code
+
+
+@pytest.mark.parametrize('alias, code', [("dar", 'dom'), ("CFX", 'con'), ("con", 'con')])
+def test_mtgo_and_arena_aliases(catalog, alias, code):
+    assert catalog.resolve(alias) == code
+
+
+def test_prefix(catalog):
+    assert catalog.find_prefix("battle for") == ['bfz']
+    assert catalog.find_prefix("duel decks") == ['ddh']
+    assert catalog.find_prefix("") == []
+    assert catalog.resolve("Khans") == 'ktk'
+
+
+@pytest.mark.parametrize('value, code', [("Therso", 'ths'), ("Dominara", 'dom'), ("Dragons of Tarkr", 'dtk')])
+def test_fuzzy(catalog, value, code):
+    assert catalog.get(value) is None
+    assert catalog.resolve(value) == code
+
+
+def test_unknown_set(catalog):
+    assert catalog.resolve("Completely Unknown Expansion") is None
+
+
+def test_refresh_uses_etag_and_keeps_catalog_on_304():
+    async def scenario():
+        server = FakeScryfall(generate_cards(sets=3, cards_per_set=10))
+        await server.start()
+        client = ScryfallClient(base_url=server.url)
+        catalog = SetCatalog(client)
+        try:
+            await catalog.refresh()
+            assert catalog.resolve("Benchmark Set 1") == 'b01'
+            assert catalog._etag
+
+            loaded_at = catalog._loaded_at
+            reloads = []
+            catalog.load = reloads.append
+            await catalog.refresh()
+            # 304: каталог не разбирается заново, но его срок жизни продлевается
+            assert reloads == []
+            assert catalog._loaded_at > loaded_at
+            assert catalog.resolve("Benchmark Set 1") == 'b01'
+            assert server.stats['/sets'] == 2
+        finally:
+            await client.close()
+            await server.stop()
+
+    asyncio.run(scenario())
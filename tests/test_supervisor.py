@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from benchmarks.fake_telegram import make_update
+from supervisor import HashRing, Supervisor, raw_chat_id
+
+
+class FakeProcess:
+    def __init__(self, target=None, args=(), name=None, daemon=None) -> None:
+        self.alive = False
+        self.exitcode = None
+
+    def start(self) -> None:
+        self.alive = True
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def crash(self) -> None:
+        self.alive = False
+        self.exitcode = 1
+
+
+class FakeQueue(list):
+    def put(self, item) -> None:
+        self.append(item)
+
+    def cancel_join_thread(self) -> None:
+        pass
+
+
+class FakeContext:
+    Process = FakeProcess
+    Queue = FakeQueue
+
+
+@pytest.fixture
+def supervisor():
+    supervisor = Supervisor(1, 'secret', max_deliveries=3, restart_base=1.0, restart_max=4.0)
+    supervisor.context = FakeContext()
+    supervisor.start_worker(0)
+    return supervisor
+
+
+def crash_and_restart(supervisor, now: float) -> None:
+    supervisor.processes[0].crash()
+    supervisor.check_workers(now)
+    supervisor.check_workers(supervisor.restart_at[0])
+
+
+def test_poison_update_is_quarantined_after_max_deliveries(supervisor):
+    poison = make_update("/low card 1 Poison", 1)
+    asyncio.run(supervisor.route(poison))
+    for now in (0.0, 10.0):
+        crash_and_restart(supervisor, now)
+        assert supervisor.inboxes[0] == [(0, poison)]
+    assert supervisor.deliveries[0][0] == 3
+
+    crash_and_restart(supervisor, 20.0)
+    assert supervisor.inboxes[0] == []
+    assert list(supervisor.quarantine) == [poison]
+    assert not supervisor.unacked[0]
+    assert supervisor.stats['quarantined'] == 1
+    assert supervisor.stats['redelivered'] == 2
+
+
+def test_restarts_back_off_and_reset_after_ack(supervisor):
+    delays = []
+    for _ in range(4):
+        supervisor.processes[0].crash()
+        supervisor.check_workers(100.0)
+        delays.append(supervisor.restart_at[0] - 100.0)
+        # До окончания паузы процесс не перезапускается, а новые обновления ждут
+        asyncio.run(supervisor.route(make_update("/start", 2)))
+        assert not supervisor.processes[0].is_alive()
+        supervisor.check_workers(supervisor.restart_at[0])
+        assert supervisor.processes[0].is_alive()
+        assert supervisor.inboxes[0][-1][1]['message']['chat']['id'] == 2
+    assert delays == [1.0, 2.0, 4.0, 4.0]
+
+    for seq in list(supervisor.unacked[0]):
+        supervisor._ack(0, seq)
+    supervisor.processes[0].crash()
+    supervisor.check_workers(200.0)
+    assert supervisor.restart_at[0] == 201.0
+
+
+def test_raw_chat_id_and_ring():
+    update = make_update("/start", 77)
+    assert raw_chat_id(update) == 77
+    ring = HashRing(4)
+    assert ring.node_for(77) == ring.node_for(77)
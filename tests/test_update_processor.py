@@ -0,0 +1,130 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+from typing import Optional
+from telegram import Update
+import handlers.inline as inline
+from api.cache import ResultCache
+from benchmarks.fake_telegram import make_update
+from utils.update_processor import SUPERSEDED_TEXT, USER_BUSY_TEXT, CommandUpdateProcessor
+
+_query_ids = itertools.count(1)
+
+
+def command(text: str, chat_id: int, user_id: Optional[int] = None) -> Update:
+    data = make_update(text, chat_id)
+    if user_id is not None:
+        # Сообщение участника группового чата
+        data['message']['chat'] = {'id': chat_id, 'type': 'group', 'title': 'Test group'}
+        data['message']['from'] = {'id': user_id, 'is_bot': False, 'first_name': 'Test'}
+    return Update.de_json(data, None)
+
+
+def inline_query(text: str, user_id: int) -> Update:
+    query_id = next(_query_ids)
+    return Update.de_json({'update_id': 900000 + query_id, 'inline_query': {
+        'id': str(query_id), 'query': text, 'offset': '',
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'Test'},
+    }}, None)
+
+
+def test_inline_query_does_not_wait_for_private_chat_commands():
+    async def scenario():
+        processor = CommandUpdateProcessor(10, 10, per_chat_in_flight=1)
+        release = asyncio.Event()
+        answered = asyncio.Event()
+
+        async def slow_command():
+            await release.wait()
+
+        async def inline_answer():
+            answered.set()
+
+        running = asyncio.create_task(processor.do_process_update(command("/low card 3 Bolt", 7), slow_command()))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(processor.do_process_update(inline_query("bolt", 7), inline_answer()), 1.0)
+        assert answered.is_set() and not running.done()
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+
+
+def test_inline_placeholder_sends_only_card_name(monkeypatch):
+    async def ensure_loaded():
+        pass
+
+    monkeypatch.setattr(inline, 'card_names', SimpleNamespace(ensure_loaded=ensure_loaded,
+                                                              search=lambda text, limit: ["Lightning Bolt"]))
+    monkeypatch.setattr(inline, 'result_cache', ResultCache(persistent=False))
+    monkeypatch.setattr(inline, 'price_prefetcher', SimpleNamespace(add=lambda names: None))
+    answers = []
+
+    async def answer(results, cache_time=None):
+        answers.append(results)
+
+    update = SimpleNamespace(inline_query=SimpleNamespace(query="bolt", answer=answer))
+    asyncio.run(inline.inline_search(update, None))
+    [result] = answers[0]
+    assert result.title == "Lightning Bolt"
+    assert result.input_message_content.message_text == "Lightning Bolt"
+
+
+def blocking_processor(**options):
+    processor = CommandUpdateProcessor(10, 10, **options)
+    rejected = []
+
+    async def reject(update, text):
+        rejected.append((update.effective_user.id, text))
+
+    processor._reject = reject
+    return processor, rejected
+
+
+def test_group_chat_users_do_not_cancel_each_other():
+    async def scenario():
+        processor, rejected = blocking_processor(per_chat_in_flight=1, supersede_commands=['low', 'high'])
+        release = asyncio.Event()
+        finished = []
+
+        async def handler(name):
+            await release.wait()
+            finished.append(name)
+
+        tasks = []
+        for text, user, name in [("/low card 1 Bolt", 1, 'first'), ("/low card 1 Bolt", 2, 'other user'),
+                                 ("/high card 1 Bolt", 1, 'other command'), ("/low card 2 Bolt", 1, 'replacement')]:
+            tasks.append(asyncio.create_task(processor.do_process_update(command(text, -100, user), handler(name))))
+            for _ in range(3):
+                await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return finished, rejected, processor.stats
+
+    finished, rejected, stats = asyncio.run(scenario())
+    # Команды разных участников выполняются параллельно, а новая /low отменяет только /low того же участника
+    assert sorted(finished) == ['other command', 'other user', 'replacement']
+    assert rejected == [(1, SUPERSEDED_TEXT)]
+    assert stats['superseded'] == 1
+
+
+def test_queue_limit_is_per_user():
+    async def scenario():
+        processor, rejected = blocking_processor(per_chat_in_flight=1, per_chat_queued=1)
+        release = asyncio.Event()
+
+        async def handler():
+            await release.wait()
+
+        tasks = [asyncio.create_task(processor.do_process_update(command("/start", -100, user), handler()))
+                 for user in (1, 1, 1, 2, 2)]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected, processor.stats
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected == [(1, USER_BUSY_TEXT)]
+    assert stats['rejected_chat'] == 1
+    assert stats['admitted'] == 4
@@ -0,0 +1,42 @@
+import asyncio
+import api.scryfall as scryfall
+from api.cache import ResultCache
+from api.scryfall import ScryfallClient
+from api.sets import SetCatalog
+from api.warming import CacheWarmer, WarmQuery
+from benchmarks.fake_scryfall import FakeScryfall, generate_cards
+
+
+def test_budget_counts_only_warming_requests_and_limits_pages(monkeypatch):
+    queries = [WarmQuery(None, 'set', 0, f"Benchmark Set {index}", 0.0, 1000.0, 10 - index) for index in (1, 2)]
+
+    async def scenario():
+        server = FakeScryfall(generate_cards(sets=2, cards_per_set=60, seed=1), page_size=10)
+        await server.start()
+        client = ScryfallClient(base_url=server.url, hedge=False)
+        catalog = SetCatalog(client)
+        cache = ResultCache(persistent=False)
+        monkeypatch.setattr(scryfall, 'client', client)
+        monkeypatch.setattr(scryfall, 'set_catalog', catalog)
+        monkeypatch.setattr(scryfall, 'result_cache', cache)
+        warmer = CacheWarmer(cache, client.scheduler, budget=8)
+
+        async def popular():
+            return queries
+
+        warmer.popular = popular
+        try:
+            await catalog.refresh()
+            # Чужие фоновые запросы не расходуют лимит прогрева
+            client.scheduler.stats['background'] += 100
+            refreshed = await warmer.run()
+            return refreshed, server.stats['/cards/search'], [await cache.get(query.key, 0) for query in queries]
+        finally:
+            await client.close()
+            await server.stop()
+
+    refreshed, requests, cached = asyncio.run(scenario())
+    # Набор 1 - 6 страниц; для набора 2 остаётся 2 запроса из 8, поэтому он не попадает в кэш
+    assert requests == 8
+    assert refreshed == 1
+    assert cached[0] is not None and cached[1] is None
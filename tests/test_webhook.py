@@ -0,0 +1,83 @@
+import asyncio
+import json
+import socket
+import httpx
+import pytest
+import loader
+from api.names import CardNameIndex
+from api.scryfall import ScryfallClient
+from api.sets import SetCatalog
+from benchmarks.fake_scryfall import FakeScryfall, generate_cards
+from benchmarks.fake_telegram import FakeTelegramRequest
+from webhook import SECRET_HEADER, serve_webhook, webhook_secret
+
+SECRET = 'test-secret'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def update(fixture_path):
+    with open(fixture_path('update_start.json'), encoding='utf-8') as file:
+        return json.load(file)
+
+
+def test_webhook_processes_update_and_rejects_wrong_secret(monkeypatch, update):
+    async def scenario():
+        scryfall_server = FakeScryfall(generate_cards(sets=1, cards_per_set=5))
+        await scryfall_server.start()
+        client = ScryfallClient(base_url=scryfall_server.url)
+        monkeypatch.setattr(loader, 'client', client)
+        monkeypatch.setattr(loader, 'set_catalog', SetCatalog(client))
+        monkeypatch.setattr(loader, 'card_names', CardNameIndex(client))
+
+        telegram = FakeTelegramRequest()
+        application = loader.build_application(with_updater=False, with_retention=False, token='123:TEST',
+                                               request=telegram)
+        port = free_port()
+        stop_event = asyncio.Event()
+        serving = asyncio.create_task(serve_webhook(application, '127.0.0.1', port, 'telegram', SECRET,
+                                                    stop_event=stop_event))
+        url = f"http://127.0.0.1:{port}/telegram"
+        chat_id = update['message']['chat']['id']
+        try:
+            async with httpx.AsyncClient() as http:
+                for _ in range(200):
+                    try:
+                        wrong = await http.post(url, json=update, headers={SECRET_HEADER: 'wrong'})
+                        break
+                    except httpx.ConnectError:
+                        await asyncio.sleep(0.02)
+                else:
+                    raise AssertionError("webhook server did not start")
+                assert wrong.status_code == 403
+                assert (await http.post(url, json=update)).status_code == 403
+                assert (await http.post(url, content=b'not json', headers={SECRET_HEADER: SECRET})).status_code == 400
+
+                response = await http.post(url, json=update, headers={SECRET_HEADER: SECRET})
+                assert response.status_code == 200
+            for _ in range(200):
+                if chat_id in telegram.replies:
+                    break
+                await asyncio.sleep(0.02)
+            assert len(telegram.replies[chat_id]) == 1
+            assert telegram.replies[chat_id][0][1].startswith("Привет!")
+            # Инициализация обращается к Bot API только через подменённый транспорт
+            assert telegram.calls['getMe'] == 1
+        finally:
+            stop_event.set()
+            await serving
+            await scryfall_server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_webhook_secret():
+    assert webhook_secret('configured', None) == 'configured'
+    assert len(webhook_secret(None, 'https://example.com')) >= 32
+    with pytest.raises(ValueError):
+        webhook_secret(None, None)
@@ -0,0 +1,125 @@
+from typing import List, Sequence
+
+# Максимальная длина текста одного сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+# Символы разметки Markdown, которые должны быть парными внутри одного сообщения
+MARKDOWN_MARKERS = ('*', '_', '`', '~', '|')
+
+
+def safe_cuts(text: str, limit: int) -> List[bool]:
+    """
+    Для каждой позиции от 0 до limit определить, не разрывает ли разрез
+    в ней сущность Markdown. Текст просматривается один раз, состояние
+    разметки обновляется по мере движения вправо.
+
+    :param text: Текст
+    :param limit: Последняя проверяемая позиция
+    :return: Список длины limit + 1: True, если все сущности слева от позиции закрыты
+    """
+    safe = [True] * (limit + 1)
+    odd_markers = set()
+    brackets = 0
+    in_link_url = False
+    escaped = False
+    for index in range(min(limit, len(text))):
+        char = text[index]
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_link_url:
+            if char == ')':
+                in_link_url = False
+        elif char in MARKDOWN_MARKERS:
+            odd_markers ^= {char}
+        elif char == '[':
+            brackets += 1
+        elif char == ']' and brackets:
+            brackets -= 1
+            if text[index + 1:index + 2] == '(':
+                in_link_url = True
+        # Разрез после '\\' или между ']' и '(' ссылки тоже разрывает сущность
+        position = index + 1
+        safe[position] = not (escaped or brackets or in_link_url or odd_markers
+                              or char == ']' and text[position:position + 1] == '(')
+    return safe
+
+
+def is_safe_cut(text: str, position: int) -> bool:
+    """
+    Проверить, что разрез текста в этой позиции не разрывает сущность Markdown.
+
+    :param text: Текст
+    :param position: Позиция разреза
+    :return: True, если все сущности слева от позиции закрыты
+    """
+    position = min(position, len(text))
+    return safe_cuts(text, position)[position]
+
+
+def cut_position(text: str, limit: int) -> int:
+    """
+    Найти место разреза слишком длинной строки: по пробелу, не разрывая
+    сущности Markdown, а если так нельзя - просто по границе сущностей.
+
+    :param text: Строка длиннее limit
+    :param limit: Максимальная длина части
+    :return: Позиция разреза от 1 до limit
+    """
+    safe = safe_cuts(text, limit)
+    for position in range(limit, 0, -1):
+        if text[position - 1] == ' ' and safe[position]:
+            return position
+    for position in range(limit, 0, -1):
+        if safe[position]:
+            return position
+    return limit
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT,
+                  separators: Sequence[str] = ('\n\n', '\n')) -> List[str]:
+    """
+    Разбить текст на сообщения не длиннее limit символов.
+
+    Текст режется в первую очередь между блоками (пустая строка), затем
+    между строками и только затем внутри строки, не разрывая сущности Markdown.
+
+    :param text: Текст
+    :param limit: Максимальная длина сообщения
+    :param separators: Разделители в порядке предпочтения
+    :return: Список частей текста
+    """
+    if len(text) <= limit:
+        return [text] if text.strip() else []
+
+    if not separators:
+        chunks = []
+        while len(text) > limit:
+            position = cut_position(text, limit)
+            chunks.append(text[:position].rstrip())
+            text = text[position:].lstrip()
+        if text:
+            chunks.append(text)
+        return chunks
+
+    separator = separators[0]
+    chunks: List[str] = []
+    current = ''
+    for part in text.split(separator):
+        candidate = current + separator + part if current else part
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+            current = ''
+        if len(part) <= limit:
+            current = part
+        else:
+            parts = split_message(part, limit, separators[1:])
+            chunks.extend(parts[:-1])
+            current = parts[-1] if parts else ''
+    if current:
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
@@ -0,0 +1,276 @@
+import re
+import string
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from api.card import Card
+from config import RENDER_CACHE_SIZE
+from utils.metrics import CACHE_REQUESTS
+from utils.price_index import PriceSummary
+
+# Символы, которые в MarkdownV2 нужно экранировать вне сущностей
+MARKDOWN_V2_SPECIAL = re.compile(r'([_*\[\]()~`>#+\-=|{}.!\\])')
+
+PARSE_MODE = 'MarkdownV2'
+
+
+def escape_markdown(text: str) -> str:
+    """
+    Экранировать текст для MarkdownV2.
+
+    :param text: Произвольный текст
+    :return: Текст, который Telegram покажет без изменений
+    """
+    return MARKDOWN_V2_SPECIAL.sub(r'\\\1', text)
+
+
+class Template:
+    """
+    Шаблон сообщения, разобранный один раз при создании.
+
+    Текст шаблона уже записан в MarkdownV2; подставляемые значения
+    экранируются при отрисовке, а результат собирается одним join.
+    """
+
+    def __init__(self, name: str, source: str) -> None:
+        """
+        :param name: Имя шаблона (входит в ключ кэша отрисовки)
+        :param source: Текст шаблона с полями {имя}
+        """
+        self.name = name
+        self.parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in string.Formatter().parse(source)
+        ]
+        self.fields = tuple(field for _, field in self.parts if field)
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        :param values: Значения полей (неэкранированные)
+        :return: Текст в MarkdownV2
+        """
+        pieces = []
+        for literal, field in self.parts:
+            pieces.append(literal)
+            if field:
+                pieces.append(escape_markdown(values[field]))
+        return ''.join(pieces)
+
+
+TEMPLATES: Dict[str, Template] = {
+    'card': Template('card', (
+        "*Имя:* {name}\n"
+        "*Набор:* {set_name}\n"
+        "*Тип:* {type_line}\n"
+        "*Версия:* {version}\n"
+        "*Цена:* {price}\n"
+        "*Изображение:* {image}"
+    )),
+    'caption': Template('caption', "*{name}*\n{set_name}, {price}"),
+    'price_line': Template('price_line', "{quantity} × {name} \\({set_name}\\) — {price}"),
+    'price_missing': Template('price_missing', "{quantity} × {name} — нет цены"),
+    'price_total': Template('price_total', "*Итого:* {total} за {count} карт"),
+    'stats_header': Template('stats_header', "*{set_name}* \\({set_code}\\)"),
+    'stats_cards': Template('stats_cards', "*Карт:* {cards}, с ценой {priced}, без цены {unpriced}"),
+    'stats_total': Template('stats_total', "*Итого:* {total}, фойл {foil_total} \\({foil_priced} карт\\)"),
+    'stats_average': Template('stats_average', "*Средняя цена:* {mean}, *медиана:* {median}"),
+    'stats_percentiles': Template('stats_percentiles', "*Перцентили:* {percentiles}"),
+    'stats_rarity': Template('stats_rarity', "{rarity}: {cards} карт, {total}, фойл {foil_total}"),
+    'stats_top': Template('stats_top', "{name} — {price}"),
+}
+
+RARITY_NAMES = {
+    'mythic': 'Мифические',
+    'rare': 'Редкие',
+    'uncommon': 'Необычные',
+    'common': 'Обычные',
+    'special': 'Особые',
+    'bonus': 'Бонусные',
+}
+
+
+def price_text(value: Optional[float], currency: str = 'usd') -> str:
+    """
+    :param value: Цена или None
+    :param currency: Валюта (usd, usd_foil, eur, tix)
+    :return: Цена со знаком валюты: $1.50, €1.20, 0.05 tix
+    """
+    if value is None:
+        return "нет данных"
+    if currency == 'eur':
+        return f"€{value:.2f}"
+    if currency == 'tix':
+        return f"{value:.2f} tix"
+    return f"${value:.2f}"
+
+
+def card_values(card: Card, currency: str = 'usd') -> Dict[str, str]:
+    """
+    Подготовить значения полей шаблона для карты.
+
+    :param card: Карта
+    :param currency: Валюта цены (usd, eur, tix)
+    :return: Словарь значений полей
+    """
+    return {
+        'name': card.name,
+        'set_name': card.set_name,
+        'type_line': card.type_line,
+        'version': ', '.join(card.frame_effects) or 'Обычная',
+        'price': price_text(card.prices.get(currency), currency),
+        'image': card.image_url or "Изображение недоступно",
+    }
+
+
+def stale_notice(saved_at: float) -> str:
+    """
+    :param saved_at: Когда результат был получен от Scryfall (time.time())
+    :return: Предупреждение об устаревшем результате в MarkdownV2
+    """
+    saved = datetime.fromtimestamp(saved_at).strftime('%d.%m.%Y %H:%M')
+    return "⚠️ _" + escape_markdown(f"Scryfall недоступен, показан сохранённый результат от {saved}; "
+                                    f"цены могут быть неактуальны.") + "_"
+
+
+def render_price_list(deck: List[Tuple[int, str]], cards: Dict[str, Card], not_found: List[str]) -> str:
+    """
+    Отрисовать цены декклиста: строка на карту, итог и ненайденные карты.
+
+    :param deck: Список (количество, имя) из декклиста
+    :param cards: Найденные карты по нормализованному имени (см. api.scryfall.name_key)
+    :param not_found: Ненайденные имена
+    :return: Текст в MarkdownV2
+    """
+    lines = []
+    total = 0.0
+    count = 0
+    unpriced = 0
+    for quantity, name in deck:
+        card = cards.get(' '.join(name.lower().split()))
+        if card is None:
+            continue
+        count += quantity
+        if card.prices.usd is None:
+            unpriced += quantity
+            lines.append(TEMPLATES['price_missing'].render({'quantity': str(quantity), 'name': card.name}))
+            continue
+        subtotal = card.prices.usd * quantity
+        total += subtotal
+        price = f"${card.prices.usd:.2f}" if quantity == 1 else f"${subtotal:.2f} (${card.prices.usd:.2f} за шт.)"
+        lines.append(TEMPLATES['price_line'].render({'quantity': str(quantity), 'name': card.name,
+                                                     'set_name': card.set_name, 'price': price}))
+    lines.append('')
+    lines.append(TEMPLATES['price_total'].render({'total': f"${total:.2f}", 'count': str(count)}))
+    if unpriced:
+        lines.append(escape_markdown(f"Без цены в USD: {unpriced} карт"))
+    missing = set(not_found)
+    names = [name for _, name in deck if ' '.join(name.lower().split()) in missing]
+    if names:
+        lines.append(escape_markdown("Не найдены: " + ", ".join(names)))
+    return '\n'.join(lines)
+
+
+def render_set_summary(set_name: str, set_code: str, summary: PriceSummary) -> str:
+    """
+    Отрисовать сводку цен набора для /stats.
+
+    :param set_name: Имя набора
+    :param set_code: Код набора
+    :param summary: Сводка цен (см. utils.price_index.PriceIndex.summary)
+    :return: Текст в MarkdownV2
+    """
+    def usd(value: Optional[float]) -> str:
+        return f"${value:.2f}" if value is not None else "нет данных"
+
+    lines = [
+        TEMPLATES['stats_header'].render({'set_name': set_name, 'set_code': set_code.upper()}),
+        TEMPLATES['stats_cards'].render({'cards': str(summary.cards), 'priced': str(summary.priced),
+                                         'unpriced': str(summary.unpriced)}),
+        TEMPLATES['stats_total'].render({'total': usd(summary.total), 'foil_total': usd(summary.foil_total),
+                                         'foil_priced': str(summary.foil_priced)}),
+    ]
+    if summary.foil_only:
+        lines.append(escape_markdown(f"Только в фойле: {summary.foil_only} карт"))
+    if summary.percentiles:
+        lines.append(TEMPLATES['stats_average'].render({'mean': usd(summary.mean),
+                                                        'median': usd(summary.percentiles.get(50))}))
+        lines.append(TEMPLATES['stats_percentiles'].render({'percentiles': ", ".join(
+            f"{percentile}% — {usd(value)}" for percentile, value in summary.percentiles.items() if percentile != 50)}))
+    if summary.rarities:
+        lines.append('')
+        lines.append("*По редкостям:*")
+        for stats in summary.rarities:
+            lines.append(TEMPLATES['stats_rarity'].render({
+                'rarity': RARITY_NAMES.get(stats.rarity, stats.rarity or 'Без редкости'),
+                'cards': str(stats.cards), 'total': usd(stats.total), 'foil_total': usd(stats.foil_total),
+            }))
+    if summary.top:
+        lines.append('')
+        lines.append("*Самые дорогие:*")
+        for card in summary.top:
+            lines.append(TEMPLATES['stats_top'].render({'name': card.name, 'price': usd(card.prices.usd)}))
+    return '\n'.join(lines)
+
+
+@lru_cache(maxsize=4096)
+def render_card(template: Template, card: Card, currency: str = 'usd') -> str:
+    """
+    Отрисовать одну карту; блоки карт запоминаются, поэтому при потоковом
+    ответе заново отрисовываются только карты новых страниц.
+
+    :param template: Шаблон
+    :param card: Карта
+    :param currency: Валюта цены (usd, eur, tix)
+    :return: Текст в MarkdownV2
+    """
+    return template.render(card_values(card, currency))
+
+
+class CardFormatter:
+    """
+    Отрисовка списков карт с LRU-кэшем готовых ответов.
+
+    Ключ кэша - имя шаблона, id карт и их цены, поэтому популярные ответы
+    для разных пользователей отрисовываются один раз, а изменение цены
+    даёт новый ключ.
+    """
+
+    def __init__(self, max_size: int = 1024) -> None:
+        """
+        :param max_size: Максимальное число готовых ответов в кэше
+        """
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Tuple, str]' = OrderedDict()
+        self.stats: Dict[str, int] = {'hits': 0, 'misses': 0}
+
+    def render(self, cards: List[Card], template: str = 'card', currency: str = 'usd') -> str:
+        """
+        :param cards: Список карт
+        :param template: Имя шаблона из TEMPLATES
+        :param currency: Валюта цены (usd, eur, tix)
+        :return: Текст в MarkdownV2, карты разделены пустой строкой
+        """
+        key = (template, currency, tuple((card.id, card.prices.get(currency)) for card in cards))
+        text = self._entries.get(key)
+        if text is not None:
+            self.stats['hits'] += 1
+            CACHE_REQUESTS.labels('render', 'hit').inc()
+            self._entries.move_to_end(key)
+            return text
+
+        self.stats['misses'] += 1
+        CACHE_REQUESTS.labels('render', 'miss').inc()
+        compiled = TEMPLATES[template]
+        text = '\n\n'.join([render_card(compiled, card, currency) for card in cards])
+        self._entries[key] = text
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return text
+
+    def clear(self) -> None:
+        self._entries.clear()
+        render_card.cache_clear()
+
+
+# Общий кэш отрисовки на всё время жизни приложения
+card_formatter = CardFormatter(RENDER_CACHE_SIZE)
@@ -1,22 +1,42 @@
-from typing import Optional, Tuple, List, Dict
+import re
+from typing import Dict, Optional, Tuple, List
+from api.card import Card
+from api.cache import StaleCards
+from utils.formatting import card_formatter, render_set_summary, stale_notice
+from utils.metrics import stage
+from utils.price_index import PriceIndex
 
-def format_data(cards: List[Dict]) -> str:
+def format_data(cards: List[Card], currency: str = 'usd') -> str:
     """
-    Форматировать данные карт для отображения.
+    Форматировать данные карт для отображения (MarkdownV2, см. utils.formatting).
+    Перед устаревшим результатом из кэша выводится предупреждение.
 
-    :param cards: Список данных карт
+    :param cards: Список карт
+    :param currency: Валюта цены (usd, eur, tix)
     :return: Отформатированная строка данных
     """
-    formatted_data = ""
-    for card in cards:
-        name = card['name']
-        set_name = card['set_name']
-        card_type = card['type_line']
-        version = card.get('frame_effects', 'Обычная')
-        price = card['prices']['usd']
-        image_url = card['image_uris']['normal'] if 'image_uris' in card else "Изображение недоступно"
-        formatted_data += f"Имя: {name}\nНабор: {set_name}\nТип: {card_type}\nВерсия: {version}\nЦена: ${price}\nИзображение: {image_url}\n\n"
-    return formatted_data
+    with stage('format'):
+        text = card_formatter.render(cards, currency=currency)
+    if isinstance(cards, StaleCards):
+        text = stale_notice(cards.saved_at) + "\n\n" + text
+    return text
+
+def format_set_summary(index: PriceIndex) -> str:
+    """
+    Посчитать и отформатировать сводку цен набора (MarkdownV2, см. utils.formatting).
+    Перед сводкой по устаревшим картам из кэша выводится предупреждение.
+
+    :param index: Индекс цен карт набора
+    :return: Отформатированная строка сводки
+    """
+    with stage('stats'):
+        summary = index.summary()
+    first = index.cards[0]
+    with stage('format'):
+        text = render_set_summary(first.set_name, first.set, summary)
+    if isinstance(index.cards, StaleCards):
+        text = stale_notice(index.cards.saved_at) + "\n\n" + text
+    return text
 
 def parse_command(command: str) -> Tuple[Optional[str], Optional[str], Optional[int], Optional[str]]:
     """
@@ -69,3 +89,48 @@ def parse_custom_command(command: str) -> Tuple[Optional[str], Optional[float],
         return None, None, None, None
 
     return filter_choice, low_price, high_price, name
+
+def parse_stats_command(command: str) -> Optional[str]:
+    """
+    Разобрать команду сводки цен набора: /stats set имя.
+
+    :param command: Текст команды
+    :return: Имя набора или None, если формат неверный
+    """
+    parts = command.split()
+    if len(parts) < 3 or parts[1] != "set":
+        return None
+    return ' '.join(parts[2:])
+
+# Строка декклиста: «4 Lightning Bolt», «4x Lightning Bolt (M10) 146», «SB: 2 Duress» или просто имя
+DECKLIST_LINE = re.compile(r'^(?:SB:\s*)?(?:(\d+)\s*[xх]?\s+)?(.+?)(?:\s+\([A-Za-z0-9]{2,6}\)(?:\s+\S+)?)?(?:\s+\*[A-Z]+\*)?$')
+# Заголовки разделов в списках, экспортированных из Arena, Moxfield и других сервисов
+DECKLIST_SECTIONS = {'deck', 'sideboard', 'commander', 'companion', 'maybeboard', 'main', 'mainboard'}
+
+def parse_decklist(text: str, max_cards: int = 250) -> List[Tuple[int, str]]:
+    """
+    Разобрать декклист: по одной карте в строке, количество необязательно.
+
+    :param text: Текст списка
+    :param max_cards: Сколько разных карт принимать
+    :return: Список (количество, имя) без повторов имён, в порядке первого появления
+    """
+    quantities: Dict[str, int] = {}
+    names: Dict[str, str] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith(('//', '#')) or line.rstrip(':').lower() in DECKLIST_SECTIONS:
+            continue
+        match = DECKLIST_LINE.match(line)
+        if match is None:
+            continue
+        quantity = int(match.group(1)) if match.group(1) else 1
+        name = ' '.join(match.group(2).split())
+        key = name.lower()
+        if key not in quantities:
+            if len(quantities) >= max_cards:
+                continue
+            names[key] = name
+            quantities[key] = 0
+        quantities[key] += quantity
+    return [(quantities[key], names[key]) for key in quantities]
@@ -0,0 +1,183 @@
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Границы корзин гистограмм задержек в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    'bot_stage_seconds', "Длительность этапов обработки команды",
+    ['stage'], buckets=LATENCY_BUCKETS,
+)
+COMMAND_SECONDS = Histogram(
+    'bot_command_seconds', "Полное время обработки команды",
+    ['command'], buckets=LATENCY_BUCKETS,
+)
+COMMANDS_TOTAL = Counter(
+    'bot_commands_total', "Обработанные команды по результату",
+    ['command', 'outcome'],
+)
+COMMANDS_IN_FLIGHT = Gauge(
+    'bot_commands_in_flight', "Команды, обрабатываемые в данный момент",
+)
+COMMANDS_SUPERSEDED = Counter(
+    'bot_commands_superseded_total', "Команды, отменённые более новой командой того же чата",
+)
+UPDATES_QUEUED = Gauge(
+    'bot_updates_queued', "Обновления, ожидающие выполнения",
+)
+UPDATES_REJECTED = Counter(
+    'bot_updates_rejected_total', "Обновления, отклонённые из-за перегрузки",
+    ['scope'],
+)
+CACHE_REQUESTS = Counter(
+    'bot_cache_requests_total', "Обращения к кэшам по результату",
+    ['cache', 'result'],
+)
+SCRYFALL_RESPONSES = Counter(
+    'scryfall_responses_total', "Ответы Scryfall по коду",
+    ['endpoint', 'status'],
+)
+SCRYFALL_SECONDS = Histogram(
+    'scryfall_request_seconds', "Длительность HTTP-запросов к Scryfall",
+    ['endpoint'], buckets=LATENCY_BUCKETS,
+)
+SCRYFALL_RETRIED = Counter(
+    'scryfall_retries_total', "Повторные запросы к Scryfall по причине",
+    ['endpoint', 'reason'],
+)
+SCRYFALL_HEDGES = Counter(
+    'scryfall_hedged_requests_total', "Дублирующие запросы страниц и какой из запросов ответил первым",
+    ['endpoint', 'winner'],
+)
+CIRCUIT_STATE = Gauge(
+    'scryfall_circuit_state', "Состояние предохранителя Scryfall: 0 - замкнут, 0.5 - пробный запрос, 1 - разомкнут",
+)
+CARDS_FETCHED = Histogram(
+    'scryfall_cards_per_query', "Сколько карт получено от Scryfall на один запрос",
+    buckets=(1, 5, 10, 25, 50, 100, 175, 350, 700, 1500, 3000),
+)
+
+# Профилировщик медленных команд (см. utils.profiler и enable_profiler)
+slow_command_profiler = None
+
+
+def endpoint_label(url: str) -> str:
+    """
+    Свести адрес запроса к небольшому набору значений метки.
+
+    :param url: Путь или полный адрес
+    :return: Например, /cards/search, /sets или /bulk-data
+    """
+    parts = [part for part in urlsplit(url).path.split('/') if part]
+    if not parts:
+        return '/'
+    if parts[0] == 'cards' and len(parts) > 1 and parts[1] in ('search', 'named', 'collection', 'autocomplete'):
+        return f"/cards/{parts[1]}"
+    return '/' + parts[0]
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Замерить этап обработки команды: with stage('format'): ...
+
+    :param name: Название этапа
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+# Результат выполняемой команды; обработчик может отметить ошибку, которую сам показал пользователю
+_command_outcome: ContextVar[Optional[Dict[str, str]]] = ContextVar('command_outcome', default=None)
+
+
+def record_error() -> None:
+    """
+    Отметить текущую команду (см. instrumented) как завершившуюся ошибкой.
+    Вызывается обработчиком, который перехватил исключение и ответил
+    пользователю сообщением об ошибке, не пробрасывая исключение дальше.
+    """
+    outcome = _command_outcome.get()
+    if outcome is not None:
+        outcome['value'] = 'error'
+
+
+def instrumented(command: str) -> Callable:
+    """
+    Декоратор обработчика команды: полное время, число команд в работе,
+    результат выполнения и профиль медленных команд. Ошибка, перехваченная
+    самим обработчиком, учитывается, если он вызвал record_error.
+
+    :param command: Название команды для метрик
+    :return: Декоратор
+    """
+    def decorator(handler: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs) -> Any:
+            COMMANDS_IN_FLIGHT.inc()
+            profile = slow_command_profiler.begin() if slow_command_profiler is not None else None
+            started = time.perf_counter()
+            outcome = {'value': 'ok'}
+            token = _command_outcome.set(outcome)
+            try:
+                return await handler(*args, **kwargs)
+            except asyncio.CancelledError:
+                outcome['value'] = 'cancelled'
+                raise
+            except BaseException:
+                outcome['value'] = 'error'
+                raise
+            finally:
+                _command_outcome.reset(token)
+                elapsed = time.perf_counter() - started
+                COMMANDS_IN_FLIGHT.dec()
+                COMMAND_SECONDS.labels(command).observe(elapsed)
+                COMMANDS_TOTAL.labels(command, outcome['value']).inc()
+                if profile is not None:
+                    slow_command_profiler.end(profile, command, elapsed)
+        return wrapper
+    return decorator
+
+
+def enable_profiler(profiler) -> None:
+    """
+    Включить профилирование медленных команд.
+
+    :param profiler: Экземпляр utils.profiler.SlowCommandProfiler
+    """
+    global slow_command_profiler
+    slow_command_profiler = profiler
+    profiler.start()
+
+
+def disable_profiler() -> None:
+    """
+    Остановить профилирование медленных команд, если оно было включено.
+    """
+    global slow_command_profiler
+    if slow_command_profiler is not None:
+        slow_command_profiler.stop()
+        slow_command_profiler = None
+
+
+def start_metrics_server(port: int, listen: str = '127.0.0.1') -> Optional[int]:
+    """
+    Запустить HTTP-сервер метрик в формате Prometheus (путь /metrics).
+
+    :param port: Порт (0 - не запускать)
+    :param listen: Адрес сервера
+    :return: Порт сервера или None, если сервер не запущен
+    """
+    if not port:
+        return None
+    start_http_server(port, addr=listen)
+    return port
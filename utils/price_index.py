@@ -0,0 +1,245 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Dict, Tuple
+import numpy as np
+from api.card import Card
+
+CURRENCIES = ('usd', 'usd_foil', 'eur', 'tix')
+
+# Перцентили цены в сводке и сколько самых дорогих карт в неё попадает
+PERCENTILES = (25, 50, 75, 90)
+SUMMARY_TOP = 3
+
+# Порядок редкостей в сводке; остальные идут после них по алфавиту
+RARITY_ORDER = ('mythic', 'rare', 'uncommon', 'common', 'special', 'bonus')
+
+
+class RarityStats(NamedTuple):
+    """
+    Сводка цен карт одной редкости (в USD).
+    """
+    rarity: str
+    cards: int
+    priced: int
+    total: float
+    foil_total: float
+
+
+class PriceSummary(NamedTuple):
+    """
+    Сводка цен группы карт в USD.
+
+    priced - карты с обычной ценой, по ним считаются total, mean и
+    percentiles ({25: ..., 50: ...}); foil_* - то же по фойл-ценам;
+    foil_only - карты только с фойл-ценой; unpriced - карты без обеих цен;
+    top - самые дорогие карты по обычной цене.
+    """
+    cards: int
+    priced: int
+    unpriced: int
+    total: float
+    mean: Optional[float]
+    percentiles: Dict[int, float]
+    foil_priced: int
+    foil_total: float
+    foil_only: int
+    rarities: List[RarityStats]
+    top: List[Card]
+
+
+class PriceIndex:
+    """
+    Колоночный индекс цен группы карт (набора или всех печатей карты).
+
+    Цены хранятся в массивах float64 по валютам (NaN - цены нет),
+    параллельно с массивами id, поэтому фильтр по диапазону выполняется
+    векторной маской, а выбор первых k карт - частичной сортировкой.
+    """
+
+    def __init__(self, cards: List[Card]) -> None:
+        """
+        :param cards: Список карт
+        """
+        self.cards = cards
+        self.ids = np.array([card.id for card in cards], dtype=object)
+        self.oracle_ids = np.array([card.oracle_id for card in cards], dtype=object)
+        self.rarities = np.array([card.rarity for card in cards], dtype=object)
+        self.prices: Dict[str, np.ndarray] = {}
+        for currency in CURRENCIES:
+            values = (card.prices.get(currency) for card in cards)
+            self.prices[currency] = np.fromiter((np.nan if value is None else value for value in values),
+                                                dtype=np.float64, count=len(cards))
+        self._summary: Optional[PriceSummary] = None
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def filter(self, low_price: Optional[float] = None, high_price: Optional[float] = None,
+               currency: str = 'usd') -> np.ndarray:
+        """
+        Найти карты с ценой в диапазоне (границы включаются).
+
+        :param low_price: Нижняя граница цены (опционально)
+        :param high_price: Верхняя граница цены (опционально)
+        :param currency: Валюта (usd, usd_foil, eur, tix)
+        :return: Индексы подходящих карт
+        """
+        values = self.prices[currency]
+        mask = ~np.isnan(values)
+        if low_price is not None:
+            mask &= values >= low_price
+        if high_price is not None:
+            mask &= values <= high_price
+        return np.flatnonzero(mask)
+
+    def top_k(self, k: int, descending: bool = False, currency: str = 'usd',
+              indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Выбрать k карт с наименьшей или наибольшей ценой; карты без цены идут последними.
+
+        :param k: Количество карт (0 - все)
+        :param descending: Сортировать по убыванию цены
+        :param currency: Валюта (usd, usd_foil, eur, tix)
+        :param indices: Ограничить выбор этими индексами (например, результатом filter)
+        :return: Индексы карт в порядке сортировки
+        """
+        if indices is None:
+            indices = np.arange(len(self.cards))
+        keys = self.prices[currency][indices]
+        if descending:
+            keys = -keys
+        keys = np.where(np.isnan(keys), np.inf, keys)
+        if k and k < len(keys):
+            candidates = np.argpartition(keys, k - 1)[:k]
+        else:
+            candidates = np.arange(len(keys))
+        order = candidates[np.argsort(keys[candidates], kind='stable')]
+        return indices[order]
+
+    def query(self, data_choice: Optional[str], amount: int, low_price: Optional[float] = None,
+              high_price: Optional[float] = None, currency: str = 'usd') -> List[Card]:
+        """
+        Ответить на запрос /low, /high или /custom по индексу.
+
+        :param data_choice: Порядок данных (low/high или None для /custom)
+        :param amount: Количество карт (0 - все)
+        :param low_price: Нижняя граница цены (опционально)
+        :param high_price: Верхняя граница цены (опционально)
+        :param currency: Валюта (usd, usd_foil, eur, tix)
+        :return: Список карт
+        """
+        indices = None
+        if low_price is not None or high_price is not None:
+            indices = self.filter(low_price, high_price, currency)
+        order = self.top_k(amount, descending=data_choice == "high", currency=currency, indices=indices)
+        return [self.cards[index] for index in order]
+
+    def summary(self) -> PriceSummary:
+        """
+        Посчитать сводку цен группы: итоги, перцентили, карты без цены,
+        фойл и разбивку по редкостям. Всё считается масками и bincount
+        по массивам цен за один проход; сводка запоминается в индексе.
+
+        :return: Сводка цен
+        """
+        if self._summary is not None:
+            return self._summary
+        usd = self.prices['usd']
+        foil = self.prices['usd_foil']
+        priced = ~np.isnan(usd)
+        foil_priced = ~np.isnan(foil)
+        values = usd[priced]
+        percentiles = {}
+        if values.size:
+            percentiles = dict(zip(PERCENTILES, np.percentile(values, PERCENTILES).tolist()))
+
+        rarities, groups = np.unique(self.rarities, return_inverse=True)
+        size = len(rarities)
+        counts = np.bincount(groups, minlength=size)
+        priced_counts = np.bincount(groups, weights=priced, minlength=size)
+        totals = np.bincount(groups, weights=np.where(priced, usd, 0.0), minlength=size)
+        foil_totals = np.bincount(groups, weights=np.where(foil_priced, foil, 0.0), minlength=size)
+        by_rarity = [RarityStats(str(rarity), int(counts[i]), int(priced_counts[i]), float(totals[i]),
+                                 float(foil_totals[i])) for i, rarity in enumerate(rarities)]
+        by_rarity.sort(key=lambda stats: (RARITY_ORDER.index(stats.rarity) if stats.rarity in RARITY_ORDER
+                                          else len(RARITY_ORDER), stats.rarity))
+
+        top = self.top_k(SUMMARY_TOP, descending=True, indices=np.flatnonzero(priced))
+        self._summary = PriceSummary(
+            cards=len(self.cards),
+            priced=int(priced.sum()),
+            unpriced=int((~priced & ~foil_priced).sum()),
+            total=float(values.sum()),
+            mean=float(values.mean()) if values.size else None,
+            percentiles=percentiles,
+            foil_priced=int(foil_priced.sum()),
+            foil_total=float(foil[foil_priced].sum()),
+            foil_only=int((foil_priced & ~priced).sum()),
+            rarities=by_rarity,
+            top=[self.cards[index] for index in top],
+        )
+        return self._summary
+
+
+class PriceIndexCache:
+    """
+    LRU-кэш индексов цен по группам (set:<код>, card:<имя>) с временем жизни.
+
+    Кэшем пользуются потоки asyncio.to_thread, поэтому обращения к нему
+    выполняются под блокировкой. version - версия данных, по которым
+    построены индексы (см. check_version).
+    """
+
+    def __init__(self, max_size: int = 128, ttl: float = 43200.0) -> None:
+        """
+        :param max_size: Максимальное число индексов в памяти
+        :param ttl: Время жизни индекса в секундах
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        self._entries: 'OrderedDict[str, Tuple[float, PriceIndex]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[PriceIndex]:
+        """
+        :param key: Ключ группы
+        :return: Индекс или None, если его нет или он устарел
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, index: PriceIndex, expires_at: Optional[float] = None) -> None:
+        """
+        :param key: Ключ группы
+        :param index: Индекс цен группы
+        :param expires_at: Когда индекс устаревает (time.time(); по умолчанию через ttl)
+        """
+        with self._lock:
+            self._entries[key] = (expires_at if expires_at is not None else time.time() + self.ttl, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def check_version(self, version: Optional[str]) -> None:
+        """
+        Очистить кэш, если данные, по которым построены индексы, сменились.
+
+        :param version: Текущая версия данных
+        """
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,129 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SlowCommandProfiler:
+    """
+    Выборочный профилировщик медленных команд.
+
+    Пока выполняется хотя бы одна команда, фоновый поток каждые interval
+    секунд снимает стек потока событийного цикла. Если команда выполнялась
+    дольше threshold секунд, стеки за время её выполнения сворачиваются
+    в формат folded (совместим с flamegraph.pl и speedscope) и записываются
+    в файл. Все команды выполняются в одном цикле, поэтому в профиль
+    попадает и работа команд, выполнявшихся одновременно с медленной.
+    """
+
+    def __init__(self, threshold: float, interval: float = 0.005, directory: str = 'profiles',
+                 max_samples: int = 50000, top: int = 30) -> None:
+        """
+        :param threshold: Порог медленной команды в секундах
+        :param interval: Интервал между снимками стека в секундах
+        :param directory: Каталог для профилей
+        :param max_samples: Сколько последних снимков хранится
+        :param top: Сколько самых частых стеков записывается в профиль
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory
+        self.top = top
+        self._samples: Deque[Tuple[float, Tuple[str, ...]]] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._target: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Запустить поток выборки. Вызывается из потока событийного цикла.
+        """
+        if self._thread is not None:
+            return
+        self._target = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='slow-command-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    def begin(self) -> float:
+        """
+        Отметить начало команды.
+
+        :return: Время начала для end()
+        """
+        self._active += 1
+        self._wake.set()
+        return time.perf_counter()
+
+    def end(self, started: float, command: str, elapsed: float) -> Optional[str]:
+        """
+        Отметить окончание команды и сохранить профиль, если она была медленной.
+
+        :param started: Значение, которое вернул begin()
+        :param command: Название команды
+        :param elapsed: Длительность команды в секундах
+        :return: Путь к файлу профиля или None
+        """
+        self._active -= 1
+        if not self._active:
+            self._wake.clear()
+        if elapsed < self.threshold:
+            return None
+        stacks = self.hot_stacks(started, time.perf_counter())
+        if not stacks:
+            return None
+        return self._dump(command, elapsed, stacks)
+
+    def hot_stacks(self, started: float, finished: float) -> List[Tuple[Tuple[str, ...], int]]:
+        """
+        :param started: Начало интервала (time.perf_counter)
+        :param finished: Конец интервала (time.perf_counter)
+        :return: Самые частые стеки интервала и число их снимков
+        """
+        with self._lock:
+            samples = [stack for moment, stack in self._samples if started <= moment <= finished]
+        return Counter(samples).most_common(self.top)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            if not self._wake.wait(0.5):
+                continue
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                # Строка указывается только для самого вложенного вызова,
+                # чтобы стеки одной функции не дробились по номерам строк
+                code = frame.f_code
+                stack = [f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"]
+                frame = frame.f_back
+                while frame is not None and len(stack) < 64:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                with self._lock:
+                    self._samples.append((time.perf_counter(), tuple(reversed(stack))))
+            del frame
+            time.sleep(self.interval)
+
+    def _dump(self, command: str, elapsed: float, stacks: List[Tuple[Tuple[str, ...], int]]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"slow-{time.strftime('%Y%m%d-%H%M%S')}-{command}-{elapsed:.2f}s.folded")
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in stacks:
+                file.write(f"{';'.join(stack)} {count}\n")
+        logger.warning("Медленная команда %s: %.2f с, профиль %s", command, elapsed, path)
+        return path
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from telegram import Update
+from telegram.ext import CallbackContext
+
+logger = logging.getLogger(__name__)
+
+
+def pseudonym(value: int, salt: bytes) -> int:
+    """
+    Заменить id пользователя или чата устойчивым псевдонимом.
+
+    :param value: id пользователя или чата
+    :param salt: Соль записи (без неё псевдоним нельзя сопоставить с id)
+    :return: Положительное число до 2^40
+    """
+    digest = hashlib.blake2b(str(value).encode(), key=salt, digest_size=5).digest()
+    return int.from_bytes(digest, 'big') + 1
+
+
+class TrafficRecorder:
+    """
+    Запись входящих команд в JSONL-журнал для последующего воспроизведения
+    (см. benchmarks/replay.py).
+
+    В журнал попадают только текст команды, время от начала записи
+    и псевдонимы пользователя и чата; имена пользователей и id не пишутся.
+    Строки копятся в памяти и дописываются в файл пачками в отдельном потоке.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, flush_size: int = 200) -> None:
+        """
+        :param flush_interval: Максимальная задержка записи в секундах
+        :param flush_size: Сколько строк записывать одной пачкой
+        """
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.path: Optional[str] = None
+        self._salt = b''
+        self._started_at = 0.0
+        self._lines: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def active(self) -> bool:
+        return self.path is not None
+
+    def start(self, path: str, salt: Optional[str] = None) -> None:
+        """
+        Начать запись журнала.
+
+        :param path: Путь к JSONL-файлу (дописывается)
+        :param salt: Соль псевдонимов (по умолчанию случайная на каждый запуск)
+        """
+        self.path = path
+        self._salt = (salt or secrets.token_hex(16)).encode()[:64]
+        self._started_at = time.monotonic()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Остановить запись и дописать накопленные строки.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        self.path = None
+
+    async def capture(self, update: Update, context: CallbackContext) -> None:
+        """
+        Обработчик всех обновлений (группа -1): записать команду, если запись включена.
+        """
+        if not self.active or update.message is None or not update.message.text:
+            return
+        if not update.message.text.startswith('/'):
+            return
+        self.record(update.message.text, update.effective_user.id if update.effective_user else 0,
+                    update.effective_chat.id if update.effective_chat else 0)
+
+    def record(self, text: str, user_id: int, chat_id: int) -> None:
+        """
+        :param text: Текст команды
+        :param user_id: id пользователя
+        :param chat_id: id чата
+        """
+        entry = {
+            't': round(time.monotonic() - self._started_at, 4),
+            'user': pseudonym(user_id, self._salt),
+            'chat': pseudonym(chat_id, self._salt),
+            'text': text,
+        }
+        self._lines.append(json.dumps(entry, ensure_ascii=False))
+        if len(self._lines) >= self.flush_size:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._flush()
+        await self._flush()
+
+    async def _flush(self) -> None:
+        if not self._lines or self.path is None:
+            return
+        lines, self._lines = self._lines, []
+        try:
+            await asyncio.to_thread(self._append, self.path, lines)
+        except OSError as e:
+            logger.warning("Не удалось записать журнал команд: %s", e)
+
+    @staticmethod
+    def _append(path: str, lines: List[str]) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+
+def read_traffic(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Прочитать журнал команд.
+
+    :param path: Путь к JSONL-файлу
+    :return: Итератор записей {'t', 'user', 'chat', 'text'}
+    """
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# Общий журнал команд на всё время жизни приложения
+traffic_recorder = TrafficRecorder()
@@ -0,0 +1,222 @@
+import asyncio
+import contextlib
+import logging
+from typing import Any, Awaitable, Collection, Dict, Hashable, Optional, Set
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import BaseUpdateProcessor
+from utils.metrics import COMMANDS_SUPERSEDED, UPDATES_QUEUED, UPDATES_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# Ограничение семафора BaseUpdateProcessor: допуск обновлений решает сам CommandUpdateProcessor
+UNLIMITED = 2 ** 31 - 1
+
+BUSY_TEXT = "Бот сейчас перегружен, попробуйте ещё раз через минуту."
+USER_BUSY_TEXT = "Слишком много запросов подряд: дождитесь ответа на предыдущие."
+SUPERSEDED_TEXT = "Предыдущий запрос отменён: получена новая команда."
+
+
+def update_chat_id(update: object) -> Optional[int]:
+    """
+    Получить id чата (или пользователя), к которому относится обновление.
+
+    :param update: Обновление Telegram
+    :return: id чата, id пользователя или None
+    """
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+def update_state_key(update: object) -> Optional[Hashable]:
+    """
+    Получить ключ очереди (ChatState), в которой выполняется обновление:
+    пара (чат, пользователь). У inline-запросов нет чата, и у них своя
+    очередь на пользователя: иначе они ждали бы завершения его команд
+    в личном чате с ботом.
+
+    :param update: Обновление Telegram
+    :return: Ключ очереди или None
+    """
+    if isinstance(update, Update) and update.inline_query is not None:
+        return 'inline', update.inline_query.from_user.id
+    chat_id = update_chat_id(update)
+    if chat_id is None:
+        return None
+    # В групповом чате у каждого участника своя очередь: чужие команды не ждут и не отменяются
+    user_id = update.effective_user.id if update.effective_user is not None else None
+    return chat_id, user_id
+
+
+def update_command(update: object) -> Optional[str]:
+    """
+    :param update: Обновление Telegram
+    :return: Команда сообщения без / и @имени бота (low, prices, ...) или None
+    """
+    if not isinstance(update, Update) or update.message is None or not update.message.text:
+        return None
+    if not update.message.text.startswith('/'):
+        return None
+    return update.message.text.split()[0][1:].split('@')[0].lower()
+
+
+class ChatState:
+    """
+    Очередь одного пользователя в чате: ограничение одновременных команд
+    и задачи, которые может отменить более новая команда.
+    """
+
+    def __init__(self, max_in_flight: int) -> None:
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.count = 0
+        self.groups: Dict[str, Set[asyncio.Task]] = {}
+        self.started: Set[asyncio.Task] = set()
+        self.superseded: Set[asyncio.Task] = set()
+
+
+class CommandUpdateProcessor(BaseUpdateProcessor):
+    """
+    Слой выполнения команд для concurrent_updates.
+
+    - одновременно выполняется не больше max_in_flight обновлений, ещё
+      max_queued ждут своей очереди; сверх этого обновление сразу
+      отклоняется с ответом «бот перегружен», и очередь не растёт без предела;
+    - у одного пользователя в чате одновременно выполняется не больше
+      per_chat_in_flight обновлений (при 1 - строго по порядку), и в его
+      очереди может ждать не больше per_chat_queued;
+    - новая команда из supersede_commands отменяет ещё не завершённые
+      такие же команды (с тем же именем) того же пользователя в том же
+      чате, а новый inline-запрос - предыдущий inline-запрос пользователя;
+      inline-запросы идут в отдельной очереди пользователя (см. update_state_key).
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, per_chat_in_flight: int = 1,
+                 per_chat_queued: int = 5, supersede_commands: Collection[str] = ()) -> None:
+        """
+        :param max_in_flight: Сколько обновлений выполняется одновременно
+        :param max_queued: Сколько обновлений может ждать выполнения
+        :param per_chat_in_flight: Сколько обновлений одного пользователя в чате выполняется одновременно
+        :param per_chat_queued: Сколько обновлений одного пользователя в чате может ждать выполнения
+        :param supersede_commands: Команды, которые отменяют предыдущую такую же команду пользователя
+        """
+        super().__init__(UNLIMITED)
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.per_chat_in_flight = per_chat_in_flight
+        self.per_chat_queued = per_chat_queued
+        self.supersede_commands = frozenset(supersede_commands)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._admitted = 0
+        self._chats: Dict[Hashable, ChatState] = {}
+        self.stats: Dict[str, int] = {'admitted': 0, 'rejected': 0, 'rejected_chat': 0, 'superseded': 0}
+
+    def supersede_group(self, update: object) -> Optional[str]:
+        """
+        :param update: Обновление Telegram
+        :return: Группа, внутри которой новое обновление отменяет старое
+            (имя команды или inline), или None
+        """
+        if isinstance(update, Update) and update.inline_query is not None:
+            return 'inline'
+        command = update_command(update)
+        return command if command in self.supersede_commands else None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = update_state_key(update)
+        chat = self._chats.get(key) if key is not None else None
+        if self._admitted >= self.max_in_flight + self.max_queued:
+            self.stats['rejected'] += 1
+            UPDATES_REJECTED.labels('global').inc()
+            coroutine.close()
+            await self._reject(update, BUSY_TEXT)
+            return
+        if chat is not None and chat.count >= self.per_chat_in_flight + self.per_chat_queued:
+            self.stats['rejected_chat'] += 1
+            UPDATES_REJECTED.labels('chat').inc()
+            coroutine.close()
+            await self._reject(update, USER_BUSY_TEXT)
+            return
+
+        if key is not None and chat is None:
+            chat = self._chats[key] = ChatState(self.per_chat_in_flight)
+        self._admitted += 1
+        self.stats['admitted'] += 1
+        UPDATES_QUEUED.inc()
+        task = asyncio.create_task(self._run(chat, coroutine))
+        group = self.supersede_group(update) if chat is not None else None
+        if chat is not None:
+            chat.count += 1
+            if group is not None:
+                for older in chat.groups.get(group, ()):
+                    self._supersede(chat, older)
+                chat.groups.setdefault(group, set()).add(task)
+        try:
+            await task
+        except asyncio.CancelledError:
+            # Отменена замещённая команда - это штатно; иначе отменили сам обработчик обновлений
+            if chat is None or task not in chat.superseded:
+                raise
+            if task in chat.started:
+                await self._reject(update, SUPERSEDED_TEXT)
+        finally:
+            self._admitted -= 1
+            if chat is not None:
+                chat.count -= 1
+                chat.started.discard(task)
+                chat.superseded.discard(task)
+                if group is not None:
+                    chat.groups[group].discard(task)
+                    if not chat.groups[group]:
+                        del chat.groups[group]
+                if not chat.count:
+                    del self._chats[key]
+
+    async def _run(self, chat: Optional[ChatState], coroutine: Awaitable[Any]) -> None:
+        started = False
+        try:
+            async with chat.semaphore if chat is not None else contextlib.nullcontext():
+                async with self._slots:
+                    started = True
+                    UPDATES_QUEUED.dec()
+                    if chat is not None:
+                        chat.started.add(asyncio.current_task())
+                    await coroutine
+        finally:
+            if not started:
+                UPDATES_QUEUED.dec()
+            # Не начатая корутина закрывается без предупреждения «was never awaited»
+            coroutine.close()
+
+    def _supersede(self, chat: ChatState, task: asyncio.Task) -> None:
+        if task.done() or task in chat.superseded:
+            return
+        chat.superseded.add(task)
+        self.stats['superseded'] += 1
+        COMMANDS_SUPERSEDED.inc()
+        task.cancel()
+
+    @staticmethod
+    async def _reject(update: object, text: str) -> None:
+        if not isinstance(update, Update):
+            return
+        try:
+            if update.inline_query is not None:
+                if text != SUPERSEDED_TEXT:
+                    await update.inline_query.answer([], cache_time=0)
+            elif update.callback_query is not None:
+                await update.callback_query.answer(text)
+            elif update.effective_message is not None:
+                await update.effective_message.reply_text(text)
+        except TelegramError as e:
+            logger.warning("Не удалось ответить на отклонённое обновление: %s", e)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
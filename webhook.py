@@ -0,0 +1,179 @@
+import asyncio
+import hmac
+import logging
+import secrets
+import signal
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiohttp import web
+from telegram import Bot, Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Локальный HTTP-сервер, принимающий обновления Telegram в режиме webhook.
+
+    Каждое обновление проверяется по секретному токену и сразу передаётся
+    дальше (в очередь обновлений приложения или рабочему процессу),
+    не дожидаясь обработки.
+    """
+
+    def __init__(self, on_update: Callable[[Dict[str, Any]], Awaitable[None]], listen: str, port: int,
+                 url_path: str, secret_token: Optional[str]) -> None:
+        """
+        :param on_update: Функция, получающая JSON принятого обновления
+        :param listen: Адрес, на котором слушает сервер
+        :param port: Порт сервера (0 - любой свободный; после start здесь выбранный порт)
+        :param url_path: Путь, на который Telegram отправляет обновления
+        :param secret_token: Секретный токен из заголовка X-Telegram-Bot-Api-Secret-Token
+        """
+        self.on_update = on_update
+        self.listen = listen
+        self.port = port
+        self.url_path = '/' + url_path.strip('/')
+        self.secret_token = secret_token
+        self._runner: Optional[web.AppRunner] = None
+
+    def make_app(self) -> web.Application:
+        """
+        Создать aiohttp-приложение с обработчиком обновлений.
+
+        :return: aiohttp-приложение
+        """
+        app = web.Application()
+        app.router.add_post(self.url_path, self.handle_update)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """
+        Принять одно обновление Telegram.
+
+        :param request: HTTP-запрос
+        :return: 200 - обновление принято, 403 - неверный токен, 400 - некорректное тело
+        """
+        if self.secret_token:
+            received = request.headers.get(SECRET_HEADER, '')
+            if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+                return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(data, dict) or 'update_id' not in data:
+            return web.Response(status=400)
+        await self.on_update(data)
+        return web.Response()
+
+    async def start(self) -> None:
+        """
+        Запустить сервер.
+        """
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """
+        Остановить сервер.
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def stop_on_signals() -> asyncio.Event:
+    """
+    Создать событие, которое устанавливается при получении SIGINT/SIGTERM.
+
+    :return: Событие остановки
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop_event.set)
+    return stop_event
+
+
+def webhook_secret(secret_token: Optional[str], webhook_url: Optional[str]) -> str:
+    """
+    Выбрать секретный токен webhook.
+
+    Без WEBHOOK_SECRET токен генерируется, только если бот сам регистрирует
+    webhook (задан WEBHOOK_URL): иначе Telegram не узнал бы токен, и все
+    обновления отклонялись бы с кодом 403.
+
+    :param secret_token: Токен из настроек (WEBHOOK_SECRET)
+    :param webhook_url: Внешний адрес сервера (WEBHOOK_URL)
+    :return: Секретный токен
+    :raises ValueError: Если токен не задан, а webhook регистрируется не ботом
+    """
+    if secret_token:
+        return secret_token
+    if not webhook_url:
+        raise ValueError("Задайте WEBHOOK_SECRET: без WEBHOOK_URL бот не регистрирует webhook "
+                         "и не может сообщить Telegram случайный секретный токен.")
+    logger.warning("WEBHOOK_SECRET не задан: сгенерирован случайный секретный токен, он будет зарегистрирован "
+                   "в Telegram вместе с webhook и сменится при перезапуске.")
+    return secrets.token_urlsafe(32)
+
+
+async def register_webhook(bot: Bot, webhook_url: str, url_path: str, secret_token: Optional[str]) -> None:
+    """
+    Зарегистрировать webhook в Telegram.
+
+    :param bot: Бот Telegram
+    :param webhook_url: Внешний адрес сервера
+    :param url_path: Путь, на который Telegram отправляет обновления
+    :param secret_token: Секретный токен webhook
+    """
+    await bot.set_webhook(url=f"{webhook_url.rstrip('/')}/{url_path.strip('/')}",
+                          secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+
+
+async def serve_webhook(application: Application, listen: str, port: int, url_path: str,
+                        secret_token: Optional[str], webhook_url: Optional[str] = None,
+                        stop_event: Optional[asyncio.Event] = None) -> None:
+    """
+    Запустить приложение в режиме webhook и работать до получения SIGINT/SIGTERM.
+
+    Все запросы к Bot API (getMe при инициализации, setWebhook, ответы)
+    идут через транспорт приложения, поэтому его можно подменить при
+    сборке (см. loader.build_application).
+
+    :param application: Экземпляр приложения Telegram
+    :param listen: Адрес, на котором слушает сервер
+    :param port: Порт сервера
+    :param url_path: Путь, на который Telegram отправляет обновления
+    :param secret_token: Секретный токен webhook
+    :param webhook_url: Внешний адрес сервера; если задан, webhook регистрируется в Telegram
+    :param stop_event: Событие остановки (по умолчанию - SIGINT/SIGTERM)
+    """
+    if stop_event is None:
+        stop_event = stop_on_signals()
+
+    async def on_update(data: Dict[str, Any]) -> None:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    server = WebhookServer(on_update, listen, port, url_path, secret_token)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        await server.start()
+        if webhook_url:
+            await register_webhook(application.bot, webhook_url, url_path, secret_token)
+        await application.start()
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)